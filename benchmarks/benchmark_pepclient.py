@@ -0,0 +1,183 @@
+"""
+Benchmarks of the PEP client and the download page against the simulated pepcli (pepclient_package/fake_pepcli.py).
+
+Run from the repository root:
+
+    python -m benchmarks.benchmark_pepclient
+    python -m benchmarks.benchmark_pepclient --latency 0.5 --participants 200 --benchmarks pull
+
+The download page benchmark needs a display and is skipped without one.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from pepclient_package.pep_client_fake import PepClientFake
+from pepclient_package.pep_sharded_pull import plan_pull_shards
+
+
+def print_result(name, durations, unit_count=None, unit="items"):
+    """
+    Print the median and spread of a list of durations, and the throughput when a number of units is given.
+    """
+    median = statistics.median(durations)
+    spread = f"min {min(durations):.3f}s, max {max(durations):.3f}s" if len(durations) > 1 else ""
+    throughput = f", {unit_count / median:.1f} {unit}/s" if unit_count and median else ""
+    print(f"{name:<45} median {median:.3f}s {spread}{throughput}")
+
+
+def benchmark_command_overhead(options, repeat):
+    """
+    Measure the overhead of starting a PEP CLI process per command, sequentially and concurrently.
+    """
+    client = PepClientFake(**options)
+
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.query_enrollment()
+        durations.append(time.perf_counter() - started)
+    print_result("command overhead (query enrollment)", durations)
+
+    commands = [["query", "enrollment"]] * repeat
+    started = time.perf_counter()
+    client._run_async(client.aio.command_many(commands))
+    print_result(f"{repeat} concurrent commands", [time.perf_counter() - started], repeat, "commands")
+
+
+def benchmark_list_bulk(options, repeat):
+    """
+    Measure a chunked, concurrent listing of all columns of all participants.
+    """
+    client = PepClientFake(**options)
+    columns = client.get_column_access().column_names()
+    participants = [f"HBU{index:07d}" for index in range(options.get("participants", 20))]
+
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = client.list_bulk(columns, participants, participants_per_chunk=25, columns_per_chunk=5)
+        durations.append(time.perf_counter() - started)
+    print_result("list_bulk of all participants and columns", durations, len(result), "cells")
+
+
+def benchmark_pull(options, repeat, working_folder):
+    """
+    Measure the throughput of streaming the output of a pull, with and without sharding.
+    """
+    client = PepClientFake(**options)
+
+    for shard_count in [1, 4]:
+        durations = []
+        for attempt in range(repeat):
+            target_folder = os.path.join(working_folder, f"pull-{shard_count}-{attempt}")
+            started = time.perf_counter()
+
+            if shard_count == 1:
+                lines = sum(1 for _ in client.pep_pull("pull -P * --report-progress", target_folder))
+            else:
+                shards = plan_pull_shards(client.get_column_access().column_names(), shard_count, target_folder)
+                lines = sum(1 for _ in client.pep_pull_sharded(shards, target_folder, participant_groups=["*"], report_progress=True))
+
+            durations.append(time.perf_counter() - started)
+
+        print_result(f"pull with {shard_count} process(es)", durations, lines, "lines")
+
+
+def benchmark_download_page(options, working_folder):
+    """
+    Measure the duration of a download through the download page and the responsiveness of its event loop.
+    """
+    import tkinter as tk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"{'download page':<45} skipped: {e}")
+        return
+
+    from helpers import functions
+    from pages.page_07_download_progress import DownloadProgressPage
+
+    class Controller:
+        def __init__(self):
+            self.engine_selector = type("Selector", (), {"get": staticmethod(lambda: "Simulated")})()
+
+        def get_frame(self, name):
+            return type("TokenUploadPage", (), {"os_selector": self.engine_selector})()
+
+        def get_next_page(self, page):
+            return ""
+
+        def get_previous_page(self, page):
+            return ""
+
+        def show_frame(self, name):
+            pass
+
+    functions.set_target_folder(os.path.join(working_folder, "page-pull"))
+    functions.set_selected_columns([])
+    functions.set_resume_download(False)
+
+    # Use the simulation options of this benchmark in the client of the page
+    os.environ.update({f"FAKE_PEPCLI_{name.upper()}": str(value) for name, value in options.items()})
+
+    page = DownloadProgressPage(root, Controller())
+    page.pack()
+
+    gaps = []
+    last_tick = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        gaps.append(now - last_tick[0])
+        last_tick[0] = now
+        if not page.can_continue:
+            root.after(10, tick)
+        else:
+            root.quit()
+
+    started = time.perf_counter()
+    page.on_show_frame()
+    root.after(10, tick)
+    root.mainloop()
+    duration = time.perf_counter() - started
+    root.destroy()
+
+    print_result("download page", [duration])
+    print(f"{'download page event loop gap':<45} median {statistics.median(gaps) * 1000:.1f}ms, max {max(gaps) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PEP client against the simulated pepcli.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated start-up latency per command in seconds.")
+    parser.add_argument("--line-delay", type=float, default=0.0, help="Simulated delay between pull progress lines in seconds.")
+    parser.add_argument("--output-lines", type=int, default=0, help="Additional log lines per command.")
+    parser.add_argument("--participants", type=int, default=50, help="Number of simulated participants.")
+    parser.add_argument("--file-size", type=int, default=10000, help="Size of every simulated archive in bytes.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions per benchmark.")
+    parser.add_argument("--benchmarks", nargs="+", default=["commands", "list", "pull", "page"], choices=["commands", "list", "pull", "page"])
+    arguments = parser.parse_args()
+
+    options = {"latency": arguments.latency, "line_delay": arguments.line_delay, "output_lines": arguments.output_lines,
+               "participants": arguments.participants, "file_size": arguments.file_size}
+    working_folder = tempfile.mkdtemp(prefix="pep-benchmark-")
+
+    try:
+        if "commands" in arguments.benchmarks:
+            benchmark_command_overhead(options, arguments.repeat)
+        if "list" in arguments.benchmarks:
+            benchmark_list_bulk(options, arguments.repeat)
+        if "pull" in arguments.benchmarks:
+            benchmark_pull(options, arguments.repeat, working_folder)
+        if "page" in arguments.benchmarks:
+            benchmark_download_page(options, working_folder)
+    finally:
+        shutil.rmtree(working_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import pandas as pd
 import re
 
 from helpers.functions import get_filepath_for_executable
+from helpers.rate_limits import ThrottledFile, default_write_rate_limiter
 
 
 lock = Lock()
@@ -221,7 +222,10 @@ def combine_columns(csv_dir, columns_to_combine, selected_columns, update_progre
                 # Combine all participant dataframes for this file into one CSV
                 combined_df = pd.concat(dataframes, ignore_index=True)
                 combined_csv_path = os.path.join(column_directory, file_name)
-                combined_df.to_csv(combined_csv_path, index=False, sep=',')
+                with open(combined_csv_path, 'w', newline='', encoding='utf-8') as combined_csv_file:
+                    throttled_file = ThrottledFile(combined_csv_file, default_write_rate_limiter)
+                    combined_df.to_csv(throttled_file, index=False, sep=',')
+                    throttled_file.flush()
 
 
 def safe_isnan(value):
@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 
 
@@ -6,11 +7,22 @@ combined_columns_folder = os.path.join('combined_column_data', 'columns')
 parent_combine_columns_folder = 'combined_column_data'
 available_columns = []
 selected_columns = []
+selected_participants = []
+selected_participant_group = "*"
 
 # Initially, perhaps None or a default path
 _token_filepath = None
 _target_folder_filepath = None
 resume_download = False
+unzip_while_downloading = False
+pull_shard_count = 1
+stall_timeout_minutes = 60
+stall_restarts = 3
+column_size_estimates = {}
+column_priorities = {}
+max_extraction_workers = 4
+disk_write_rate_mb = 0
+extraction_rules = None
 
 
 def get_filepath_for_executable(filepath):
@@ -36,6 +48,51 @@ def set_selected_columns(columns):
     selected_columns = columns
 
 
+def set_selected_participants(participants):
+    global selected_participants
+    selected_participants = participants
+
+
+def get_selected_participants():
+    return selected_participants
+
+
+def set_selected_participant_group(participant_group):
+    global selected_participant_group
+    selected_participant_group = participant_group
+
+
+def get_selected_participant_group():
+    return selected_participant_group
+
+
+def read_participant_ids(filepath):
+    """
+    Read participant identifiers from a text or CSV file, one per line in the first column.
+
+    Empty lines, lines starting with '#' and a header line are skipped, and duplicates are removed.
+
+    Args:
+        filepath (str): The path of the file.
+
+    Returns:
+        list: The participant identifiers, in the order of the file.
+    """
+    participant_ids, seen = [], set()
+    with open(filepath, "r", encoding="utf-8-sig") as participant_file:
+        for line in participant_file:
+            participant_id = re.split(r"[,;\t]", line.strip(), maxsplit=1)[0].strip().strip('"')
+            if not participant_id or participant_id.startswith("#"):
+                continue
+            if not participant_ids and participant_id.lower() in ("participant", "participantidentifier", "participant_id", "id"):
+                continue
+            if participant_id not in seen:
+                seen.add(participant_id)
+                participant_ids.append(participant_id)
+
+    return participant_ids
+
+
 def get_available_columns():
     return available_columns
 
@@ -60,6 +117,86 @@ def set_resume_download(resume):
     resume_download = resume
 
 
+def get_unzip_while_downloading():
+    return unzip_while_downloading
+
+
+def set_unzip_while_downloading(unzip):
+    global unzip_while_downloading
+    unzip_while_downloading = unzip
+
+
+def get_extraction_rules():
+    return extraction_rules
+
+
+def set_extraction_rules(rules):
+    global extraction_rules
+    extraction_rules = rules
+
+
+def get_pull_shard_count():
+    return pull_shard_count
+
+
+def set_pull_shard_count(shard_count):
+    global pull_shard_count
+    pull_shard_count = shard_count
+
+
+def get_stall_timeout_minutes():
+    return stall_timeout_minutes
+
+
+def set_stall_timeout_minutes(minutes):
+    global stall_timeout_minutes
+    stall_timeout_minutes = minutes
+
+
+def get_stall_restarts():
+    return stall_restarts
+
+
+def set_stall_restarts(restarts):
+    global stall_restarts
+    stall_restarts = restarts
+
+
+def get_max_extraction_workers():
+    return max_extraction_workers
+
+
+def set_max_extraction_workers(workers):
+    global max_extraction_workers
+    max_extraction_workers = max(1, workers)
+
+
+def get_disk_write_rate_mb():
+    return disk_write_rate_mb
+
+
+def set_disk_write_rate_mb(rate):
+    global disk_write_rate_mb
+    disk_write_rate_mb = max(0, rate)
+
+
+def get_column_size_estimates():
+    return column_size_estimates
+
+
+def set_column_size_estimates(estimates):
+    global column_size_estimates
+    column_size_estimates = estimates
+
+
+def get_column_priorities():
+    return column_priorities
+
+
+def set_column_priority(column, priority):
+    column_priorities[column] = priority
+
+
 def get_token_filepath():
     return _token_filepath
 
@@ -103,6 +240,8 @@ def get_pep_engine(controller):
         engine = 'singularity'
     elif engine_name == 'Windows':
         engine = 'windows'
+    elif engine_name == 'Simulated':
+        engine = 'fake'
     else:
         engine = "docker"
 
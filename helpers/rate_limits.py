@@ -0,0 +1,109 @@
+import threading
+import time
+
+from helpers.functions import get_disk_write_rate_mb
+
+
+class WriteRateLimiter:
+    """
+    Keeps the combined disk writes of the download, unzip and combine steps below a target rate.
+
+    Writers report the bytes they wrote: `throttle` then sleeps until the writes are within the rate, and `observe`
+    only records writes that cannot be slowed down, such as those of pepcli, so the other writers wait for them.
+    A running pepcli process is never slowed down itself, only the start of the next parallel download waits.
+    Up to `burst_seconds` of unused rate can be spent at once.
+
+    Args:
+        get_rate (callable): Returns the target rate in bytes per second, 0 or None for no limit.
+        burst_seconds (float): Seconds of writes at the target rate that may be written at once.
+    """
+
+    def __init__(self, get_rate, burst_seconds=1.0):
+        self.get_rate = get_rate
+        self.burst_seconds = burst_seconds
+        self.lock = threading.Lock()
+        self.next_free = 0.0
+
+    def _reserve(self, byte_count):
+        rate = self.get_rate()
+        if not rate or byte_count <= 0:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            self.next_free = max(self.next_free, now) + byte_count / rate
+            return max(0.0, self.next_free - now - self.burst_seconds)
+
+    def throttle(self, byte_count):
+        """
+        Record bytes that were written and sleep until the writes are within the target rate again.
+
+        Args:
+            byte_count (int): The number of bytes written.
+        """
+        delay = self._reserve(byte_count)
+        if delay:
+            time.sleep(delay)
+
+    def observe(self, byte_count):
+        """
+        Record bytes that were written by a writer that cannot be slowed down.
+
+        Args:
+            byte_count (int): The number of bytes written.
+        """
+        self._reserve(byte_count)
+
+    def get_delay(self):
+        """
+        Return the number of seconds until new writes fit within the target rate.
+
+        Returns:
+            float: The delay in seconds, 0 when writes can start right away.
+        """
+        if not self.get_rate():
+            return 0.0
+
+        with self.lock:
+            return max(0.0, self.next_free - time.monotonic() - self.burst_seconds)
+
+
+class ThrottledFile:
+    """
+    Wraps a file opened for writing, so its writes are slowed down to the target rate of a WriteRateLimiter.
+
+    The written size is counted per write, and the limiter is asked to wait once a chunk of `chunk_size` has
+    been written, so writers that write many small pieces, such as `DataFrame.to_csv`, do not wait on every row.
+
+    Args:
+        file (file): The file to write to.
+        limiter (WriteRateLimiter): The limiter to slow down to.
+        chunk_size (int): The number of bytes (characters for text files) written between two waits.
+    """
+
+    def __init__(self, file, limiter, chunk_size=1024 * 1024):
+        self.file = file
+        self.limiter = limiter
+        self.chunk_size = chunk_size
+        self.pending = 0
+
+    def write(self, data):
+        written = self.file.write(data)
+        self.pending += len(data)
+        if self.pending >= self.chunk_size:
+            self.limiter.throttle(self.pending)
+            self.pending = 0
+
+        return written
+
+    def flush(self):
+        self.file.flush()
+        if self.pending:
+            self.limiter.throttle(self.pending)
+            self.pending = 0
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+default_write_rate_limiter = WriteRateLimiter(lambda: get_disk_write_rate_mb() * 1000 ** 2)
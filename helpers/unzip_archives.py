@@ -0,0 +1,476 @@
+import fnmatch
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+
+from helpers.functions import get_filepath_for_executable, get_max_extraction_workers
+from helpers.rate_limits import ThrottledFile, default_write_rate_limiter
+from pepclient_package.pep_sharded_pull import extraction_manifest_filename
+
+
+manifest_filename = extraction_manifest_filename
+
+
+class ExtractionRules:
+    """
+    Rules deciding which archives and which archive members are extracted.
+
+    Column and member rules are glob patterns (for example 'mri*' or '*.csv'), matched case-insensitively.
+    Member patterns are matched against both the full member path and its file name. Empty include lists
+    mean that everything is included.
+
+    Args:
+        include_columns (list): Column names or patterns to extract, all columns when empty.
+        exclude_columns (list): Column names or patterns to never extract.
+        include_patterns (list): Member patterns to extract, all members when empty.
+        exclude_patterns (list): Member patterns to never extract.
+        max_member_size (int): Members larger than this number of bytes are not extracted.
+    """
+
+    def __init__(self, include_columns=None, exclude_columns=None, include_patterns=None, exclude_patterns=None, max_member_size=None):
+        self.include_columns = [pattern.lower() for pattern in include_columns or []]
+        self.exclude_columns = [pattern.lower() for pattern in exclude_columns or []]
+        self.include_patterns = [pattern.lower() for pattern in include_patterns or []]
+        self.exclude_patterns = [pattern.lower() for pattern in exclude_patterns or []]
+        self.max_member_size = max_member_size
+
+    @staticmethod
+    def _matches(names, patterns):
+        return any(fnmatch.fnmatchcase(name, pattern) for name in names for pattern in patterns)
+
+    def is_column_included(self, column_name):
+        names = [column_name.lower()]
+
+        if self.include_columns and not self._matches(names, self.include_columns):
+            return False
+
+        return not self._matches(names, self.exclude_columns)
+
+    def is_member_included(self, member_name, member_size):
+        member_name = member_name.lower()
+        names = [member_name, member_name.rsplit('/', 1)[-1]]
+
+        if self.max_member_size is not None and member_size > self.max_member_size:
+            return False
+        if self.include_patterns and not self._matches(names, self.include_patterns):
+            return False
+
+        return not self._matches(names, self.exclude_patterns)
+
+    def select_members(self, members):
+        return {name: info for name, info in members.items() if self.is_member_included(name, info["size"])}
+
+
+def get_member_output_path(output_path, member_name):
+    # Mirror the sanitising that ZipFile.extract applies to member names
+    parts = [part for part in member_name.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    if parts:
+        parts[0] = os.path.splitdrive(parts[0])[1] or parts[0]
+
+    return os.path.join(output_path, *parts)
+
+
+def load_extraction_manifest(participant_folder_path):
+    manifest_path = get_filepath_for_executable(os.path.join(participant_folder_path, manifest_filename))
+
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    manifest.setdefault("archives", {})
+    return manifest
+
+
+def save_extraction_manifest(participant_folder_path, manifest):
+    manifest_path = get_filepath_for_executable(os.path.join(participant_folder_path, manifest_filename))
+    temp_manifest_path = f"{manifest_path}.tmp"
+
+    # Write to a temporary file first so an interrupted run never leaves a half written manifest behind
+    with open(temp_manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_manifest_path, manifest_path)
+
+
+def get_archive_members(zip_ref):
+    return {info.filename: {"crc": info.CRC, "size": info.file_size} for info in zip_ref.infolist() if not info.is_dir()}
+
+
+def is_extracted_output_complete(output_path, members):
+    for member_name, member_info in members.items():
+        member_path = get_member_output_path(output_path, member_name)
+        try:
+            if os.path.getsize(member_path) != member_info["size"]:
+                return False
+        except OSError:
+            return False
+
+    return True
+
+
+def is_archive_extracted(archive_path, output_path, manifest_entry, rules):
+    """
+    Check whether an archive has already been fully extracted according to its manifest entry.
+
+    The archive size and modification time are compared first. When those changed (for example after
+    an update pull) the member CRCs are compared instead, so an identical archive is not extracted again.
+    Only the members selected by the extraction rules have to be present.
+
+    Args:
+        archive_path (str): Path to the '.zip' archive.
+        output_path (str): Folder the archive is extracted to.
+        manifest_entry (dict): The manifest entry recorded for this archive, or None.
+        rules (ExtractionRules): The rules selecting the members to extract.
+
+    Returns:
+        bool: True if the extracted output is complete and up to date.
+    """
+    if not manifest_entry:
+        return False
+
+    archive_stat = os.stat(archive_path)
+    if archive_stat.st_size != manifest_entry.get("size") or archive_stat.st_mtime_ns != manifest_entry.get("mtime"):
+        try:
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                if get_archive_members(zip_ref) != manifest_entry.get("members"):
+                    return False
+        except (OSError, zipfile.BadZipFile):
+            return False
+
+        manifest_entry["size"] = archive_stat.st_size
+        manifest_entry["mtime"] = archive_stat.st_mtime_ns
+
+    members = manifest_entry.get("members", {})
+    selected_members = rules.select_members(members)
+    if not set(selected_members).issubset(manifest_entry.get("extracted", members)):
+        return False
+
+    return is_extracted_output_complete(output_path, selected_members)
+
+
+def extract_archive(archive_path, output_path, rules):
+    """
+    Extract the members of an archive selected by the rules and return the manifest entry describing it.
+
+    Members are written in chunks that are slowed down to the disk write rate of `default_write_rate_limiter`.
+
+    Args:
+        archive_path (str): Path to the '.zip' archive.
+        output_path (str): Folder to extract the archive to.
+        rules (ExtractionRules): The rules selecting the members to extract.
+
+    Returns:
+        dict: The manifest entry with the archive size, modification time, member CRCs and extracted members.
+    """
+    archive_stat = os.stat(archive_path)
+
+    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        members = get_archive_members(zip_ref)
+        selected_members = sorted(rules.select_members(members))
+        for member in selected_members:
+            member_path = get_member_output_path(output_path, member)
+            os.makedirs(os.path.dirname(member_path), exist_ok=True)
+            with zip_ref.open(member) as source_file, open(member_path, 'wb') as member_file:
+                throttled_file = ThrottledFile(member_file, default_write_rate_limiter)
+                shutil.copyfileobj(source_file, throttled_file, throttled_file.chunk_size)
+                throttled_file.flush()
+
+    return {"size": archive_stat.st_size, "mtime": archive_stat.st_mtime_ns, "members": members, "extracted": selected_members}
+
+
+def rename_participant_archives(participant_folder_path):
+    """
+    Give the downloaded archives of a participant, which have no extension, a '.zip' extension.
+
+    Args:
+        participant_folder_path (str): The participant folder containing the downloaded archives.
+
+    Returns:
+        int: The number of renamed files.
+    """
+    files = [f for f in os.listdir(participant_folder_path) if "." not in f and not os.path.isdir(os.path.join(participant_folder_path, f))]
+
+    for file in files:
+        original_filepath = get_filepath_for_executable(os.path.join(participant_folder_path, file))
+        new_filepath = get_filepath_for_executable(f"{original_filepath}.zip")
+        os.replace(original_filepath, new_filepath)
+
+    return len(files)
+
+
+def unzip_archive(participant_folder_path, manifest, item, rules):
+    """
+    Extract a single '.zip' archive of a participant unless it was already extracted, and record it in the manifest.
+
+    Args:
+        participant_folder_path (str): The participant folder containing the archive.
+        manifest (dict): The extraction manifest of the participant folder.
+        item (str): The file name of the '.zip' archive.
+        rules (ExtractionRules): The rules selecting the members to extract.
+
+    Returns:
+        bool: True if the archive was extracted, False if it was already extracted.
+    """
+    archives = manifest["archives"]
+    item_path = get_filepath_for_executable(os.path.join(participant_folder_path, item))
+    new_filepath = get_filepath_for_executable(os.path.join(participant_folder_path, item.replace(".zip", "")))
+
+    if is_archive_extracted(item_path, new_filepath, archives.get(item), rules):
+        return False
+
+    archives.pop(item, None)
+    archives[item] = extract_archive(item_path, new_filepath, rules)
+    save_extraction_manifest(participant_folder_path, manifest)
+    return True
+
+
+def unzip_participant_folder(participant_folder_path, log, rules=None):
+    """
+    Extract all '.zip' archives of a participant, skipping the archives that are already extracted.
+
+    Archives are handled in a fixed order and the manifest is saved after every archive, so an
+    interrupted run continues at the first archive that was not completely extracted.
+
+    Args:
+        participant_folder_path (str): The participant folder containing the '.zip' archives.
+        log (callable): Function used to report errors.
+        rules (ExtractionRules): The rules selecting what to extract, everything when None.
+
+    Returns:
+        tuple: The number of extracted and skipped archives.
+    """
+    rules = rules or ExtractionRules()
+    manifest = load_extraction_manifest(participant_folder_path)
+    extracted = 0
+    skipped = 0
+
+    for item in sorted(f for f in os.listdir(participant_folder_path) if f.endswith('.zip')):
+        if not rules.is_column_included(item.replace(".zip", "")):
+            continue
+
+        try:
+            if unzip_archive(participant_folder_path, manifest, item, rules):
+                extracted += 1
+            else:
+                skipped += 1
+        except Exception as e:
+            log(f"Error unzipping {os.path.join(participant_folder_path, item)}: {e}")
+
+    # Persist refreshed size and modification times of archives that were skipped after a CRC match
+    if skipped:
+        save_extraction_manifest(participant_folder_path, manifest)
+
+    return extracted, skipped
+
+
+class PipelinedUnzipper:
+    """
+    Unzips participant archives while a pull is still running.
+
+    A watcher thread polls the download folder for archives whose size and modification time have not
+    changed for a while, and hands them to a worker thread which renames and extracts them. Only the download
+    folder itself is watched: pepcli still owns the files in its '-pending' folder, and moves them into the
+    download folder only when its pull has finished. Archives therefore only arrive during the download when
+    it is split into several pulls that are merged one by one, such as the pull per column of the download
+    page. Once the download is finished, `finish` extracts whatever is left, so the result is the same as
+    running the unzip page.
+
+    Args:
+        download_folder (str): The 'pulled-data' folder the pull writes to.
+        log (callable): Function used to report progress and errors.
+        rules (ExtractionRules): The rules selecting what to extract, everything when None.
+        poll_interval (float): Seconds between two scans of the download folder.
+        settle_time (float): Seconds an archive must stay unchanged before it is considered complete.
+    """
+
+    def __init__(self, download_folder, log, rules=None, poll_interval=5, settle_time=10):
+        self.download_folder = download_folder
+        self.log = log
+        self.rules = rules or ExtractionRules()
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+
+        self.archive_queue = Queue()
+        self.stop_event = threading.Event()
+        self.seen_files = {}
+        self.queued_files = {}
+        self.extracted = 0
+
+        self.watcher_thread = threading.Thread(target=self._watch, daemon=True)
+        self.worker_thread = threading.Thread(target=self._work, daemon=True)
+
+    def start(self):
+        self.watcher_thread.start()
+        self.worker_thread.start()
+
+    def _scan(self):
+        now = time.time()
+
+        if not os.path.isdir(self.download_folder):
+            return
+
+        for participant in os.scandir(self.download_folder):
+            if not participant.is_dir() or not participant.name.startswith("HBU"):
+                continue
+
+            for entry in os.scandir(participant.path):
+                if "." in entry.name or not entry.is_file():
+                    continue
+
+                entry_stat = entry.stat()
+                signature = (entry_stat.st_size, entry_stat.st_mtime_ns)
+                key = (participant.path, entry.name)
+
+                # Only queue archives that did not change since the previous scan and were not written to recently
+                if self.seen_files.get(key) == signature and now - entry_stat.st_mtime >= self.settle_time and self.queued_files.get(key) != signature:
+                    self.queued_files[key] = signature
+                    self.archive_queue.put(key)
+
+                self.seen_files[key] = signature
+
+    def _watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self._scan()
+            except OSError:
+                # Folders are moved into place by pepcli at the end of a pull, the next scan or the final sweep picks them up
+                continue
+
+    def _work(self):
+        while True:
+            key = self.archive_queue.get()
+            if key is None:
+                break
+
+            participant_folder_path, file_name = key
+            try:
+                original_filepath = get_filepath_for_executable(os.path.join(participant_folder_path, file_name))
+                os.replace(original_filepath, f"{original_filepath}.zip")
+
+                if self.rules.is_column_included(file_name):
+                    manifest = load_extraction_manifest(participant_folder_path)
+                    if unzip_archive(participant_folder_path, manifest, f"{file_name}.zip", self.rules):
+                        self.extracted += 1
+                        self.log(f"Unzipped '{file_name}' of participant '{os.path.basename(participant_folder_path)}'")
+            except Exception as e:
+                self.log(f"Error unzipping {os.path.join(participant_folder_path, file_name)} while downloading: {e}")
+
+    def finish(self):
+        """
+        Stop watching, wait for the queued archives and extract all archives that are left.
+
+        Returns:
+            int: The number of archives extracted, both during and after the pull.
+        """
+        self.stop_event.set()
+        if self.watcher_thread.is_alive():
+            self.watcher_thread.join()
+        self.archive_queue.put(None)
+        if self.worker_thread.is_alive():
+            self.worker_thread.join()
+
+        if not os.path.isdir(self.download_folder):
+            return self.extracted
+
+        def unzip_participant(participant_folder_path):
+            rename_participant_archives(participant_folder_path)
+            return unzip_participant_folder(participant_folder_path, self.log, self.rules)[0]
+
+        participant_folder_paths = [get_filepath_for_executable(os.path.join(self.download_folder, participant))
+                                    for participant in sorted(os.listdir(self.download_folder)) if participant.startswith("HBU")]
+
+        with ThreadPoolExecutor(max_workers=get_max_extraction_workers()) as executor:
+            self.extracted += sum(executor.map(unzip_participant, [path for path in participant_folder_paths if os.path.isdir(path)]))
+
+        return self.extracted
+
+
+integrity_report_filename = 'archive_integrity_report.json'
+
+
+def check_archive(archive_path):
+    """
+    Check the CRCs of all members of an archive.
+
+    Args:
+        archive_path (str): Path to the archive.
+
+    Returns:
+        str: A description of the problem, or None if the archive is intact.
+    """
+    try:
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            bad_member = zip_ref.testzip()
+    except Exception as e:
+        return str(e)
+
+    if bad_member is not None:
+        return f"CRC mismatch in member '{bad_member}'"
+
+    return None
+
+
+def find_downloaded_archives(download_folder):
+    archives = []
+
+    for participant in sorted(os.scandir(download_folder), key=lambda entry: entry.name):
+        if not participant.is_dir() or not participant.name.startswith("HBU"):
+            continue
+
+        manifest_archives = load_extraction_manifest(participant.path)["archives"]
+        for entry in os.scandir(participant.path):
+            if not entry.is_file() or ("." in entry.name and not entry.name.endswith('.zip')):
+                continue
+
+            # Archives extracted since their last change already had their CRCs checked during extraction
+            manifest_entry = manifest_archives.get(entry.name)
+            entry_stat = entry.stat()
+            if manifest_entry and manifest_entry.get("size") == entry_stat.st_size and manifest_entry.get("mtime") == entry_stat.st_mtime_ns:
+                continue
+
+            archives.append((participant.name, entry.name.replace(".zip", ""), entry.path))
+
+    return archives
+
+
+def check_archives(download_folder, update_progress=None, max_workers=None):
+    """
+    Check the CRCs of all downloaded archives in parallel and write a report of the damaged ones.
+
+    Args:
+        download_folder (str): The 'pulled-data' folder containing the participant folders.
+        update_progress (callable): Called with the number of checked and total archives.
+        max_workers (int): Maximum number of archives checked at the same time.
+
+    Returns:
+        list: A dictionary with the participant, column, path and error of every damaged archive.
+    """
+    archives = find_downloaded_archives(download_folder)
+    bad_archives = []
+    checked = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(check_archive, archive_path): (participant, column, archive_path) for participant, column, archive_path in archives}
+
+        for future in as_completed(futures):
+            participant, column, archive_path = futures[future]
+            error = future.result()
+            if error:
+                bad_archives.append({"participant": participant, "column": column, "path": archive_path, "error": error})
+
+            checked += 1
+            if update_progress:
+                update_progress(checked, len(archives))
+
+    bad_archives.sort(key=lambda bad_archive: bad_archive["path"])
+    report_path = get_filepath_for_executable(os.path.join(download_folder, integrity_report_filename))
+    with open(report_path, 'w') as f:
+        json.dump({"checked": len(archives), "bad_archives": bad_archives}, f, indent=4)
+
+    return bad_archives
@@ -1,10 +1,12 @@
+import os
 import platform
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
 from helpers.header import HeaderComponent
-from helpers.functions import get_token_filepath, set_token_filepath
+from helpers.functions import get_pep_engine, get_token_filepath, set_token_filepath
 from helpers.navigation_buttons import get_navigation_buttons
+from pepclient_package.pep_warmup import default_engine_warmup
 
 
 class TokenUploadPage(tk.Frame):
@@ -27,8 +29,14 @@ class TokenUploadPage(tk.Frame):
         label_selector = tk.Label(self, text="Select engine to run PEP", font=("Helvetica", 18, "bold"))
         label_selector.pack(pady=10, padx=10)
         self.os_selector = ttk.Combobox(self, state="readonly")
-        self.os_selector['values'] = ('Docker', 'Singularity (HPC)', 'Windows')
+        engines = ['Docker', 'Singularity (HPC)', 'Windows']
+        # The simulated pepcli (pepclient_package/fake_pepcli.py) is only offered to test the tool without a PEP server
+        if os.environ.get("PEP_SIMULATED_ENGINE"):
+            engines.append('Simulated')
+        self.os_selector['values'] = tuple(engines)
         self.os_selector.pack(pady=10)
+        # Only warm up an engine when the user chose one or is about to use it, as pulling or copying its image takes a while
+        self.os_selector.bind("<<ComboboxSelected>>", lambda event: self.warm_up_engine())
         self.preselect_os()
 
         # Title Label
@@ -54,7 +62,9 @@ class TokenUploadPage(tk.Frame):
         """
         Handles the file upload process by opening a file dialog to select a token file,
         setting the token file path, and navigating to the next page.
+        The engine that is shown, also when it was preselected, is warmed up while the file is selected.
         """
+        self.warm_up_engine()
         filepath = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
         if filepath:
             try:
@@ -72,14 +82,23 @@ class TokenUploadPage(tk.Frame):
             bool: True if token file is uploaded, False otherwise.
         """
         if get_token_filepath():
+            self.warm_up_engine()
             return True
         else:
             messagebox.showwarning("Upload token", "Please upload your token file before continuing.")
             return False
 
+    def warm_up_engine(self):
+        """
+        Start preparing the selected engine in the background, so the PEP overview does not wait for it.
+        """
+        default_engine_warmup.start(get_pep_engine(self.controller))
+
     def preselect_os(self):
         os_name = platform.system().lower()
-        if os_name == 'linux':
+        if 'Simulated' in self.os_selector['values']:
+            self.os_selector.set('Simulated')
+        elif os_name == 'linux':
             self.os_selector.set('Singularity (HPC)')
         elif os_name == 'windows':
             self.os_selector.set('Windows')
@@ -1,8 +1,14 @@
+import subprocess
 import threading
 import tkinter as tk
+from tkinter import ttk
 
 from helpers.navigation_buttons import get_navigation_buttons
+from pepclient_package.pep_cache import default_query_cache
 from pepclient_package.pep_client import PepClient
+from pepclient_package.pep_executor import RetryPolicy
+from pepclient_package.pep_models import ColumnAccess
+from pepclient_package.pep_warmup import default_engine_warmup
 from helpers.functions import get_pep_engine, get_token_filepath, set_available_columns
 from helpers.header import HeaderComponent
 from helpers.loading_dialog import LoadingDialog
@@ -43,6 +49,9 @@ class PEPOverviewPage(tk.Frame):
         column_access_label.pack(pady=(10, 2), padx=10, fill='x')
         self.column_access_text_box = self.create_scrollable_text_widget(height=10)
 
+        refresh_button = ttk.Button(self, text="Refresh", command=self.refresh_pep_overview)
+        refresh_button.pack(pady=(0, 10))
+
         get_navigation_buttons(self, "pep_overview_page")
 
     def create_scrollable_text_widget(self, height):
@@ -67,31 +76,39 @@ class PEPOverviewPage(tk.Frame):
 
         return text_widget
 
-    def load_pep_overview(self, tries=5):
+    def load_pep_overview(self, tries=5, refresh=False):
         """
-        Load PEP overview information with retries for failed attempts.
+        Load PEP overview information, retrying queries that fail or time out.
+
+        All queries run in a single PEP CLI session, so the container is only started once. The answers are
+        cached, so showing the page again does not query PEP unless the overview is refreshed.
 
         Args:
-            tries (int): Number of remaining retry attempts.
+            tries (int): Maximum number of attempts per query.
+            refresh (bool): Ignore the cached answers and query PEP again.
         """
+        engine = get_pep_engine(self.controller)
 
-        pepcli = PepClient(pep_token_filepath=get_token_filepath(), engine=get_pep_engine(self.controller))
-        pepcli.set_timeout(10)
+        # Give the warm-up some time to finish pulling or staging the image, so it does not count towards the query timeout
+        default_engine_warmup.wait(engine, timeout=60)
 
-        enrollment_access = pepcli.query_enrollment().get("message", "")
-        column_access = pepcli.query_column_access().get("message", "")
-        participant_group_access = pepcli._command(command="query participant-group-access").get("message", "")
+        pepcli = PepClient(pep_token_filepath=get_token_filepath(), engine=engine, session=True, query_cache=default_query_cache)
+        pepcli.set_timeout(10)
+        pepcli.set_retry_policy(RetryPolicy(max_attempts=tries, retry_on_timeout=True))
 
-        columns = column_access.split("Columns (")[-1].split("\n")
-        columns = [column.replace('r ', '').replace('rw ', '').strip() for column in columns][1:]
+        if refresh:
+            pepcli.invalidate_query_cache()
 
-        set_available_columns(columns)
+        try:
+            enrollment_access = pepcli.query_enrollment().get("message", "")
+            column_access = pepcli.query_column_access().get("message", "")
+            participant_group_access = pepcli.query_participant_group_access().get("message", "")
+        except subprocess.TimeoutExpired:
+            enrollment_access = column_access = participant_group_access = "PEP did not respond in time, please try to refresh."
+        finally:
+            pepcli.close()
 
-        if not enrollment_access and tries > 0:
-            self.load_pep_overview(tries=tries - 1)
-            return
-        else:
-            pepcli.reset_timeout()
+        set_available_columns(ColumnAccess.parse(column_access).column_names())
 
         self.enrollment_text_box.after(0, self.update_text_widget, self.enrollment_text_box, enrollment_access)
         self.column_access_text_box.after(0, self.update_text_widget, self.column_access_text_box, column_access)
@@ -119,6 +136,13 @@ class PEPOverviewPage(tk.Frame):
         self.loading_dialog = LoadingDialog(self.controller, message="Loading PEP info...")
         threading.Thread(target=self.load_pep_overview, daemon=True).start()
 
+    def refresh_pep_overview(self):
+        """
+        Query PEP again, ignoring the cached overview information.
+        """
+        self.loading_dialog = LoadingDialog(self.controller, message="Refreshing PEP info...")
+        threading.Thread(target=self.load_pep_overview, kwargs={"refresh": True}, daemon=True).start()
+
     def go_to_next_page(self):
         """
         Navigate to the next page in the application.
@@ -6,14 +6,27 @@ from tkinter import ttk
 
 from helpers.functions import (
     get_filepath_for_executable, get_target_folder, set_target_folder,
-    get_resume_download, set_resume_download, get_available_columns, set_selected_columns
+    get_resume_download, set_resume_download, get_available_columns, set_selected_columns,
+    get_unzip_while_downloading, set_unzip_while_downloading, get_pull_shard_count, set_pull_shard_count,
+    get_stall_timeout_minutes, set_stall_timeout_minutes, get_stall_restarts, set_stall_restarts, get_pep_engine, get_token_filepath,
+    get_column_size_estimates, set_column_size_estimates, get_column_priorities, set_column_priority,
+    get_selected_participant_group, set_selected_participant_group, set_selected_participants, read_participant_ids,
+    get_max_extraction_workers, set_max_extraction_workers, get_disk_write_rate_mb, set_disk_write_rate_mb, set_extraction_rules
 )
 from helpers.header import HeaderComponent
 from helpers.navigation_buttons import get_navigation_buttons
 from helpers.loading_dialog import LoadingDialog
+from helpers.unzip_archives import ExtractionRules
+from pepclient_package.pep_cache import default_query_cache
+from pepclient_package.pep_client import PepClient
+from pepclient_package.pep_models import ColumnSize
+from pepclient_package.pep_progress import format_size
 
 
 class DownloadFolderSelectionPage(tk.Frame):
+    priority_names = {"High": 1, "Normal": 0, "Low": -1}
+    all_participants_name = "All participants"
+
     def __init__(self, parent, controller):
         """
         Initialize the download folder selection page frame.
@@ -26,6 +39,9 @@ class DownloadFolderSelectionPage(tk.Frame):
         self.controller = controller
         self.can_continue = False
         self.checkbox_vars = {}  # Dictionary to hold checkbox variables
+        self.checkboxes = {}
+        self.estimating_sizes = False
+        self.participant_ids = []
 
         header = HeaderComponent(self, filename=__file__, step_name="Download Folder and Columns Selection")
         header.pack(fill='x')
@@ -57,14 +73,77 @@ class DownloadFolderSelectionPage(tk.Frame):
         )
         resume_instructions_text_box.pack(pady=10, padx=10)
 
+        self.unzip_while_downloading_var = tk.BooleanVar(value=1 if get_unzip_while_downloading() else 0)
+        unzip_while_downloading_checkbox = ttk.Checkbutton(
+            self, text="Unzip participants while downloading", variable=self.unzip_while_downloading_var,
+            command=self.toggle_unzip_while_downloading
+        )
+        unzip_while_downloading_checkbox.pack(pady=(0, 5), padx=10)
+
+        # Extraction rules of the pipelined unzip, the unzip page starts from the same rules
+        extraction_options_frame = tk.Frame(self)
+        extraction_options_frame.pack(pady=(0, 10), padx=10)
+        self.skip_mri_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(extraction_options_frame, text="Skip MRI columns", variable=self.skip_mri_var).pack(side="left")
+        tk.Label(extraction_options_frame, text="Only unzip files matching (e.g. *.csv):", font=("Helvetica", 12)).pack(side="left", padx=(15, 0))
+        self.include_patterns_var = tk.StringVar()
+        tk.Entry(extraction_options_frame, textvariable=self.include_patterns_var, width=20).pack(side="left", padx=5)
+
+        shard_count_frame = tk.Frame(self)
+        shard_count_frame.pack(pady=(0, 10), padx=10)
+        tk.Label(shard_count_frame, text="Parallel downloads:", font=("Helvetica", 12)).pack(side="left")
+        self.shard_count_var = tk.IntVar(value=get_pull_shard_count())
+        ttk.Spinbox(shard_count_frame, from_=1, to=8, width=5, textvariable=self.shard_count_var, state="readonly",
+                    command=self.update_shard_count).pack(side="left", padx=5)
+
+        tk.Label(shard_count_frame, text="Restart a download without progress after (minutes, 0 = never):", font=("Helvetica", 12)).pack(side="left", padx=(15, 0))
+        self.stall_timeout_var = tk.IntVar(value=get_stall_timeout_minutes())
+        ttk.Spinbox(shard_count_frame, from_=0, to=1440, increment=15, width=5, textvariable=self.stall_timeout_var, state="readonly",
+                    command=self.update_stall_timeout).pack(side="left", padx=5)
+        tk.Label(shard_count_frame, text="Restarts:", font=("Helvetica", 12)).pack(side="left", padx=(15, 0))
+        self.stall_restarts_var = tk.IntVar(value=get_stall_restarts())
+        ttk.Spinbox(shard_count_frame, from_=0, to=10, width=5, textvariable=self.stall_restarts_var, state="readonly",
+                    command=self.update_stall_restarts).pack(side="left", padx=5)
+
+        limits_frame = tk.Frame(self)
+        limits_frame.pack(pady=(0, 10), padx=10)
+        tk.Label(limits_frame, text="Extraction workers:", font=("Helvetica", 12)).pack(side="left")
+        self.extraction_workers_var = tk.IntVar(value=get_max_extraction_workers())
+        ttk.Spinbox(limits_frame, from_=1, to=16, width=5, textvariable=self.extraction_workers_var, state="readonly",
+                    command=self.update_extraction_workers).pack(side="left", padx=5)
+
+        tk.Label(limits_frame, text="Max disk write rate (MB/s, 0 = unlimited):", font=("Helvetica", 12)).pack(side="left", padx=(15, 0))
+        self.disk_write_rate_var = tk.IntVar(value=get_disk_write_rate_mb())
+        ttk.Spinbox(limits_frame, from_=0, to=2000, increment=10, width=5, textvariable=self.disk_write_rate_var, state="readonly",
+                    command=self.update_disk_write_rate).pack(side="left", padx=5)
+        tk.Label(self, text="These limits also apply to the unzip and combine steps. The disk write rate slows down unzipping and combining, "
+                            "and delays starting parallel downloads, but cannot slow down a single running download.",
+                 font=("Helvetica", 10), wraplength=700).pack(pady=(0, 10), padx=10)
+
+        # Participant selection, a participant group or a list of participant identifiers
+        participants_frame = tk.Frame(self)
+        participants_frame.pack(pady=(0, 10), padx=10)
+        tk.Label(participants_frame, text="Participants:", font=("Helvetica", 12)).pack(side="left")
+        self.participant_group_selector = ttk.Combobox(participants_frame, values=[self.all_participants_name], width=25, state="readonly")
+        self.participant_group_selector.set(self.all_participants_name if get_selected_participant_group() == "*" else get_selected_participant_group())
+        self.participant_group_selector.pack(side="left", padx=5)
+        ttk.Button(participants_frame, text="Load ID list...", command=self.load_participant_ids).pack(side="left", padx=5)
+        ttk.Button(participants_frame, text="Clear", command=self.clear_participant_ids).pack(side="left")
+        self.participant_ids_label = tk.Label(participants_frame, text="", font=("Helvetica", 12))
+        self.participant_ids_label.pack(side="left", padx=5)
+
         # Column Selection
         label_columns = tk.Label(self, text="Select Columns to Download", font=("Helvetica", 18, "bold"))
         label_columns.pack(pady=10, padx=10)
 
         columns_instructions_text_box = self.create_instructions_text_box(
-            "Please select the columns you wish to download from the list below.", height=1)
+            "Please select the columns you wish to download from the list below. Columns with a higher priority, and "
+            "smaller columns, are downloaded first.", height=2)
         columns_instructions_text_box.pack(pady=0, padx=10)
 
+        self.size_total_label = tk.Label(self, text="", font=("Helvetica", 12))
+        self.size_total_label.pack(pady=(5, 0), padx=10)
+
         # Placeholder for column checkboxes; will be populated after fetching columns
         self.checkbox_frame = None
 
@@ -134,11 +213,25 @@ class DownloadFolderSelectionPage(tk.Frame):
 
             # Create checkboxes for each column
             self.checkbox_vars = {}
+            self.checkboxes = {}
+            priorities = get_column_priorities()
             for column in self.available_columns:
+                row = tk.Frame(self.checkbox_frame, bg="white")
+                row.pack(anchor='w', fill='x')
+
+                priority_box = ttk.Combobox(row, values=list(self.priority_names), width=7, state="readonly")
+                priority_box.set(next(name for name, value in self.priority_names.items() if value == priorities.get(column, 0)))
+                priority_box.bind("<<ComboboxSelected>>", lambda event, column=column: set_column_priority(column, self.priority_names[event.widget.get()]))
+                priority_box.pack(side='left', padx=5, pady=2)
+
                 var = tk.BooleanVar()
-                chk = ttk.Checkbutton(self.checkbox_frame, text=column, variable=var, style="White.TCheckbutton")
-                chk.pack(anchor='w', padx=5, pady=2)
+                chk = ttk.Checkbutton(row, text=column, variable=var, style="White.TCheckbutton", command=self.update_size_total)
+                chk.pack(side='left', padx=5, pady=2)
                 self.checkbox_vars[column] = var
+                self.checkboxes[column] = chk
+
+            self.show_column_sizes()
+            threading.Thread(target=self.fetch_participant_groups, daemon=True).start()
 
             # Add "Select All" and "Unselect All" buttons
             select_all_button = ttk.Button(self, text="Select All", command=self.select_all_checkboxes)
@@ -147,12 +240,148 @@ class DownloadFolderSelectionPage(tk.Frame):
             unselect_all_button = ttk.Button(self, text="Unselect All", command=self.unselect_all_checkboxes)
             unselect_all_button.pack(pady=5)
 
+    def fetch_participant_groups(self):
+        """
+        Fetch the participant groups that can be downloaded, to offer them as a subset of the participants.
+        """
+        pepcli = PepClient(pep_token_filepath=get_token_filepath(), engine=get_pep_engine(self.controller), session=True, query_cache=default_query_cache)
+        try:
+            groups = pepcli.get_participant_group_access().readable_groups()
+        except Exception:
+            return
+        finally:
+            pepcli.close()
+
+        names = [self.all_participants_name] + [group for group in groups if group != "*"]
+        self.after(0, self.participant_group_selector.config, {"values": names})
+
+    def load_participant_ids(self):
+        """
+        Load the identifiers of the participants to download from a text or CSV file, one per line.
+        """
+        filepath = filedialog.askopenfilename(filetypes=[("Participant lists", "*.txt *.csv"), ("All files", "*.*")])
+        if not filepath:
+            return
+
+        try:
+            participant_ids = read_participant_ids(filepath)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Error", f"Failed to load the participant list: {e}")
+            return
+
+        if not participant_ids:
+            messagebox.showwarning("No participants", "The file does not contain any participant identifiers.")
+            return
+
+        self.participant_ids = participant_ids
+        self.participant_group_selector.config(state="disabled")
+        self.participant_ids_label.config(text=f"{len(participant_ids)} participants from {os.path.basename(filepath)}")
+
+    def clear_participant_ids(self):
+        """
+        Download the selected participant group again instead of the loaded participant list.
+        """
+        self.participant_ids = []
+        self.participant_group_selector.config(state="readonly")
+        self.participant_ids_label.config(text="")
+
+    def request_column_size_estimates(self):
+        """
+        Start estimating the selected columns that were not estimated in this session yet, one estimate at a time.
+        """
+        if self.estimating_sizes:
+            return
+
+        estimates = get_column_size_estimates()
+        columns = [column for column, var in self.checkbox_vars.items() if var.get() and column not in estimates]
+        if not columns:
+            return
+
+        self.estimating_sizes = True
+        self.size_total_label.config(text="Estimating the download size of the selected columns...")
+        threading.Thread(target=self.estimate_column_sizes, args=(columns,), daemon=True).start()
+
+    def estimate_column_sizes(self, columns):
+        """
+        Estimate the number of files and bytes of columns with chunked `pepcli list --no-inline-data` calls.
+
+        The estimates are kept for the session, so selecting the columns again does not list them again.
+        Columns that could not be listed are shown with an unknown size.
+
+        Args:
+            columns (list): The columns to estimate.
+        """
+        pepcli = PepClient(pep_token_filepath=get_token_filepath(), engine=get_pep_engine(self.controller), session=True, query_cache=default_query_cache)
+        try:
+            estimates = pepcli.estimate_column_sizes(columns)
+        except Exception as e:
+            estimates = {column: ColumnSize(column, error=str(e)) for column in columns}
+        finally:
+            pepcli.close()
+
+        set_column_size_estimates(dict(get_column_size_estimates(), **estimates))
+        self.estimating_sizes = False
+        self.after(0, self.show_column_sizes)
+
+    def show_column_sizes(self):
+        """
+        Show the estimated number of files next to the checkbox of every column, and their size when it is listed.
+
+        pepcli's list output does not include file sizes, so against a PEP server the estimate is a file count.
+        """
+        estimates = get_column_size_estimates()
+
+        for column, chk in self.checkboxes.items():
+            estimate = estimates.get(column)
+            if estimate is None:
+                chk.config(text=column)
+            elif estimate.error:
+                chk.config(text=f"{column}  (number of files unknown)")
+            elif estimate.unknown == estimate.files:
+                chk.config(text=f"{column}  ({estimate.files} files)")
+            else:
+                unknown = f", {estimate.unknown} without size" if estimate.unknown else ""
+                chk.config(text=f"{column}  ({estimate.files} files, {format_size(estimate.bytes)}{unknown})")
+
+        self.update_size_total()
+
+    def update_size_total(self):
+        """
+        Show the estimated number of files of the selected columns, and estimate the newly selected columns.
+
+        A size is only shown when the size of some of the files is listed, so the total is never a meaningless 0 B.
+        """
+        self.request_column_size_estimates()
+        if self.estimating_sizes:
+            return
+
+        estimates = get_column_size_estimates()
+        selected_columns = [column for column, var in self.checkbox_vars.items() if var.get()]
+        selected_estimates = [estimates[column] for column in selected_columns if column in estimates and not estimates[column].error]
+
+        if not selected_columns:
+            self.size_total_label.config(text="")
+            return
+
+        files = sum(estimate.files for estimate in selected_estimates)
+        unknown = sum(estimate.unknown for estimate in selected_estimates)
+        text = f"Selected: {len(selected_columns)} columns, {files} files"
+        if unknown < files:
+            text += f", {format_size(sum(estimate.bytes for estimate in selected_estimates))}"
+            if unknown:
+                text += f" (size of {unknown} files unknown)"
+        if len(selected_estimates) < len(selected_columns):
+            text += f" ({len(selected_columns) - len(selected_estimates)} columns without an estimate)"
+
+        self.size_total_label.config(text=text)
+
     def select_all_checkboxes(self):
         """
         Select all checkboxes.
         """
         for var in self.checkbox_vars.values():
             var.set(True)
+        self.update_size_total()
 
     def unselect_all_checkboxes(self):
         """
@@ -160,6 +389,7 @@ class DownloadFolderSelectionPage(tk.Frame):
         """
         for var in self.checkbox_vars.values():
             var.set(False)
+        self.update_size_total()
 
     def _on_mousewheel(self, event, canvas):
         """
@@ -205,6 +435,42 @@ class DownloadFolderSelectionPage(tk.Frame):
         """
         set_resume_download(not get_resume_download())
 
+    def toggle_unzip_while_downloading(self):
+        """
+        Toggle the state of unzipping participants while downloading.
+        """
+        set_unzip_while_downloading(self.unzip_while_downloading_var.get())
+
+    def update_shard_count(self):
+        """
+        Store the number of pulls that run in parallel, each for a part of the selected columns.
+        """
+        set_pull_shard_count(self.shard_count_var.get())
+
+    def update_stall_timeout(self):
+        """
+        Store after how many minutes without progress a download is restarted with '--resume --update'.
+        """
+        set_stall_timeout_minutes(self.stall_timeout_var.get())
+
+    def update_stall_restarts(self):
+        """
+        Store how often a stalled or failed download is restarted before it is reported as failed.
+        """
+        set_stall_restarts(self.stall_restarts_var.get())
+
+    def update_extraction_workers(self):
+        """
+        Store the number of participants that are unzipped in parallel.
+        """
+        set_max_extraction_workers(self.extraction_workers_var.get())
+
+    def update_disk_write_rate(self):
+        """
+        Store the target rate in MB/s for the disk writes of unzipping and combining, which parallel downloads also wait for.
+        """
+        set_disk_write_rate_mb(self.disk_write_rate_var.get())
+
     def create_instructions_text_box(self, text, height=5):
         """
         Create and return a disabled text box with instructions.
@@ -245,6 +511,15 @@ class DownloadFolderSelectionPage(tk.Frame):
                 return False
             else:
                 set_selected_columns(selected_columns)
+                set_extraction_rules(ExtractionRules(
+                    include_columns=selected_columns,
+                    exclude_columns=["*mri*"] if self.skip_mri_var.get() else [],
+                    include_patterns=[pattern.strip() for pattern in self.include_patterns_var.get().split(",") if pattern.strip()]
+                ))
+
+            participant_group = self.participant_group_selector.get()
+            set_selected_participant_group("*" if participant_group == self.all_participants_name else participant_group)
+            set_selected_participants(list(self.participant_ids))
         else:
             messagebox.showwarning(
                 "No Columns Available",
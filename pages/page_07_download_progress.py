@@ -1,15 +1,30 @@
-import platform
+import os
+import shlex
 import tkinter as tk
 from tkinter import ttk
 import threading
+import time
 from tkinter import messagebox
-from helpers.functions import get_pep_engine, get_selected_columns, get_target_folder, get_token_filepath, get_resume_download
+from helpers.functions import (
+    get_pep_engine, get_selected_columns, get_target_folder, get_token_filepath, get_resume_download, get_unzip_while_downloading, get_selected_participants,
+    get_pull_shard_count, get_stall_timeout_minutes, get_stall_restarts, get_column_size_estimates, get_column_priorities, get_selected_participant_group,
+    get_extraction_rules, set_selected_participants
+)
 from helpers.header import HeaderComponent
 from helpers.navigation_buttons import get_navigation_buttons
+from helpers.rate_limits import default_write_rate_limiter
+from helpers.unzip_archives import PipelinedUnzipper
 from pepclient_package.pep_client import PepClient
+from pepclient_package.pep_delta_pull import plan_delta_shards
+from pepclient_package.pep_output_reader import PullOutputReader
+from pepclient_package.pep_progress import ProgressEstimator, get_status_filepath, parse_progress_line
+from pepclient_package.pep_sharded_pull import has_pull_metadata, plan_pull_shards, plan_scheduled_pull, remove_shards_folder
+from pepclient_package.pep_telemetry import PullTelemetry, format_summary, get_metrics_filepath, get_report_filepath
 
 
 class DownloadProgressPage(tk.Frame):
+    participants_per_pull = 100
+
     def __init__(self, parent, controller):
         """
         Initialize the Download Progress Page frame.
@@ -22,8 +37,13 @@ class DownloadProgressPage(tk.Frame):
         self.controller = controller
         self.pep_client = None
         self.target_folder = ""
-        self.os_name = platform.system().lower()
         self.can_continue = False
+        self.pipelined_unzipper = None
+        self.progress_estimator = None
+        self.status_written_at = 0
+        self.written_bytes = {}
+        self.telemetry = None
+        self.download_errors = []
 
         self.setup_ui()
 
@@ -33,6 +53,8 @@ class DownloadProgressPage(tk.Frame):
         Initializes the PEP client and starts the download process.
         """
         self.pepcli = PepClient(pep_token_filepath=get_token_filepath(), engine=get_pep_engine(self.controller))
+        # Allow as many pepcli processes as parallel downloads are configured
+        self.pepcli.aio.max_concurrency = max(self.pepcli.aio.max_concurrency, get_pull_shard_count())
         self.target_folder = get_target_folder()
         self.download_data()
 
@@ -47,6 +69,15 @@ class DownloadProgressPage(tk.Frame):
         self.progress_label = tk.Label(self, text="Download Progress", font=("Helvetica", 16, "bold"))
         self.progress_label.pack(pady=10)
 
+        self.progress_bar = ttk.Progressbar(self, orient="horizontal", mode="determinate", maximum=100)
+        self.progress_bar.pack(padx=10, fill='x')
+
+        self.progress_details_label = tk.Label(self, text="", font=("Helvetica", 12))
+        self.progress_details_label.pack()
+
+        self.shard_status_label = tk.Label(self, text="", font=("Helvetica", 12))
+        self.shard_status_label.pack()
+
         frame = tk.Frame(self)
         frame.pack(pady=10, padx=10, fill='both', expand=True)
 
@@ -63,7 +94,19 @@ class DownloadProgressPage(tk.Frame):
         """
         Start the thread for pulling data and updating the UI asynchronously.
         """
-        self.download_thread = threading.Thread(target=self.pep_pull_and_update_ui)
+        self.progress_estimator = ProgressEstimator()
+        self.status_written_at = 0
+        self.written_bytes = {}
+        self.download_errors = []
+        self.telemetry = PullTelemetry(get_metrics_filepath(self.target_folder))
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start()
+
+        if get_unzip_while_downloading():
+            self.pipelined_unzipper = PipelinedUnzipper(self.target_folder, log=self.log_from_thread, rules=get_extraction_rules())
+            self.pipelined_unzipper.start()
+
+        self.download_thread = threading.Thread(target=self.run_download)
         self.download_thread.start()
         self.after(500, self.check_download_complete)
 
@@ -77,33 +120,265 @@ class DownloadProgressPage(tk.Frame):
         else:
             self.handle_download_complete()
 
+    def run_download(self):
+        """
+        Run the download in the background thread, recording why it failed for `handle_download_complete`.
+        """
+        try:
+            self.pep_pull_and_update_ui()
+        except Exception as e:
+            self.download_errors.append(f"The download failed: {e}")
+
     def pep_pull_and_update_ui(self):
         """
         Execute the PEP pull command and update the UI based on the output.
         """
-        resume_command = "--resume --update -P * -c *"
+        participant_group_part = f"-P {shlex.quote(get_selected_participant_group())}"
+        resume_command = f"--resume --update {participant_group_part} -c *"
         selected_columns = get_selected_columns()
+        selected_participants = get_selected_participants()
+
+        if get_unzip_while_downloading() and not selected_columns and not selected_participants:
+            # Unzipping while downloading needs a pull per column, so all accessible columns are pulled by name
+            selected_columns = self.pepcli.get_column_access().readable_columns()
+
+        if selected_participants:
+            # Targeted pull of specific participants, only resuming into a folder that pepcli pulled into before
+            participants_part = ' '.join(f'--participants {participant}' for participant in selected_participants)
+            update_part = " --resume --update" if has_pull_metadata(self.target_folder) else ""
+            pull_options = f"{participants_part}{update_part} --report-progress"
+        elif selected_columns:
+            pull_options = f"{participant_group_part} --report-progress"
+        else:
+            pull_options = "--all-accessible --report-progress"
+
+        if get_resume_download() and not selected_participants and has_pull_metadata(self.target_folder):
+            pull_options += f" {resume_command}"
+
+        if selected_participants and selected_columns:
+            # Every targeted pull is a new pull into its own staging folder, merged into the target folder afterwards.
+            # pepcli is never asked to resume a folder that was pulled with other participants or columns, and the
+            # metadata of the pulls is merged, see merge_pull_folder. Long participant lists are split over several
+            # pulls, to stay within the command line length limits.
+            shards = plan_delta_shards([(participant, column) for participant in selected_participants for column in selected_columns], self.target_folder, self.participants_per_pull)
+            self.pull_shards_and_update_ui(shards, report_progress=True)
+            return
+
+        if get_resume_download() and selected_columns and not selected_participants and os.path.isdir(self.target_folder):
+            if self.pep_pull_delta_and_update_ui(selected_columns):
+                return
+
+        # Size estimates are always there, only priorities set by the user switch to the scheduled pull
+        is_scheduled = any(get_column_priorities().get(column) for column in selected_columns)
+        if (get_pull_shard_count() > 1 or is_scheduled or get_unzip_while_downloading()) and len(selected_columns) > 1 and not selected_participants:
+            self.pep_pull_sharded_and_update_ui(selected_columns, is_scheduled)
+            return
+
+        self.pull_and_update_ui(pull_options, selected_columns)
+
+    def pull_and_update_ui(self, pull_options, columns):
+        """
+        Run a single PEP CLI pull into the target folder, show its output and progress, and report when it failed.
+
+        Args:
+            pull_options (str): The options of the pull command.
+            columns (list): The columns to pull.
+
+        Returns:
+            bool: True when the pull succeeded.
+        """
+        output = self.pepcli.pep_pull(f"pull {pull_options}", self.target_folder, telemetry=self.telemetry, stall_timeout=self.get_stall_timeout(), max_restarts=get_stall_restarts(),
+                                      columns=columns)
+        reader = PullOutputReader(output)
+        for batch in reader.batches():
+            self.after(0, self.add_output_line_to_progress_text, batch.text())
+            for _, output_line in batch.progress_lines():
+                self.update_progress(output_line)
 
-        if self.os_name == "darwin":
-            if selected_columns:
-                command = "pull -P * --report-progress"
-            else:
-                command = "pull --all-accessible --report-progress"
-            if get_resume_download():
-                command += f" {resume_command}"
+        if reader.result is None:
+            self.download_errors.append("The download was stopped because it made no progress.")
+        elif reader.result != 0:
+            self.download_errors.append(f"The download failed with exit code {reader.result}.")
 
-            for output_line in self.pepcli.pep_pull(command, self.target_folder):
-                self.add_output_line_to_progress_text(output_line)
+        return reader.result == 0
+
+    def pep_pull_delta_and_update_ui(self, selected_columns):
+        """
+        Resume a download by pulling only the files that are missing or changed on the server.
+
+        Files that cannot be compared with the server are pulled with '--update' afterwards, so pepcli checks them.
+        The change markers of the files that are now up to date are recorded for the next comparison.
+
+        Args:
+            selected_columns (list): The columns of the download.
+
+        Returns:
+            bool: True when the download was resumed, False when the server could not be listed and a full resume is needed.
+        """
+        self.log_from_thread("Comparing the downloaded files with the server...")
+        plan = self.pepcli.plan_delta_pull(selected_columns, self.target_folder, participant_groups=[get_selected_participant_group()])
+
+        if plan.errors:
+            self.log_from_thread(f"Could not list the files on the server, resuming the complete download instead: {plan.errors[0]}")
+            return False
+
+        self.log_from_thread(plan.get_summary_text())
+        if plan.shards:
+            self.pull_shards_and_update_ui(plan.shards, report_progress=True)
+        pulled_cells = [(participant, column) for shard in plan.shards if shard.status == "done" for participant in shard.participants for column in shard.columns]
+
+        if plan.unverified:
+            participant_group_part = f"-P {shlex.quote(get_selected_participant_group())}"
+            if self.pull_and_update_ui(f"--update {participant_group_part} --report-progress", plan.get_unverified_columns()):
+                pulled_cells += plan.unverified
+
+        try:
+            plan.record_markers(self.target_folder, pulled_cells)
+        except OSError as e:
+            self.log_from_thread(f"Could not record which files are up to date, the next resume checks them again: {e}")
+        return True
+
+    def get_stall_timeout(self):
+        """
+        Return the number of seconds without progress after which a download is restarted, or None to never restart it.
+        """
+        minutes = get_stall_timeout_minutes()
+        return minutes * 60 if minutes else None
+
+    def pep_pull_sharded_and_update_ui(self, selected_columns, is_scheduled=False):
+        """
+        Pull the selected columns with several PEP CLI processes and update the UI based on the output.
+
+        When priorities were set for the columns, they are pulled in batches ordered by priority and estimated size,
+        so the important columns are ready for unzipping and combining while the others are still downloading.
+        When unzipping while downloading, every column is pulled on its own: pepcli only moves the files of a pull
+        into place when it has finished, and every finished pull is merged into the target folder right away.
+        Otherwise the columns are divided over shards that are pulled in parallel.
+
+        Args:
+            selected_columns (list): The columns to pull, divided over the shards.
+            is_scheduled (bool): Pull the columns in batches ordered by priority and estimated size.
+        """
+        if is_scheduled:
+            shards = plan_scheduled_pull(selected_columns, self.target_folder, get_column_size_estimates(), get_column_priorities())
+            self.log_from_thread("Download order: " + " | ".join(", ".join(shard.columns) for shard in shards))
+        elif get_unzip_while_downloading():
+            shards = plan_pull_shards(selected_columns, len(selected_columns), self.target_folder)
         else:
-            if selected_columns:
-                command = f"pull --output-directory \"{self.target_folder}\" -P * --report-progress"
-            else:
-                command = f"pull --output-directory \"{self.target_folder}\" --all-accessible --report-progress"
-            if get_resume_download():
-                command += f" {resume_command}"
+            shards = plan_pull_shards(selected_columns, get_pull_shard_count(), self.target_folder)
+        pull_arguments = {"participant_groups": [get_selected_participant_group()], "report_progress": True}
+        if get_resume_download():
+            pull_arguments.update(resume=True, update=True)
+
+        self.pull_shards_and_update_ui(shards, **pull_arguments)
+
+    def pull_shards_and_update_ui(self, shards, **pull_arguments):
+        """
+        Pull shards with several PEP CLI processes, show their output and status, and report the shards that failed.
 
-            for output_line in self.pepcli.pep_pull(command):
-                self.add_output_line_to_progress_text(f"{output_line}\n")
+        Args:
+            shards (list): The PullShard objects to pull.
+            **pull_arguments: Further arguments of PepClientBase.pull.
+        """
+        output = self.pepcli.pep_pull_sharded(shards, self.target_folder, retries=get_stall_restarts(), telemetry=self.telemetry, stall_timeout=self.get_stall_timeout(), max_concurrent=get_pull_shard_count(),
+                                              write_limiter=default_write_rate_limiter, **pull_arguments)
+        for batch in PullOutputReader(output, with_source=True).batches():
+            self.after(0, self.add_output_line_to_progress_text, batch.text(lambda shard, line: f"[{shard.index + 1}/{len(shards)}] {line}"))
+            for shard, output_line in batch.progress_lines():
+                self.update_progress(output_line, source=shard.index)
+            self.after(0, lambda text=self.get_shard_status_text(shards): self.shard_status_label.config(text=text))
+
+        self.after(0, lambda text=self.get_shard_status_text(shards): self.shard_status_label.config(text=text))
+        for shard in shards:
+            if shard.status == "failed" and shard.participants:
+                self.download_errors.append(f"Download of columns {', '.join(shard.columns)} for {len(shard.participants)} participant(s) failed after {shard.attempts} attempts "
+                                            f"(exit code {shard.exit_code}).")
+            elif shard.status == "failed":
+                self.download_errors.append(f"Download of columns {', '.join(shard.columns)} failed after {shard.attempts} attempts (exit code {shard.exit_code}).")
+
+        remove_shards_folder(self.target_folder)
+
+    def get_shard_status_text(self, shards):
+        """
+        Summarise the status of the shards of a sharded pull.
+
+        Args:
+            shards (list): The PullShard objects of the pull.
+
+        Returns:
+            str: The number of shards per status.
+        """
+        statuses = ["pending", "running", "retrying", "done", "failed"]
+        counts = [f"{sum(1 for shard in shards if shard.status == status)} {status}" for status in statuses]
+        return f"Downloads: {', '.join(counts)}"
+
+    def update_progress(self, output_line, source=None):
+        """
+        Update the progress bar, throughput and remaining time from a line of pull output, and write the status file.
+
+        Args:
+            output_line (str): A line of `pepcli pull --report-progress` output.
+            source (int): The shard the line belongs to, for sharded pulls.
+        """
+        event = parse_progress_line(output_line)
+        if not event.is_progress():
+            return
+
+        self.progress_estimator.update(event, source)
+
+        # Count the bytes pepcli wrote towards the disk write rate, which the unzip step and new shards wait for
+        if event.bytes_done is not None:
+            default_write_rate_limiter.observe(event.bytes_done - self.written_bytes.get(source, 0))
+            self.written_bytes[source] = max(event.bytes_done, self.written_bytes.get(source, 0))
+        fraction = self.progress_estimator.get_fraction()
+        summary = self.progress_estimator.get_summary_text()
+        self.after(0, self.show_progress, fraction, summary)
+
+        if time.monotonic() - self.status_written_at >= 2:
+            self.write_status_file("downloading")
+
+    def show_progress(self, fraction, summary):
+        """
+        Show the download progress on the progress bar and the label below it.
+
+        Args:
+            fraction (float): The downloaded fraction, or None when the total is not known.
+            summary (str): The progress summary with throughput and remaining time.
+        """
+        if fraction is not None:
+            if str(self.progress_bar.cget("mode")) != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.config(mode="determinate")
+            self.progress_bar.config(value=fraction * 100)
+
+        self.progress_details_label.config(text=summary)
+
+    def write_status_file(self, state):
+        """
+        Write the download progress to a status file next to the target folder, for unattended downloads.
+
+        Args:
+            state (str): The state of the download, 'downloading', 'complete' or 'failed'.
+        """
+        self.status_written_at = time.monotonic()
+        try:
+            self.progress_estimator.write_status_file(get_status_filepath(self.target_folder), state=state, target_folder=self.target_folder)
+        except OSError:
+            pass
+
+    def write_download_report(self):
+        """
+        Record the downloaded files per participant and column, then write and show the summary report of the download.
+        """
+        try:
+            self.telemetry.record_inventory(self.target_folder)
+            summary = self.telemetry.write_report(get_report_filepath(self.target_folder))
+        except OSError as e:
+            self.log_from_thread(f"Could not write the download report: {e}")
+            return
+
+        for line in format_summary(summary):
+            self.log_from_thread(line)
 
     def add_output_line_to_progress_text(self, line):
         """
@@ -117,11 +392,46 @@ class DownloadProgressPage(tk.Frame):
         self.download_log.config(state='disabled')
         self.download_log.see('end')
 
+    def log_from_thread(self, line):
+        """
+        Add a line of output to the progress text widget from a background thread.
+
+        Args:
+            line (str): The line of text to add to the progress display.
+        """
+        self.after(0, self.add_output_line_to_progress_text, f"{line}\n")
+
     def handle_download_complete(self):
         """
         Handle actions and UI updates when the download has completed.
         """
-        self.add_output_line_to_progress_text("Download Complete!\n")
+        if self.download_errors:
+            self.add_output_line_to_progress_text("Download Failed!\n" + "".join(f"{error}\n" for error in self.download_errors))
+            messagebox.showerror("Download failed", "\n".join(self.download_errors) + "\n\nThe files that were downloaded are kept, resume the download to get the rest.")
+        else:
+            self.add_output_line_to_progress_text("Download Complete!\n")
+
+        # A targeted pull is for this download only, the next download pulls the participant group again
+        set_selected_participants([])
+
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate", value=100)
+        self.write_status_file("failed" if self.download_errors else "complete")
+        threading.Thread(target=self.write_download_report, daemon=True).start()
+
+        if self.pipelined_unzipper:
+            self.add_output_line_to_progress_text("Unzipping the remaining participants...\n")
+            threading.Thread(target=self.finish_unzipping, daemon=True).start()
+        else:
+            self.can_continue = True
+
+    def finish_unzipping(self):
+        """
+        Unzip the archives that were not unzipped during the download and allow continuing afterwards.
+        """
+        self.pipelined_unzipper.finish()
+        self.pipelined_unzipper = None
+        self.log_from_thread("Unzipping Complete!")
         self.can_continue = True
 
     def on_next_page(self):
@@ -1,12 +1,16 @@
 import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tkinter import ttk, filedialog, messagebox
 import os
-import zipfile
 from queue import Queue
 
-from helpers.functions import get_filepath_for_executable, make_path_os_safe, set_target_folder
+from helpers.functions import (
+    get_filepath_for_executable, get_selected_columns, get_token_filepath, make_path_os_safe, get_max_extraction_workers,
+    get_extraction_rules, set_extraction_rules, set_resume_download, set_selected_columns, set_selected_participants, set_target_folder
+)
 from helpers.header import HeaderComponent
+from helpers.unzip_archives import ExtractionRules, check_archives, integrity_report_filename, rename_participant_archives, unzip_participant_folder
 from helpers.navigation_buttons import get_navigation_buttons, go_to_next_page
 
 
@@ -26,6 +30,7 @@ class UnzipPage(tk.Frame):
         self.poll_log_queue()  # Start polling the log queue
         self.participant_folders = []
         self.unzip_done = False
+        self.columns_before_repull = None
 
     def setup_ui(self):
         """
@@ -51,6 +56,28 @@ class UnzipPage(tk.Frame):
         self.select_folder_button = tk.Button(self, text="Select Download Folder", command=self.select_download_folder)
         self.select_folder_button.pack(pady=10)
 
+        # Button to check the downloaded archives for damage before unzipping
+        self.check_archives_button = tk.Button(self, text="Check Archives", command=self.start_checking_archives)
+        self.check_archives_button.pack(pady=(0, 10))
+
+        # Extraction options
+        options_frame = tk.Frame(self)
+        options_frame.pack(pady=5, padx=10)
+
+        self.selected_columns_only_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Only unzip the columns selected for download", variable=self.selected_columns_only_var).grid(row=0, column=0, columnspan=2, sticky="w")
+
+        self.skip_mri_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Skip MRI columns", variable=self.skip_mri_var).grid(row=1, column=0, columnspan=2, sticky="w")
+
+        tk.Label(options_frame, text="Only unzip files matching (e.g. *.csv):").grid(row=2, column=0, sticky="w")
+        self.include_patterns_var = tk.StringVar()
+        tk.Entry(options_frame, textvariable=self.include_patterns_var, width=30).grid(row=2, column=1, sticky="w")
+
+        tk.Label(options_frame, text="Skip files larger than (MB):").grid(row=3, column=0, sticky="w")
+        self.max_file_size_var = tk.StringVar()
+        tk.Entry(options_frame, textvariable=self.max_file_size_var, width=10).grid(row=3, column=1, sticky="w")
+
         # Log display
         self.log_display = tk.Text(self, height=15, state='disabled', wrap='word')
         self.log_display.pack(pady=10, padx=10, fill='both', expand=True)
@@ -62,6 +89,21 @@ class UnzipPage(tk.Frame):
 
         get_navigation_buttons(self, "unzip_page", next_button_name="Start Unzipping", skip_button_name="Skip Unzipping", skip_to_page="combine_columns_introduction_page")
 
+    def on_show_frame(self):
+        """
+        Show the extraction rules as set on the download page.
+        """
+        # Back from re-pulling damaged archives, select the columns of the download again
+        if self.columns_before_repull is not None:
+            set_selected_columns(self.columns_before_repull)
+            self.columns_before_repull = None
+
+        rules = get_extraction_rules()
+        if rules is not None:
+            self.selected_columns_only_var.set(bool(rules.include_columns))
+            self.skip_mri_var.set("*mri*" in rules.exclude_columns)
+            self.include_patterns_var.set(", ".join(rules.include_patterns))
+
     def on_next_page(self):
         return self.start_unzipping()
 
@@ -75,14 +117,37 @@ class UnzipPage(tk.Frame):
             self.log(f"Selected folder: {self.download_folder}")
             set_target_folder(self.download_folder)
 
-    def run_unzipping(self):
+    def get_extraction_rules(self):
+        """
+        Build the extraction rules from the options selected on the page.
+
+        Returns:
+            ExtractionRules: The rules selecting which columns and files are unzipped.
+
+        Raises:
+            ValueError: If the maximum file size is not a number.
+        """
+        include_columns = get_selected_columns() if self.selected_columns_only_var.get() else []
+        exclude_columns = ["*mri*"] if self.skip_mri_var.get() else []
+        include_patterns = [pattern.strip() for pattern in self.include_patterns_var.get().split(",") if pattern.strip()]
+
+        max_member_size = None
+        if self.max_file_size_var.get().strip():
+            max_member_size = int(float(self.max_file_size_var.get()) * 1024 * 1024)
+
+        return ExtractionRules(include_columns=include_columns, exclude_columns=exclude_columns, include_patterns=include_patterns, max_member_size=max_member_size)
+
+    def run_unzipping(self, rules):
         """
         Manage the unzipping process by renaming and unzipping files.
+
+        Args:
+            rules (ExtractionRules): The rules selecting which columns and files are unzipped.
         """
         self.participant_folders = [participant_folder for participant_folder in os.listdir(self.download_folder)
                                     if participant_folder.startswith("HBU")]
         self.rename_to_zip(self.download_folder)
-        self.unzip_files(self.download_folder)
+        self.unzip_files(self.download_folder, rules)
         self.log("Unzipping finished!")
 
         confirm = messagebox.askyesno("Unzipping finished!", "Go to next page?")
@@ -101,12 +166,80 @@ class UnzipPage(tk.Frame):
             if confirm:
                 go_to_next_page(self)
 
+        try:
+            rules = self.get_extraction_rules()
+        except ValueError:
+            messagebox.showwarning("Invalid file size", "Please enter the maximum file size as a number of megabytes.")
+            return False
+        set_extraction_rules(rules)
+
         confirm = messagebox.askyesno("Confirm", "Start the unzipping process?")
         if confirm:
-            threading.Thread(target=self.run_unzipping).start()
+            threading.Thread(target=self.run_unzipping, args=(rules,)).start()
         else:
             self.log("Unzipping cancelled by user.")
 
+    def start_checking_archives(self):
+        """
+        Start checking the downloaded archives for damage in a background thread.
+        """
+        if not getattr(self, 'download_folder', ''):
+            messagebox.showwarning("No folder selected", "Please select the download folder first.")
+            return
+
+        self.log("Started checking archives")
+        threading.Thread(target=self.run_checking_archives, args=(self.download_folder,), daemon=True).start()
+
+    def run_checking_archives(self, download_folder):
+        """
+        Check all downloaded archives and offer to download the damaged ones again.
+
+        Args:
+            download_folder (str): The path of the folder containing the participant folders.
+        """
+        def update_progress(checked, total):
+            if checked % 100 == 0 or checked == total:
+                self.log(f"({checked}/{total}) - Checked archives")
+
+        bad_archives = check_archives(download_folder, update_progress=update_progress, max_workers=get_max_extraction_workers())
+
+        for bad_archive in bad_archives:
+            self.log(f"Damaged archive {bad_archive['path']}: {bad_archive['error']}")
+        self.log(f"Checking archives finished, {len(bad_archives)} damaged archives found. Report written to '{integrity_report_filename}'.")
+
+        if bad_archives:
+            self.after(0, self.ask_repull_damaged_archives, download_folder, bad_archives)
+
+    def ask_repull_damaged_archives(self, download_folder, bad_archives):
+        """
+        Ask the user to remove the damaged archives and download them again for the affected participants only.
+
+        Args:
+            download_folder (str): The path of the folder containing the participant folders.
+            bad_archives (list): The damaged archives reported by the check.
+        """
+        participants = sorted({bad_archive["participant"] for bad_archive in bad_archives})
+        columns = sorted({bad_archive["column"] for bad_archive in bad_archives})
+
+        if not get_token_filepath():
+            messagebox.showwarning("Damaged archives", f"{len(bad_archives)} damaged archives found. Please upload your token file to download them again.")
+            return
+
+        confirm = messagebox.askyesno("Damaged archives", f"{len(bad_archives)} damaged archives found for {len(participants)} participants. "
+                                                          "Remove them and download them again?")
+        if not confirm:
+            return
+
+        for bad_archive in bad_archives:
+            os.remove(bad_archive["path"])
+
+        set_target_folder(download_folder)
+        set_resume_download(False)
+        self.columns_before_repull = get_selected_columns()
+        set_selected_columns(columns)
+        set_selected_participants(participants)
+        self.controller.show_frame("download_progress_page")
+
     def log(self, message):
         """
         Log a message to the log queue.
@@ -140,54 +273,45 @@ class UnzipPage(tk.Frame):
         total_participants = 1
         total = len(self.participant_folders)
         for participant_folder in self.participant_folders:
-            files_to_rename = []
-
             participant_folder_path = os.path.join(download_folder, participant_folder)
             participant_folder_path = get_filepath_for_executable(participant_folder_path)
 
             if os.path.isdir(participant_folder_path):
                 self.log(f"({total_participants}/{total}) - Searching .zip files for participant '{participant_folder}'")
-                files = [f for f in os.listdir(participant_folder_path) if "." not in f and not os.path.isdir(os.path.join(participant_folder_path, f))]
-                files_to_rename.extend(files)
-
-            for file in files_to_rename:
-                total_renamed += 1
-                original_filepath = os.path.join(participant_folder_path, file)
-                original_filepath = get_filepath_for_executable(original_filepath)
-                new_filepath = f"{original_filepath}.zip"
-                new_filepath = get_filepath_for_executable(new_filepath)
-                os.rename(original_filepath, new_filepath)
+                total_renamed += rename_participant_archives(participant_folder_path)
 
             total_participants += 1
 
         self.log(f"({total}/{total}) - Completed renaming files to .zip, total files renamed: {total_renamed}")
         self.log("Hold on, we're almost halfway in the unzipping process!")
 
-    def unzip_files(self, download_folder):
+    def unzip_files(self, download_folder, rules=None):
         """
         Unzip all files with '.zip' extensions within the specified folder.
 
+        Archives that were already extracted completely by an earlier run are skipped,
+        using the extraction manifest kept in each participant folder.
+
         Args:
             download_folder (str): The path of the folder containing '.zip' files to unzip.
+            rules (ExtractionRules): The rules selecting which columns and files are unzipped, everything when None.
         """
         total = len(self.participant_folders) + 1
         total_unzipped = 1
-        for participant_folder in self.participant_folders:
-            participant_folder_path = os.path.join(download_folder, participant_folder)
-            participant_folder_path = get_filepath_for_executable(participant_folder_path)
-            if os.path.isdir(participant_folder_path):
-                zip_files = [f for f in os.listdir(participant_folder_path) if f.endswith('.zip')]
-                for item in zip_files:
-                    item_path = os.path.join(participant_folder_path, item)
-                    item_path = get_filepath_for_executable(item_path)
-                    new_filename = item.replace(".zip", "")
-                    new_filepath = os.path.join(participant_folder_path, new_filename)
-                    new_filepath = get_filepath_for_executable(new_filepath)
-                    try:
-                        with zipfile.ZipFile(item_path, 'r') as zip_ref:
-                            zip_ref.extractall(new_filepath)
-                    except Exception as e:
-                        self.log(f"Error unzipping {item_path}: {e}")
+        participant_folder_paths = {participant_folder: get_filepath_for_executable(os.path.join(download_folder, participant_folder))
+                                    for participant_folder in self.participant_folders}
+
+        # Participants are unzipped in parallel, by at most the configured number of extraction workers
+        with ThreadPoolExecutor(max_workers=get_max_extraction_workers()) as executor:
+            futures = {executor.submit(unzip_participant_folder, participant_folder_path, self.log, rules): participant_folder
+                       for participant_folder, participant_folder_path in participant_folder_paths.items() if os.path.isdir(participant_folder_path)}
+
+            for future in as_completed(futures):
+                participant_folder = futures[future]
+                extracted, skipped = future.result()
 
                 total_unzipped += 1
-                self.log(f"({total_unzipped}/{total}) - Unzipped .zip files from participant '{participant_folder}'")
+                if skipped:
+                    self.log(f"({total_unzipped}/{total}) - Unzipped {extracted} .zip files from participant '{participant_folder}', {skipped} already unzipped")
+                else:
+                    self.log(f"({total_unzipped}/{total}) - Unzipped .zip files from participant '{participant_folder}'")
@@ -0,0 +1,258 @@
+"""
+A simulated pepcli executable, to exercise and benchmark the PEP clients without a PEP server, Docker image or client.sif.
+
+Run it as `python fake_pepcli.py [fake options] <pepcli arguments>`. The fake options come first and can also be set
+with environment variables, for example '--fake-latency 0.5' or FAKE_PEPCLI_LATENCY=0.5:
+
+    --fake-latency SECONDS       Delay before a command writes any output, like container start-up and authentication.
+    --fake-line-delay SECONDS    Delay between the progress lines of a pull.
+    --fake-output-lines COUNT    Number of additional log lines every command writes.
+    --fake-fail-rate FRACTION    Fraction of the commands that fail.
+    --fake-fail-commands NAMES   Comma separated subcommands that always fail, for example 'pull,store'.
+    --fake-fail-exit-code CODE   Exit code of failing commands.
+    --fake-fail-message TEXT     Error message of failing commands, for example 'Access denied'.
+    --fake-stall SECONDS         Time a pull hangs without progress halfway, unless it is resumed.
+    --fake-stall-log-interval S  Seconds between the log lines a hanging pull writes, 0 to write nothing.
+    --fake-participants COUNT    Number of participants in the synthetic data set.
+    --fake-columns NAMES         Comma separated columns in the synthetic data set.
+    --fake-file-size BYTES       Size of the data in every archive of a pull.
+    --fake-seed SEED             Seed for the participant identifiers, failures and data.
+
+A pull writes participant folders with a zip archive (without extension) per column into '<output>-pending', and
+renames it to the output directory when it is done, like pepcli does.
+
+Set PEP_SIMULATED_ENGINE=1 before starting the tool to offer this simulated engine as 'Simulated' on the token page.
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import time
+import zipfile
+
+default_options = {
+    "latency": 0.0,
+    "line_delay": 0.0,
+    "output_lines": 0,
+    "fail_rate": 0.0,
+    "fail_commands": "",
+    "fail_exit_code": 1,
+    "fail_message": "",
+    "stall": 0.0,
+    "stall_log_interval": 0.0,
+    "participants": 20,
+    "columns": "Questionnaire,Visit1,Visit2,MRI,Genetics",
+    "file_size": 10000,
+    "seed": 42,
+}
+
+
+def parse_arguments(arguments):
+    """
+    Split the fake options from the pepcli arguments.
+
+    Args:
+        arguments (list): The command line arguments.
+
+    Returns:
+        tuple: The options and the remaining pepcli arguments.
+    """
+    options = {}
+    for name, default in default_options.items():
+        value = os.environ.get(f"FAKE_PEPCLI_{name.upper()}")
+        options[name] = type(default)(value) if value is not None else default
+
+    while arguments and arguments[0].startswith("--fake-"):
+        name = arguments[0][len("--fake-"):].replace("-", "_")
+        if name not in default_options or len(arguments) < 2:
+            raise SystemExit(f"Unknown fake option: {arguments[0]}")
+        options[name] = type(default_options[name])(arguments[1])
+        arguments = arguments[2:]
+
+    return options, arguments
+
+
+def get_option_values(arguments, *names):
+    return [arguments[index + 1] for index, argument in enumerate(arguments[:-1]) if argument in names]
+
+
+def get_participants(options):
+    generator = random.Random(options["seed"])
+    return [f"HBU{generator.randrange(10 ** 6, 10 ** 7)}" for _ in range(options["participants"])]
+
+
+def get_group_participants(groups, options):
+    """
+    Return the participants of participant groups: '*' contains all participants and 'pilot' every tenth.
+    """
+    participants = get_participants(options)
+    if "*" in groups:
+        return participants
+
+    return participants[::10] if "pilot" in groups else []
+
+
+def get_columns(options):
+    return [column for column in options["columns"].split(",") if column]
+
+
+def get_subcommand(arguments):
+    words = [argument for argument in arguments if not argument.startswith("-")][:2]
+    return " ".join(words)
+
+
+def build_archive(participant, column, file_size, seed):
+    """
+    Build a zip archive with a small CSV file and a data file of the requested size, the same for every call.
+    """
+    generator = random.Random(f"{seed}-{participant}-{column}")
+    archive_buffer = io.BytesIO()
+    with zipfile.ZipFile(archive_buffer, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr(f"{column}.csv", f"participant;column;value\n{participant};{column};{generator.random():.6f}\n")
+        archive.writestr(f"{column}/data.bin", generator.getrandbits(8 * file_size).to_bytes(file_size, "little") if file_size else b"")
+
+    return archive_buffer.getvalue()
+
+
+def query(arguments, options):
+    subcommand = get_subcommand(arguments)
+
+    if subcommand == "query enrollment":
+        print("Enrolled as user 'simulated@example.org' in the user group 'Research Assessor'")
+    elif subcommand == "query column-access":
+        print(f"Columns ({len(get_columns(options))}):")
+        for column in get_columns(options):
+            print(f"  r {column}")
+    elif subcommand == "query participant-group-access":
+        print("Participant groups (2):")
+        print("  * (access: enumerate, read)")
+        print("  pilot (access: enumerate, read)")
+    else:
+        print(f"Unknown query: {subcommand}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def list_data(arguments, options):
+    columns = get_option_values(arguments, "-c", "--columns") or get_columns(options)
+    participants = get_option_values(arguments, "-p", "--participants")
+    participants += get_group_participants(get_option_values(arguments, "-P", "--participant-groups"), options)
+
+    archives = {(participant, column): build_archive(participant, column, options["file_size"], options["seed"]) for participant in participants for column in columns}
+    entries = [{"ids": {"ParticipantIdentifier": participant},
+                "metadata": {column: {"size": len(archives[participant, column])} for column in columns},
+                "links": {column: hashlib.sha256(archives[participant, column]).hexdigest() for column in columns}}
+               for participant in participants]
+    print(json.dumps(entries))
+
+    return 0
+
+
+def pull(arguments, options):
+    """
+    Simulate a pull into '<output>-pending', reporting the progress per archive when '--report-progress' is given.
+    """
+    output_directory = (get_option_values(arguments, "--output-directory", "-o") or ["pulled-data"])[0]
+    resume, update, force = "--resume" in arguments, "--update" in arguments, "--force" in arguments
+
+    if os.path.exists(output_directory) and not (resume or update or force):
+        print(f"Output directory '{output_directory}' already exists. Use --update to update it.", file=sys.stderr)
+        return 1
+
+    columns = get_option_values(arguments, "-c", "--columns")
+    if not columns or "*" in columns:
+        columns = get_columns(options)
+    participants = get_option_values(arguments, "-p", "--participants") + get_group_participants(get_option_values(arguments, "-P", "--participant-groups"), options)
+    if not participants and "--all-accessible" in arguments:
+        participants = get_participants(options)
+
+    pending_directory = f"{output_directory.rstrip(os.sep)}-pending"
+    os.makedirs(os.path.join(pending_directory, ".pepData"), exist_ok=True)
+
+    items = [(participant, column) for participant in participants for column in columns]
+    total_bytes = 0
+
+    for done, (participant, column) in enumerate(items, start=1):
+        if options["stall"] and not resume and done == len(items) // 2 + 1:
+            stall_until = time.monotonic() + options["stall"]
+            while options["stall_log_interval"] and time.monotonic() + options["stall_log_interval"] < stall_until:
+                time.sleep(options["stall_log_interval"])
+                print("Warning: waiting for the server to respond", flush=True)
+            time.sleep(max(0.0, stall_until - time.monotonic()))
+
+        participant_directory = os.path.join(pending_directory, participant)
+        os.makedirs(participant_directory, exist_ok=True)
+        archive_path = os.path.join(participant_directory, column)
+        existing_archive = os.path.join(output_directory, participant, column)
+
+        if not ((resume or update) and (os.path.exists(archive_path) or os.path.exists(existing_archive))):
+            with open(archive_path, "wb") as archive_file:
+                archive_file.write(build_archive(participant, column, options["file_size"], options["seed"]))
+        if os.path.exists(archive_path):
+            total_bytes += os.path.getsize(archive_path)
+
+        if "--report-progress" in arguments:
+            print(f"Downloaded {done}/{len(items)} files, {total_bytes} B, participant {participant}, column {column}", flush=True)
+        if options["line_delay"]:
+            time.sleep(options["line_delay"])
+
+    with open(os.path.join(pending_directory, ".pepData", "specification.json"), "w") as specification_file:
+        json.dump({"columns": columns, "participants": participants}, specification_file)
+
+    # Move the pending folder to the output directory, merging into it when it exists
+    if not os.path.exists(output_directory):
+        os.replace(pending_directory, output_directory)
+    else:
+        for root, _, files in os.walk(pending_directory):
+            destination_root = os.path.join(output_directory, os.path.relpath(root, pending_directory))
+            os.makedirs(destination_root, exist_ok=True)
+            for file in files:
+                os.replace(os.path.join(root, file), os.path.join(destination_root, file))
+        shutil.rmtree(pending_directory, ignore_errors=True)
+
+    print(f"Pulled {len(items)} files", flush=True)
+
+    return 0
+
+
+def main(arguments):
+    options, arguments = parse_arguments(arguments)
+
+    # Skip the global pepcli options that the clients add
+    while arguments and arguments[0] in ("--client-working-directory", "--oauth-token"):
+        arguments = arguments[2:]
+
+    subcommand = get_subcommand(arguments)
+    failures = random.Random(f"{options['seed']}-{' '.join(arguments)}-{time.time()}")
+
+    if options["latency"]:
+        time.sleep(options["latency"])
+
+    for index in range(options["output_lines"]):
+        print(f"Simulated log line {index + 1} of {options['output_lines']} for '{subcommand}'", file=sys.stderr if subcommand != "pull" else sys.stdout)
+
+    if subcommand.split(" ")[0] in options["fail_commands"].split(",") or failures.random() < options["fail_rate"]:
+        print(options["fail_message"] or f"Simulated failure of '{subcommand}'", file=sys.stderr)
+        return options["fail_exit_code"]
+
+    command = subcommand.split(" ")[0]
+    if command == "query":
+        return query(arguments, options)
+    elif command == "list":
+        return list_data(arguments, options)
+    elif command == "pull":
+        return pull(arguments, options)
+    elif command in ("store", "ama"):
+        print(f"Simulated '{' '.join(arguments)}'")
+        return 0
+
+    print(f"Unknown command: {subcommand}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,114 @@
+import csv
+import json
+import os
+import threading
+
+
+class StoreEntry:
+    """
+    A single file of a bulk store, uploaded to one column of one participant.
+
+    Attributes:
+        column (str): The column to store the file in.
+        participant (str): The participant identifier.
+        path (str): The path of the file to upload.
+        status (str): One of 'pending', 'done', 'skipped' or 'failed'.
+        error (str): The error message of the last failed attempt.
+    """
+
+    def __init__(self, column, participant, path):
+        self.column = column
+        self.participant = participant
+        self.path = path
+        self.status = "pending"
+        self.error = ""
+
+    def get_journal_key(self):
+        """
+        Return the key of this entry in the journal, which changes when the file is modified.
+
+        Returns:
+            list: The column, participant, absolute path, size and modification time of the file.
+        """
+        stat = os.stat(self.path)
+        return [self.column, self.participant, os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns]
+
+    def __repr__(self):
+        return f"StoreEntry(column={self.column!r}, participant={self.participant!r}, path={self.path!r}, status={self.status!r})"
+
+
+def read_store_manifest(manifest_filepath):
+    """
+    Read a bulk store manifest, a CSV file with the columns 'column', 'participant' and 'path'.
+
+    Relative paths are resolved against the folder of the manifest.
+
+    Args:
+        manifest_filepath (str): Path to the manifest file.
+
+    Returns:
+        list: The StoreEntry objects, in the order of the manifest.
+
+    Raises:
+        ValueError: If the manifest does not have the required columns.
+    """
+    manifest_folder = os.path.dirname(os.path.abspath(manifest_filepath))
+
+    with open(manifest_filepath, newline="", encoding="utf-8") as manifest_file:
+        reader = csv.DictReader(manifest_file)
+        missing = {"column", "participant", "path"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Store manifest '{manifest_filepath}' is missing the columns: {', '.join(sorted(missing))}")
+
+        return [StoreEntry(row["column"].strip(), row["participant"].strip(), os.path.join(manifest_folder, row["path"].strip()))
+                for row in reader if row["column"] and row["participant"] and row["path"]]
+
+
+class StoreJournal:
+    """
+    An append-only journal of the files a bulk store has uploaded, so an interrupted upload can be resumed.
+
+    Every line is a JSON list with the journal key of an uploaded entry, see StoreEntry.get_journal_key.
+    A file that changed after it was uploaded has a different key and is uploaded again.
+    """
+
+    def __init__(self, journal_filepath):
+        self.journal_filepath = journal_filepath
+        self.lock = threading.Lock()
+        self.completed = self._load()
+
+    def _load(self):
+        completed = set()
+        if not os.path.isfile(self.journal_filepath):
+            return completed
+
+        with open(self.journal_filepath, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    completed.add(tuple(json.loads(line)))
+                except (ValueError, TypeError):
+                    # A line cut off by an interruption, that entry is uploaded again
+                    continue
+
+        return completed
+
+    def is_completed(self, entry):
+        try:
+            return tuple(entry.get_journal_key()) in self.completed
+        except OSError:
+            return False
+
+    def record(self, entry):
+        """
+        Add an uploaded entry to the journal and flush it to disk immediately.
+
+        Args:
+            entry (StoreEntry): The uploaded entry.
+        """
+        key = entry.get_journal_key()
+        with self.lock:
+            self.completed.add(tuple(key))
+            with open(self.journal_filepath, "a", encoding="utf-8") as journal_file:
+                journal_file.write(json.dumps(key) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
@@ -0,0 +1,154 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class PepQueryCache:
+    """
+    A cache for the output of PEP queries whose answer rarely changes, such as the enrollment and the column access.
+
+    Entries are keyed by a hash of the token file and the PEP environment, so a different token or environment never
+    sees another user's answers. The cache is stored on disk, so it also holds between sessions of the tool.
+
+    Args:
+        cache_filepath (str): The file the cache is stored in.
+        ttl (float): Number of seconds an entry stays valid.
+    """
+
+    default_cache_filepath = os.path.join(os.path.expanduser("~"), ".hbs_data_request_tool", "pep_query_cache.json")
+
+    def __init__(self, cache_filepath=None, ttl=3600):
+        self.cache_filepath = cache_filepath or self.default_cache_filepath
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def set_ttl(self, ttl):
+        """
+        Set the number of seconds an entry stays valid.
+
+        Args:
+            ttl (float): The time to live in seconds.
+        """
+        self.ttl = ttl
+
+    def get_client_key(self, client):
+        """
+        Build the cache key for a client from its token file, engine, environment and authentication method.
+
+        Args:
+            client (PepClientBase): The client running the queries.
+
+        Returns:
+            str: The cache key, or None if the token file can not be read.
+        """
+        if client.auth_method == "token":
+            try:
+                with open(client.pep_token_filepath, 'rb') as f:
+                    token_hash = hashlib.sha256(f.read()).hexdigest()
+            except (OSError, TypeError):
+                return None
+        else:
+            token_hash = "logon"
+
+        environment = "production" if client.production else "acceptance"
+        return f"{type(client).__name__}:{environment}:{client.auth_method}:{token_hash}"
+
+    def _load(self):
+        if self.entries is not None:
+            return
+
+        try:
+            with open(self.cache_filepath, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_filepath), exist_ok=True)
+        temp_cache_filepath = f"{self.cache_filepath}.tmp"
+
+        # The cache holds account information, so only the user may read it
+        with open(os.open(temp_cache_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_cache_filepath, self.cache_filepath)
+
+    def get(self, client, query):
+        """
+        Return the cached output of a query, if it is still valid.
+
+        Args:
+            client (PepClientBase): The client running the query.
+            query (str): The name of the query.
+
+        Returns:
+            dict: The parsed output of the query, or None if it is not cached or expired.
+        """
+        key = self.get_client_key(client)
+        if key is None:
+            return None
+
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key, {}).get(query)
+
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+
+        return copy.deepcopy(entry["output"])
+
+    def set(self, client, query, output):
+        """
+        Store the output of a query.
+
+        Args:
+            client (PepClientBase): The client that ran the query.
+            query (str): The name of the query.
+            output (dict): The parsed output of the query.
+        """
+        key = self.get_client_key(client)
+        if key is None:
+            return
+
+        with self.lock:
+            self._load()
+            self.entries.setdefault(key, {})[query] = {"time": time.time(), "output": output}
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def invalidate(self, client=None, query=None):
+        """
+        Remove cached entries.
+
+        Args:
+            client (PepClientBase): Only remove the entries of this client, all entries when None.
+            query (str): Only remove the entries of this query, all queries when None.
+        """
+        with self.lock:
+            self._load()
+
+            if client is None:
+                keys = list(self.entries)
+            else:
+                keys = [self.get_client_key(client)]
+
+            for key in keys:
+                if key not in self.entries:
+                    continue
+                if query is None:
+                    del self.entries[key]
+                else:
+                    self.entries[key].pop(query, None)
+
+            try:
+                self._save()
+            except OSError:
+                pass
+
+
+default_query_cache = PepQueryCache()
@@ -4,9 +4,10 @@ import platform
 from .pep_client_singularity import PepClientSingularity
 from .pep_client_windows import PepClientWindows
 from .pep_client_docker import PepClientDocker
+from .pep_client_fake import PepClientFake
 
 
-def PepClient(pep_token_filepath="", production=True, auth_method="token", engine=None):
+def PepClient(pep_token_filepath="", production=True, auth_method="token", engine=None, session=False, query_cache=None):
     """
     Factory function to create and return an instance of a PEP client based on the specified OS or the engine provided.
 
@@ -17,7 +18,9 @@ def PepClient(pep_token_filepath="", production=True, auth_method="token", engin
         pep_token_filepath (str): The file path to the PEP authentication token.
         production (bool): Flag to determine whether the client should run in production mode.
         auth_method (str): Method of authentication, default is by token.
-        engine (str, optional): Explicit specification of the engine to use ('docker', 'singularity', 'windows').
+        engine (str, optional): Explicit specification of the engine to use ('docker', 'singularity', 'windows', or 'fake' for the simulated pepcli).
+        session (bool): Run all commands in one long-lived container (Docker) or instance (Singularity).
+        query_cache (PepQueryCache, optional): Cache for the enrollment, column access and participant group access queries.
 
     Returns:
         An instance of one of the PEP client types depending on the operating system or the specified engine.
@@ -28,19 +31,21 @@ def PepClient(pep_token_filepath="", production=True, auth_method="token", engin
     os_name = platform.system().lower()
 
     if engine == "docker":
-        return PepClientDocker(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        return PepClientDocker(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
     elif engine == "singularity":
-        return PepClientSingularity(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        return PepClientSingularity(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
     elif engine == "windows":
-        return PepClientWindows(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        return PepClientWindows(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
+    elif engine == "fake":
+        return PepClientFake(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
     elif engine is not None and engine != "":
         raise ValueError(f"Unsupported engine: {engine}. Please specify engine or switch OS.")
 
     if os_name == 'linux':
-        return PepClientSingularity(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        return PepClientSingularity(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
     elif os_name == 'windows':
-        return PepClientWindows(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        return PepClientWindows(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
     elif os_name == 'darwin':
-        return PepClientDocker(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        return PepClientDocker(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
     else:
         raise ValueError(f"Unsupported operating system: {os_name}. Please specify engine or switch OS.")
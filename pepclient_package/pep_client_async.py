@@ -0,0 +1,723 @@
+import asyncio
+import os
+import shlex
+import subprocess
+import time
+
+from .pep_bulk_store import StoreJournal
+from .pep_delta_pull import DeltaPlan, compare_inventory, load_pulled_markers, plan_delta_shards, scan_local_inventory
+from .pep_executor import CommandMetrics, get_command_name, store_retry_policy
+from .pep_models import ColumnAccess, ColumnSize, ListResult, ParticipantGroupAccess, get_cell_marker
+from .pep_progress import parse_progress_line
+from .pep_sharded_pull import merge_pull_folder
+
+
+def split_into_chunks(items, chunk_size):
+    """
+    Split a list into consecutive chunks of at most `chunk_size` items.
+
+    Args:
+        items (list): The items to split.
+        chunk_size (int): The maximum number of items per chunk.
+
+    Returns:
+        list: The chunks.
+    """
+    items = list(items)
+    return [items[index:index + chunk_size] for index in range(0, len(items), chunk_size)]
+
+
+class AsyncPepClient:
+    """
+    An asyncio variant of the PEP client, running PEP CLI commands as asyncio subprocesses without a shell.
+
+    The commands are built by the wrapped engine client (Docker, Singularity or Windows), so both clients share
+    the authentication, session container and working directories. At most `max_concurrency` commands run at the
+    same time per event loop, and cancelling a command kills its process.
+    """
+
+    encoding = "ISO-8859-1"
+    stream_limit = 1024 * 1024
+
+    def __init__(self, client, max_concurrency=4):
+        """
+        Initialize the asyncio PEP client.
+
+        Args:
+            client (PepClientBase): The engine client used to build the commands.
+            max_concurrency (int): Maximum number of PEP CLI processes running at the same time.
+        """
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._semaphore_loop = None
+        self.group_members = {}
+
+    def _get_semaphore(self):
+        """
+        Return the semaphore bounding the number of running commands, created once per event loop.
+        """
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+
+        return self._semaphore
+
+    async def _run_blocking(self, function, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+
+    async def _kill(self, process):
+        """
+        Kill a process if it is still running and wait for it to exit.
+
+        Args:
+            process (asyncio.subprocess.Process): The process to kill.
+        """
+        await self.client.executor.kill(process)
+
+    async def _stop_container(self, full_command):
+        """
+        Stop the container a command runs in, if the engine starts one per command. Killing the client process
+        of a container engine does not always stop the container itself.
+
+        Args:
+            full_command (list): The full argument list of the command.
+        """
+        stop_command = self.client._stop_container_command(full_command)
+        if not stop_command:
+            return
+
+        try:
+            await self._run_blocking(lambda: subprocess.run(stop_command, capture_output=True, timeout=60))
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    async def _prepare(self, command, target_folder=""):
+        """
+        Build the full argument list for a PEP CLI command and lease a working directory for it.
+
+        Args:
+            command (list): The PEP CLI arguments.
+            target_folder (str): Output directory of a pull, when the engine has to make it available.
+
+        Returns:
+            tuple: The full argument list and the working directory.
+        """
+        base_command = await self._run_blocking(self.client._get_base_command)
+        full_command = self.client._build_full_command(base_command, list(command), target_folder)
+        working_directory = await self._run_blocking(self.client._acquire_working_directory)
+
+        return full_command, working_directory
+
+    async def _execute(self, command, target_folder, attempt):
+        """
+        Run a single attempt of a PEP CLI command with the executor of the client and record its metrics.
+
+        Args:
+            command (list): The PEP CLI arguments.
+            target_folder (str): Output directory of a pull, when the engine has to make it available.
+            attempt (int): The number of the attempt, starting at 1.
+
+        Returns:
+            tuple: The exit code, stdout and stderr of the command.
+
+        Raises:
+            subprocess.TimeoutExpired: If the command runs longer than its timeout.
+        """
+        timeout = self.client.get_command_timeout(command)
+        started_at, started = time.time(), time.monotonic()
+        exit_code, stdout, stderr, timed_out = None, b"", b"", False
+
+        try:
+            async with self._get_semaphore():
+                full_command, working_directory = await self._prepare(command, target_folder)
+                try:
+                    exit_code, stdout, stderr = await self.client.executor.run(full_command, working_directory, timeout)
+                finally:
+                    self.client._release_working_directory(working_directory)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            raise
+        finally:
+            self.client.metrics.record(CommandMetrics(get_command_name(command), attempt, started_at, time.monotonic() - started,
+                                                      exit_code, timed_out, len(stdout) + len(stderr)))
+
+        return exit_code, stdout, stderr
+
+    async def command(self, command, target_folder="", retry_policy=None):
+        """
+        Execute a PEP CLI command and parse its output, retrying it according to the retry policy of the client.
+
+        Args:
+            command (str or list): The PEP CLI command, either as a string or as a list of arguments.
+            target_folder (str): Output directory of a pull, when the engine has to make it available.
+            retry_policy (RetryPolicy): Retry the command according to this policy instead of the one of the client.
+
+        Returns:
+            dict: The parsed output, see PepClientBase.pep_command_parser.
+
+        Raises:
+            subprocess.TimeoutExpired: If the last attempt runs longer than the command timeout.
+        """
+        if isinstance(command, str):
+            command = shlex.split(command)
+
+        retry_policy = retry_policy or self.client.retry_policy
+        command_name = get_command_name(command)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                exit_code, stdout, stderr = await self._execute(command, target_folder, attempt)
+            except subprocess.TimeoutExpired:
+                if not retry_policy.should_retry(attempt, None, timed_out=True, command_name=command_name):
+                    raise
+            else:
+                output = (stderr or stdout).decode(self.encoding, errors="replace") if exit_code else ""
+                if not retry_policy.should_retry(attempt, exit_code, command_name=command_name, output=output):
+                    break
+
+            await asyncio.sleep(retry_policy.get_delay(attempt))
+
+        result = stdout if exit_code == 0 else stderr
+
+        return self.client.pep_command_parser(result.decode(self.encoding), exit_code)
+
+    async def command_many(self, commands):
+        """
+        Execute several PEP CLI commands concurrently, bounded by the maximum concurrency.
+
+        When one of the commands fails with an exception, the remaining commands are cancelled.
+
+        Args:
+            commands (list): The PEP CLI commands to execute.
+
+        Returns:
+            list: The parsed output of every command, in the order of the commands.
+        """
+        return await self._gather_or_cancel([self.command(command) for command in commands])
+
+    async def stream(self, command, target_folder="", on_exit=None, telemetry=None, source=None, stall_timeout=None):
+        """
+        Execute a long running PEP CLI command, such as a pull, and yield its output line by line.
+
+        The exit code is passed to `on_exit` once the command has finished. When the command has not made progress
+        for `stall_timeout` seconds, it is killed together with its container and the exit code is None. For a pull
+        with '--report-progress' only progress lines count as progress, so a pull that hangs while it keeps writing
+        warnings is killed too. For other commands every output line counts.
+        The exit code and stall state are kept per call, so several streams can run at the same time.
+
+        Args:
+            command (str or list): The PEP CLI command, either as a string or as a list of arguments.
+            target_folder (str): Output directory of a pull, when the engine has to make it available.
+            on_exit (callable): Called with the exit code once the command has finished, None when the command stalled.
+            telemetry (PullTelemetry): Records the timing of the process and its output, see PullTelemetry.
+            source (hashable): The pull the command belongs to in the telemetry, for concurrent streams.
+            stall_timeout (float): Seconds without progress after which the command is killed, None to wait forever.
+
+        Yields:
+            str: Output lines of the command, stdout and stderr combined.
+        """
+        if isinstance(command, str):
+            command = shlex.split(command)
+
+        exit_code, stalled = None, False
+        watch_progress = "--report-progress" in command
+        async with self._get_semaphore():
+            full_command, working_directory = await self._prepare(command, target_folder)
+            started_at, started, output_bytes = time.time(), time.monotonic(), 0
+            try:
+                if telemetry:
+                    telemetry.process_started(command, source)
+                process = await asyncio.create_subprocess_exec(*full_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=working_directory, limit=self.stream_limit)
+                try:
+                    last_progress = time.monotonic()
+                    while True:
+                        timeout = None if stall_timeout is None else max(0.0, last_progress + stall_timeout - time.monotonic())
+                        try:
+                            output_line = await asyncio.wait_for(process.stdout.readline(), timeout)
+                        except asyncio.TimeoutError:
+                            stalled = True
+                            break
+
+                        if not output_line:
+                            break
+
+                        output_bytes += len(output_line)
+                        output_line = output_line.decode(self.encoding).strip()
+                        if output_line:
+                            if not watch_progress or parse_progress_line(output_line).is_progress():
+                                last_progress = time.monotonic()
+                            if telemetry:
+                                telemetry.observe_line(output_line, source)
+                            yield output_line
+
+                    if stalled:
+                        await self._stop_container(full_command)
+                        await self._kill(process)
+                    else:
+                        exit_code = await process.wait()
+
+                    if on_exit:
+                        on_exit(exit_code)
+                finally:
+                    if process.returncode is None:
+                        await self._stop_container(full_command)
+                    await self._kill(process)
+                    self.client.metrics.record(CommandMetrics(get_command_name(command), 1, started_at, time.monotonic() - started,
+                                                              exit_code, timed_out=stalled, output_bytes=output_bytes))
+                    if telemetry:
+                        telemetry.process_exited(exit_code, source)
+            finally:
+                self.client._release_working_directory(working_directory)
+
+    async def watched_stream(self, command, target_folder="", telemetry=None, stall_timeout=None, max_restarts=0, on_exit=None):
+        """
+        Execute a pull like `stream`, restarting it with '--resume --update' when it stalls.
+
+        Args:
+            command (str or list): The PEP CLI pull command, either as a string or as a list of arguments.
+            target_folder (str): Output directory of the pull, when the engine has to make it available.
+            telemetry (PullTelemetry): Records the timing of the processes and their output, see PullTelemetry.
+            stall_timeout (float): Seconds without progress after which the pull is killed, None to wait forever.
+            max_restarts (int): Number of times a stalled pull is restarted.
+            on_exit (callable): Called with the exit code of the last run once the pull has finished, None when it stalled.
+
+        Yields:
+            str: Output lines of the pull, and a line for every restart.
+        """
+        if isinstance(command, str):
+            command = shlex.split(command)
+
+        restarts = 0
+        while True:
+            exit_codes = []
+            stream = self.stream(command, target_folder, on_exit=exit_codes.append, telemetry=telemetry, stall_timeout=stall_timeout)
+            try:
+                async for output_line in stream:
+                    yield output_line
+            finally:
+                # Stop the pull right away when the consumer stops early
+                await stream.aclose()
+
+            exit_code = exit_codes[-1] if exit_codes else None
+            if exit_code is not None or restarts >= max_restarts:
+                if exit_code is None:
+                    yield f"No progress for {stall_timeout} seconds, stopped the download after {restarts} restarts."
+                if on_exit:
+                    on_exit(exit_code)
+                return
+
+            restarts += 1
+            command = command + [argument for argument in ["--resume", "--update"] if argument not in command]
+            yield f"No progress for {stall_timeout} seconds, restarting the download with --resume --update ({restarts}/{max_restarts})."
+
+    async def list(self, column_names, participant_ids, no_inline_data=True):
+        """
+        Asyncio variant of PepClientBase.list.
+        """
+        return await self.command(self.client._build_list_command(column_names, participant_ids, no_inline_data))
+
+    async def list_bulk(self, column_names, participant_ids, no_inline_data=True, participants_per_chunk=100, columns_per_chunk=20, update_progress=None):
+        """
+        Asyncio variant of PepClientBase.list_bulk.
+        """
+        if isinstance(column_names, str):
+            column_names = [column_names]
+        if isinstance(participant_ids, str):
+            participant_ids = [participant_ids]
+
+        chunks = [(columns, participants)
+                  for columns in split_into_chunks(column_names, columns_per_chunk)
+                  for participants in split_into_chunks(participant_ids, participants_per_chunk)]
+
+        async def list_chunk(columns, participants):
+            return participants, await self.list(columns, participants, no_inline_data)
+
+        result = ListResult()
+        tasks = [asyncio.ensure_future(list_chunk(columns, participants)) for columns, participants in chunks]
+
+        try:
+            for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+                participants, output = await task
+                if output["error"] or output["json_error"]:
+                    result.errors.append(output["message"])
+                else:
+                    result.add_entries(output["data"], participants)
+
+                if update_progress:
+                    update_progress(completed, len(tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return result
+
+    async def estimate_column_sizes(self, column_names, participant_groups=("*",), columns_per_chunk=20, update_progress=None):
+        """
+        Asyncio variant of PepClientBase.estimate_column_sizes.
+        """
+        query_cache = self.client.query_cache
+        participant_groups = list(participant_groups)
+        cache_prefix = f"column-size:{','.join(participant_groups)}:"
+        sizes = {}
+
+        if query_cache is not None:
+            for column in column_names:
+                cached = await self._run_blocking(query_cache.get, self.client, f"{cache_prefix}{column}")
+                if cached is not None:
+                    sizes[column] = ColumnSize.from_dict(column, cached)
+
+        chunks = split_into_chunks([column for column in column_names if column not in sizes], columns_per_chunk)
+
+        async def list_chunk(columns):
+            return columns, await self.command(self.client._build_list_command(columns, [], True, participant_groups))
+
+        tasks = [asyncio.ensure_future(list_chunk(columns)) for columns in chunks]
+
+        try:
+            for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+                columns, output = await task
+                if output["error"] or output["json_error"]:
+                    sizes.update({column: ColumnSize(column, error=output["message"]) for column in columns})
+                else:
+                    result = ListResult()
+                    result.add_entries(output["data"])
+                    chunk_sizes = result.get_column_sizes(columns)
+                    for column in columns:
+                        sizes[column] = chunk_sizes[column]
+                        if query_cache is not None:
+                            await self._run_blocking(query_cache.set, self.client, f"{cache_prefix}{column}", chunk_sizes[column].to_dict())
+
+                if update_progress:
+                    update_progress(completed, len(tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return {column: sizes[column] for column in column_names if column in sizes}
+
+    async def plan_delta_pull(self, column_names, target_folder, participant_groups=("*",), columns_per_chunk=20, participants_per_pull=100):
+        """
+        Asyncio variant of PepClientBase.plan_delta_pull.
+        """
+        local_inventory = await self._run_blocking(scan_local_inventory, target_folder)
+        pulled_markers = await self._run_blocking(load_pulled_markers, target_folder)
+        local_participants = {participant for participant, _ in local_inventory}
+
+        async def list_chunk(columns):
+            return await self.command(self.client._build_list_command(columns, [], True, list(participant_groups)))
+
+        result = ListResult()
+        outputs = await self._gather_or_cancel([list_chunk(columns) for columns in split_into_chunks(column_names, columns_per_chunk)])
+        for output in outputs:
+            if output["error"] or output["json_error"]:
+                result.errors.append(output["message"])
+            else:
+                # Prefer the identifier the participant folders are named after
+                result.add_entries(output["data"], local_participants)
+
+        missing, stale, unverified, up_to_date = compare_inventory(local_inventory, result, column_names, pulled_markers)
+        shards = plan_delta_shards(missing + stale, target_folder, participants_per_pull)
+        markers = {(cell.participant, cell.column): get_cell_marker(cell) for cell in result if get_cell_marker(cell) is not None}
+
+        return DeltaPlan(missing, stale, up_to_date, shards, result.errors, unverified, markers)
+
+    async def store(self, column_name, participant_id, filepath_or_data, file=True):
+        """
+        Asyncio variant of PepClientBase.store.
+        """
+        return await self.command(self.client._build_store_command(column_name, participant_id, filepath_or_data, file))
+
+    async def store_bulk(self, entries, journal_filepath=None, retry_policy=None, update_progress=None):
+        """
+        Asyncio variant of PepClientBase.store_bulk.
+        """
+        journal = StoreJournal(journal_filepath) if journal_filepath else None
+        retry_policy = retry_policy or store_retry_policy
+
+        async def store_entry(entry):
+            if not os.path.isfile(entry.path):
+                entry.status, entry.error = "failed", f"File '{entry.path}' does not exist"
+                return
+
+            if journal and journal.is_completed(entry):
+                entry.status = "skipped"
+                return
+
+            try:
+                output = await self.command(self.client._build_store_command(entry.column, entry.participant, entry.path), retry_policy=retry_policy)
+            except subprocess.TimeoutExpired:
+                entry.status, entry.error = "failed", f"Timed out after {self.client.timeout} seconds"
+                return
+
+            if output["error"]:
+                entry.status, entry.error = "failed", output["message"]
+                return
+
+            entry.status, entry.error = "done", ""
+            if journal:
+                await self._run_blocking(journal.record, entry)
+
+        tasks = [asyncio.ensure_future(store_entry(entry)) for entry in entries]
+
+        try:
+            for completed, task in enumerate(asyncio.as_completed(tasks), start=1):
+                await task
+                if update_progress:
+                    update_progress(completed, len(tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return entries
+
+    async def column_group_create(self, column_group_name, suffix=".columnGroup"):
+        """
+        Asyncio variant of PepClientBase.column_group_create.
+        """
+        return await self.command(["ama", "columnGroup", "create", f"{column_group_name}{suffix}"])
+
+    async def column_group_add(self, column_group_name, column_name, suffix=".columnGroup"):
+        """
+        Asyncio variant of PepClientBase.column_group_add.
+        """
+        return await self.command(["ama", "column", "addTo", column_name, f"{column_group_name}{suffix}"])
+
+    async def participant_group_create(self, participant_group_name, prefix="Participants."):
+        """
+        Asyncio variant of PepClientBase.participant_group_create.
+        """
+        return await self.command(["ama", "group", "create", f"{prefix}{participant_group_name}"])
+
+    async def participant_group_add(self, participant_group_name, participant_id, prefix="Participants."):
+        """
+        Asyncio variant of PepClientBase.participant_group_add.
+        """
+        return await self.command(["ama", "group", "addTo", f"{prefix}{participant_group_name}", participant_id])
+
+    async def _group_add_many(self, group, members, add_member, existing_members=()):
+        """
+        Add many members to a group concurrently, skipping the members that are known to be in the group.
+
+        The known members of every group are cached on the client. Members are added to the cache once pepcli
+        added them or reported that they were already in the group.
+
+        Args:
+            group (str): The full name of the group, used as the cache key.
+            members (list): The members to add.
+            add_member (callable): Coroutine function adding a single member, returning the parsed output.
+            existing_members (iterable): Members known to be in the group already, for example from an earlier listing.
+
+        Returns:
+            dict: The result per member, with a 'status' of 'added', 'skipped' or 'failed' and the pepcli 'message'.
+        """
+        known_members = self.group_members.setdefault(group, set())
+        known_members.update(existing_members)
+
+        results = {member: {"status": "skipped", "message": ""} for member in members}
+
+        async def add(member):
+            output = await add_member(member)
+            message = output.get("message", "")
+            if not output["error"]:
+                results[member] = {"status": "added", "message": message}
+            elif "already" in message.lower():
+                results[member] = {"status": "skipped", "message": message}
+            else:
+                results[member] = {"status": "failed", "message": message}
+                return
+            known_members.add(member)
+
+        await self._gather_or_cancel([add(member) for member in dict.fromkeys(members) if member not in known_members])
+
+        return results
+
+    async def _gather_or_cancel(self, coroutines):
+        """
+        Run coroutines concurrently and cancel the remaining ones when one of them fails with an exception.
+
+        Args:
+            coroutines (list): The coroutines to run.
+
+        Returns:
+            list: The results of the coroutines, in order.
+        """
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def column_group_add_many(self, column_group_name, column_names, suffix=".columnGroup", existing_columns=()):
+        """
+        Asyncio variant of PepClientBase.column_group_add_many.
+        """
+        return await self._group_add_many(f"{column_group_name}{suffix}", column_names,
+                                          lambda column_name: self.column_group_add(column_group_name, column_name, suffix),
+                                          existing_columns)
+
+    async def participant_group_add_many(self, participant_group_name, participant_ids, prefix="Participants.", existing_participants=()):
+        """
+        Asyncio variant of PepClientBase.participant_group_add_many.
+        """
+        return await self._group_add_many(f"{prefix}{participant_group_name}", participant_ids,
+                                          lambda participant_id: self.participant_group_add(participant_group_name, participant_id, prefix),
+                                          existing_participants)
+
+    async def cached_query(self, query):
+        """
+        Run a `pepcli query` command, using the query cache of the client when it has one.
+
+        Only successful queries with output are stored in the cache.
+
+        Args:
+            query (str): The query to run, for example 'enrollment'.
+
+        Returns:
+            dict: The parsed output of the query.
+        """
+        query_cache = self.client.query_cache
+        if query_cache is not None:
+            output = await self._run_blocking(query_cache.get, self.client, query)
+            if output is not None:
+                return output
+
+        output = await self.command(["query", query])
+
+        if query_cache is not None and not output["error"] and output["message"]:
+            await self._run_blocking(query_cache.set, self.client, query, output)
+
+        return output
+
+    async def query_enrollment(self):
+        """
+        Asyncio variant of PepClientBase.query_enrollment.
+        """
+        return await self.cached_query("enrollment")
+
+    async def query_column_access(self):
+        """
+        Asyncio variant of PepClientBase.query_column_access.
+        """
+        return await self.cached_query("column-access")
+
+    async def query_participant_group_access(self):
+        """
+        Asyncio variant of PepClientBase.query_participant_group_access.
+        """
+        return await self.cached_query("participant-group-access")
+
+    async def get_column_access(self):
+        """
+        Asyncio variant of PepClientBase.get_column_access.
+        """
+        return ColumnAccess.parse((await self.query_column_access()).get("message", ""))
+
+    async def get_participant_group_access(self):
+        """
+        Asyncio variant of PepClientBase.get_participant_group_access.
+        """
+        return ParticipantGroupAccess.parse((await self.query_participant_group_access()).get("message", ""))
+
+    async def pull(self, target_folder='', telemetry=None, on_exit=None, **kwargs):
+        """
+        Pull data from the server and yield the output line by line.
+
+        Takes the same arguments as PepClientBase.pull. The exit code is passed to `on_exit`, see `stream`.
+
+        Yields:
+            str: Output lines of the pull.
+        """
+        async for output_line in self.stream(self.client._build_pull_command(**kwargs), target_folder, on_exit=on_exit, telemetry=telemetry):
+            yield output_line
+
+    async def pull_shards(self, shards, target_folder, retries=2, telemetry=None, stall_timeout=None, max_concurrent=None, write_limiter=None, **kwargs):
+        """
+        Pull the shards of a sharded pull concurrently and merge every finished shard into the target folder.
+
+        A shard that fails is pulled again with '--resume' into its own staging folder, without restarting
+        the other shards. The status of every shard is kept up to date on the PullShard objects.
+
+        Args:
+            shards (list): The PullShard objects, see plan_pull_shards.
+            target_folder (str): The 'pulled-data' folder to merge the shards into.
+            retries (int): Number of times a failed shard is pulled again.
+            telemetry (PullTelemetry): Records the timing of the shards, with the shard index as source.
+            stall_timeout (float): Seconds without progress after which a shard is killed and retried.
+            max_concurrent (int): Maximum number of shards pulled at the same time, in the order of the shards.
+            write_limiter (WriteRateLimiter): Shards are not started while the disk writes are above its target rate.
+            **kwargs: Further arguments of PepClientBase.pull, except 'columns'. Shards with participants pull
+                those instead of the participant groups.
+
+        Yields:
+            tuple: The PullShard and one of its output lines.
+        """
+        output_queue = asyncio.Queue()
+        finished = object()
+
+        async def pull_shard(shard):
+            exit_codes = []
+
+            while shard.attempts <= retries:
+                shard.attempts += 1
+                shard.status = "running" if shard.attempts == 1 else "retrying"
+                shard_kwargs = dict(kwargs, resume=kwargs.get("resume") or shard.attempts > 1)
+                if shard.participants:
+                    shard_kwargs.update(participants=shard.participants, participant_groups=None, all_accessible=False)
+                command = self.client._build_pull_command(columns=shard.columns, **shard_kwargs)
+
+                async for output_line in self.stream(command, shard.staging_folder, on_exit=exit_codes.append, telemetry=telemetry, source=shard.index, stall_timeout=stall_timeout):
+                    shard.last_line = output_line
+                    await output_queue.put((shard, output_line))
+
+                shard.exit_code = exit_codes[-1] if exit_codes else None
+                if shard.exit_code == 0:
+                    await self._run_blocking(merge_pull_folder, shard.staging_folder, target_folder)
+                    shard.status = "done"
+                    break
+
+            if shard.status != "done":
+                shard.status = "failed"
+
+        shard_semaphore = asyncio.Semaphore(max_concurrent or len(shards) or 1)
+
+        async def run_shard(shard):
+            try:
+                async with shard_semaphore:
+                    # pepcli's writes cannot be slowed down, so wait with starting another one instead
+                    while write_limiter is not None and write_limiter.get_delay() > 0:
+                        await asyncio.sleep(min(write_limiter.get_delay(), 5))
+                    await pull_shard(shard)
+            except Exception as e:
+                shard.status = "failed"
+                await output_queue.put((shard, f"Shard {shard.index} failed: {e}"))
+            finally:
+                await output_queue.put(finished)
+
+        tasks = [asyncio.ensure_future(run_shard(shard)) for shard in shards]
+        running = len(tasks)
+
+        try:
+            while running:
+                item = await output_queue.get()
+                if item is finished:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,7 +1,16 @@
+import asyncio
+import atexit
 import json
+import os
+import shlex
 import subprocess
 import tempfile
 import threading
+import uuid
+
+from .pep_client_async import AsyncPepClient
+from .pep_executor import MetricsRecorder, SubprocessExecutor, default_retry_policy, get_command_name
+from .pep_working_dirs import LogonWorkingDirectories, WorkingDirectoryPool
 
 
 class PepClientBase:
@@ -10,7 +19,7 @@ class PepClientBase:
     It supports operations such as listing, storing, and modifying data entries based on authentication methods.
     """
 
-    def __init__(self, pep_token_filepath="", production=True, auth_method="token"):
+    def __init__(self, pep_token_filepath="", production=True, auth_method="token", session=False, query_cache=None):
         """
         Initialize the PEP client base.
 
@@ -18,6 +27,8 @@ class PepClientBase:
             pep_token_filepath (str): The file path to the authentication token.
             production (bool): Flag to indicate if the production environment should be used.
             auth_method (str): The authentication method to use ("token" or "logon").
+            session (bool): Run all commands in one long-lived container instead of starting a container per command.
+            query_cache (PepQueryCache): Cache for the enrollment, column access and participant group access queries.
 
         Raises:
             ValueError: If the authentication method is neither 'token' nor 'logon'.
@@ -25,16 +36,33 @@ class PepClientBase:
         self.pep_token_filepath = pep_token_filepath
         self.production = production
         self.timeout = None
+        self.command_timeouts = {}
+        self.query_cache = query_cache
+
+        self.executor = SubprocessExecutor()
+        self.retry_policy = default_retry_policy
+        self.metrics = MetricsRecorder()
 
         if auth_method not in ["logon", "token"]:
             raise ValueError(f"Parameter 'auth_method' must be either 'token' or 'logon'. Current value '{auth_method}' is neither.")
 
         self.auth_method = auth_method
         self.base_command = self._build_base_command()
-        self.lock = threading.Lock()
+
+        self.session = session
+        self.session_name = ""
+        self.session_base_command = ""
+        self.session_lock = threading.Lock()
+
+        self.aio = AsyncPepClient(self)
 
         if self.auth_method == "logon":
             self.temp_dir_logon = tempfile.TemporaryDirectory()
+            self.logon_working_directories = LogonWorkingDirectories(self.temp_dir_logon.name)
+        else:
+            # Scratch working directories are created once and reused, instead of per command
+            self.temp_dir_scratch = tempfile.TemporaryDirectory(prefix="pep-scratch-")
+            self.scratch_working_directories = WorkingDirectoryPool(self.temp_dir_scratch.name, size=self.aio.max_concurrency)
 
     def set_timeout(self, timeout):
         """
@@ -51,6 +79,173 @@ class PepClientBase:
         """
         self.timeout = None
 
+    def set_command_timeout(self, command_name, timeout):
+        """
+        Set the timeout for one PEP CLI subcommand, overriding the general timeout.
+
+        Args:
+            command_name (str): The subcommand, for example 'list' or 'query enrollment'.
+            timeout (int): The timeout value in seconds, or None for no limit.
+        """
+        self.command_timeouts[command_name] = timeout
+
+    def get_command_timeout(self, command):
+        """
+        Return the timeout for a command, the most specific subcommand timeout or the general timeout.
+
+        Args:
+            command (list): The PEP CLI arguments.
+
+        Returns:
+            int: The timeout in seconds, or None for no limit.
+        """
+        command_name = get_command_name(command)
+        for name in [command_name, command_name.split(" ")[0]]:
+            if name in self.command_timeouts:
+                return self.command_timeouts[name]
+
+        return self.timeout
+
+    def set_retry_policy(self, retry_policy):
+        """
+        Set the policy for retrying failed commands, see RetryPolicy.
+
+        Args:
+            retry_policy (RetryPolicy): The retry policy.
+        """
+        self.retry_policy = retry_policy
+
+    def set_executor(self, executor):
+        """
+        Set the executor that runs the commands, see SubprocessExecutor.
+
+        Args:
+            executor (SubprocessExecutor): The executor.
+        """
+        self.executor = executor
+
+    @classmethod
+    def warm_up(cls, production=True, timeout=None):
+        """
+        Prepare the engine before the first command, for example by pulling its container image.
+
+        Args:
+            production (bool): Flag to indicate if the production environment should be used.
+            timeout (float): Maximum number of seconds the preparation may take, None for no limit.
+
+        Returns:
+            dict: What was prepared, for logging.
+        """
+        return {}
+
+    @classmethod
+    def clean_up_warm_up(cls):
+        """
+        Stop a running warm-up and remove what it left on disk, when the application exits.
+        """
+
+    def _start_session_command(self, session_name):
+        """
+        Build the command that starts a long-lived container, or None if the engine has no containers.
+
+        Args:
+            session_name (str): The name to give the container.
+        """
+        return None
+
+    def _stop_session_command(self, session_name):
+        """
+        Build the command that stops the long-lived container.
+
+        Args:
+            session_name (str): The name of the container.
+        """
+        return None
+
+    def _build_session_base_command(self, session_name):
+        """
+        Build the base command that runs commands inside the long-lived container.
+
+        Args:
+            session_name (str): The name of the container.
+        """
+        return None
+
+    def _stop_container_command(self, full_command):
+        """
+        Build the command that stops the container started by a command, or None if the engine does not start one.
+
+        Args:
+            full_command (list): The full argument list of the command.
+        """
+        return None
+
+    def start_session(self):
+        """
+        Start the long-lived container used by session mode, if it is not running yet.
+
+        When the container cannot be started, commands keep starting a container each.
+        The container is stopped by `close`, which also runs when the program exits.
+
+        Returns:
+            bool: True if commands run inside a session container.
+        """
+        with self.session_lock:
+            if self.session_base_command:
+                return True
+
+            session_name = f"pep-client-{uuid.uuid4().hex[:12]}"
+            start_command = self._start_session_command(session_name)
+            if not start_command:
+                return False
+
+            try:
+                process = subprocess.run(start_command, capture_output=True, encoding="ISO-8859-1", timeout=self.timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                process = None
+
+            if process is None or process.returncode != 0:
+                # Fall back to a container per command instead of trying to start the session for every command
+                self.session = False
+                return False
+
+            self.session_name = session_name
+            self.session_base_command = self._build_session_base_command(session_name)
+            atexit.register(self.close)
+            return True
+
+    def close(self):
+        """
+        Stop the long-lived container started in session mode, and remove the worker directories of logon authentication.
+        """
+        if self.auth_method == "logon":
+            self.logon_working_directories.close()
+
+        with self.session_lock:
+            if not self.session_name:
+                return
+
+            try:
+                subprocess.run(self._stop_session_command(self.session_name), capture_output=True)
+            except OSError:
+                pass
+            self.session_name = ""
+            self.session_base_command = ""
+
+        atexit.unregister(self.close)
+
+    def _get_base_command(self):
+        """
+        Return the base command for the next command, starting the session container first when session mode is enabled.
+
+        Returns:
+            list: The base command arguments to prefix PEP CLI commands with.
+        """
+        if self.session and self.start_session():
+            return self.session_base_command
+
+        return self.base_command
+
     def _check_pepcli_path(self):
         """
         Check the PEP CLI path. Must be implemented by subclasses.
@@ -59,79 +254,127 @@ class PepClientBase:
 
     def _build_base_command(self):
         """
-        Build the base command for interaction. Must be overridden in subclasses.
+        Build the base command arguments for interaction. Must be overridden in subclasses.
         """
         raise NotImplementedError("Subclass must implement abstract method")
 
-    def _command(self, command):
+    def _build_full_command(self, base_command, command, target_folder=""):
         """
-        Execute a command using the appropriate authentication method.
+        Combine the base command arguments with the arguments of a PEP CLI command.
 
         Args:
-            command (str): The command to execute.
+            base_command (list): The base command arguments.
+            command (list): The PEP CLI command arguments.
+            target_folder (str): Output directory of a pull, added as '--output-directory' when given.
 
         Returns:
-            tuple: The output of the command and the exit code.
+            list: The full command arguments.
         """
-        full_command = f"{self.base_command} {command}"
-        result = []
+        if target_folder:
+            # Commands run in a separate working directory, so relative folders have to be resolved first
+            command = command + ["--output-directory", os.path.abspath(target_folder)]
+
+        return base_command + command
+
+    def _acquire_working_directory(self):
+        """
+        Return the working directory for a command, which holds the logon credentials when using logon authentication.
+
+        With logon authentication every concurrent command gets its own worker directory with a copy of
+        the logon credentials, see LogonWorkingDirectories. Otherwise a scratch directory is leased from a pool.
 
+        Returns:
+            str: The path of the working directory.
+        """
         if self.auth_method == "logon":
-            result, exit_code = self._command_auth_method_logon(full_command)
-        else:
-            result, exit_code = self._command_auth_method_token(full_command)
+            return self.logon_working_directories.lease()
 
-        return self.pep_command_parser(result, exit_code)
+        return self.scratch_working_directories.lease()
 
-    def _command_auth_method_token(self, full_command):
+    def _release_working_directory(self, working_directory):
         """
-        Execute a command using token-based authentication.
+        Release a working directory returned by `_acquire_working_directory`.
 
         Args:
-            full_command (str): The full command to execute.
+            working_directory (str): The path of the working directory.
+        """
+        if self.auth_method == "logon":
+            self.logon_working_directories.release(working_directory)
+        else:
+            self.scratch_working_directories.release(working_directory)
+
+    def _run_async(self, coroutine):
+        """
+        Run a coroutine of the asyncio client to completion on a new event loop.
+
+        Args:
+            coroutine (coroutine): The coroutine to run.
 
         Returns:
-            tuple: The output and exit code of the command execution.
+            The result of the coroutine.
         """
-        try:
-            with tempfile.TemporaryDirectory() as tempdir:
-                process = subprocess.run(full_command, capture_output=True, encoding="ISO-8859-1", shell=True, cwd=tempdir, timeout=self.timeout)
-                exit_code = process.returncode
+        return asyncio.run(coroutine)
 
-                if exit_code != 0:
-                    result = process.stderr
-                else:
-                    result = process.stdout
-        except subprocess.CalledProcessError as e:
-            exit_code = e.returncode
-            result = e.output
+    def _iterate_async(self, async_iterator):
+        """
+        Iterate an async iterator of the asyncio client from synchronous code.
 
-        return (result, exit_code)
+        Args:
+            async_iterator (async iterator): The async iterator to iterate.
 
-    def _command_auth_method_logon(self, full_command):
+        Yields:
+            The items of the async iterator.
         """
-        Execute a command using logon-based authentication.
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(async_iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(async_iterator.aclose())
+            loop.close()
+
+    def _command(self, command, target_folder=""):
+        """
+        Execute a command using the appropriate authentication method.
 
         Args:
-            full_command (str): The full command to execute.
+            command (str or list): The command to execute, either as a string or as a list of arguments.
+            target_folder (str): Output directory of a pull, when the engine has to make it available.
 
         Returns:
-            tuple: The output and exit code of the command execution.
+            dict: The parsed output of the command, see `pep_command_parser`.
         """
-        try:
-            with self.lock:
-                process = subprocess.run(full_command, capture_output=True, encoding="ISO-8859-1", shell=True, cwd=self.temp_dir_logon.name, timeout=self.timeout)
-            exit_code = process.returncode
+        return self._run_async(self.aio.command(command, target_folder))
+
+    def _build_list_command(self, column_names, participant_ids, no_inline_data=True, participant_groups=None):
+        """
+        Build the arguments of a list command, see `list`. Participant groups can be listed instead of, or in addition to, participants.
+        """
+        if isinstance(column_names, str):
+            column_names = [column_names]
+        if isinstance(participant_ids, str):
+            participant_ids = [participant_ids]
+
+        if not column_names:
+            raise ValueError("At least one column must be specified.")
+        if not participant_ids and not participant_groups:
+            raise ValueError("At least one participant must be specified.")
+
+        command = ["list"]
+        for column in column_names:
+            command += ["-c", column]
+        for participant in participant_ids or []:
+            command += ["-p", participant]
+        for participant_group in participant_groups or []:
+            command += ["-P", participant_group]
 
-            if exit_code != 0:
-                result = process.stderr
-            else:
-                result = process.stdout
-        except subprocess.CalledProcessError as e:
-            exit_code = e.returncode
-            result = e.output
+        if no_inline_data:
+            command.append("--no-inline-data")
 
-        return (result, exit_code)
+        return command
 
     def list(self, column_names, participant_ids, no_inline_data=True):
         """
@@ -148,24 +391,71 @@ class PepClientBase:
         Raises:
             ValueError: If no columns or participants are specified.
         """
-        if isinstance(column_names, str):
-            column_names = [column_names]
-        if isinstance(participant_ids, str):
-            participant_ids = [participant_ids]
+        return self._run_async(self.aio.list(column_names, participant_ids, no_inline_data))
 
-        if not column_names:
-            raise ValueError("At least one column must be specified.")
-        if not participant_ids:
-            raise ValueError("At least one participant must be specified.")
+    def list_bulk(self, column_names, participant_ids, no_inline_data=True, participants_per_chunk=100, columns_per_chunk=20, update_progress=None):
+        """
+        List data entries for many columns and participants, split into chunks that are listed concurrently.
 
-        columns_part = ' '.join([f'-c {column}' for column in column_names])
-        participants_part = ' '.join([f'-p {participant}' for participant in participant_ids])
-        command = f"list {columns_part} {participants_part}"
+        Keeping each call small avoids command line length limits, and the concurrent calls are bounded
+        by the maximum concurrency of the asyncio client.
 
-        if no_inline_data:
-            command += " --no-inline-data"
+        Args:
+            column_names (list or str): The column names to list.
+            participant_ids (list or str): The participant IDs to list.
+            no_inline_data (bool): Flag to not include inline data.
+            participants_per_chunk (int): Maximum number of participants per list call.
+            columns_per_chunk (int): Maximum number of columns per list call.
+            update_progress (callable): Called with the number of completed and total list calls.
+
+        Returns:
+            ListResult: The merged listing, indexed by (participant, column), with the errors of failed calls.
+        """
+        return self._run_async(self.aio.list_bulk(column_names, participant_ids, no_inline_data, participants_per_chunk, columns_per_chunk, update_progress))
+
+    def estimate_column_sizes(self, column_names, participant_groups=("*",), columns_per_chunk=20, update_progress=None):
+        """
+        Estimate the download size of columns with chunked `list --no-inline-data` calls, before pulling them.
+
+        The estimates are stored in the query cache of the client, so estimating the same columns again is free
+        until the cache entries expire.
+
+        Args:
+            column_names (list): The columns to estimate.
+            participant_groups (iterable): The participant groups that will be pulled.
+            columns_per_chunk (int): Maximum number of columns per list call.
+            update_progress (callable): Called with the number of completed and total list calls.
+
+        Returns:
+            dict: The ColumnSize by column name, with the error message for columns that could not be listed.
+        """
+        return self._run_async(self.aio.estimate_column_sizes(column_names, participant_groups, columns_per_chunk, update_progress))
+
+    def plan_delta_pull(self, column_names, target_folder, participant_groups=("*",), columns_per_chunk=20, participants_per_pull=100):
+        """
+        Work out which cells of a previous pull are missing or changed, to pull only those instead of resuming everything.
 
-        return self._command(command)
+        The local 'pulled-data' folder is inventoried from its directory entries and compared with chunked
+        `list --no-inline-data` calls. Pull the resulting shards with `pep_pull_sharded`, pull the unverified cells
+        with '--update', and then record the markers of the pulled cells with DeltaPlan.record_markers.
+
+        Args:
+            column_names (list): The columns to compare.
+            target_folder (str): The 'pulled-data' folder of the previous pull.
+            participant_groups (iterable): The participant groups that were pulled.
+            columns_per_chunk (int): Maximum number of columns per list call.
+            participants_per_pull (int): Maximum number of participants per targeted pull.
+
+        Returns:
+            DeltaPlan: The missing and changed cells and the targeted pulls, with the errors of failed list calls.
+        """
+        return self._run_async(self.aio.plan_delta_pull(column_names, target_folder, participant_groups, columns_per_chunk, participants_per_pull))
+
+    def _build_store_command(self, column_name, participant_id, filepath_or_data, file=True):
+        """
+        Build the arguments of a store command, see `store`.
+        """
+        return ["store", "-c", column_name, "-p", participant_id, "-i" if file else "-d", filepath_or_data]
 
     def store(self, column_name, participant_id, filepath_or_data, file=True):
         """
@@ -180,12 +470,26 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        if file:
-            command = f"store -c {column_name} -p {participant_id} -i {filepath_or_data}"
-        else:
-            command = f"store -c {column_name} -p {participant_id} -d {filepath_or_data}"
+        return self._run_async(self.aio.store(column_name, participant_id, filepath_or_data, file))
+
+    def store_bulk(self, entries, journal_filepath=None, retry_policy=None, update_progress=None):
+        """
+        Store many files concurrently, bounded by the maximum concurrency of the asyncio client.
 
-        return self._command(command)
+        Uploads that fail with a transient error or time out are retried according to the retry policy, uploads that
+        are refused or of a file that does not exist fail right away. Uploaded files are written to the journal,
+        so running the same bulk store again after an interruption only uploads the remaining files.
+
+        Args:
+            entries (list): The StoreEntry objects to upload, see read_store_manifest.
+            journal_filepath (str): Path to the journal of uploaded files, or None to upload everything.
+            retry_policy (RetryPolicy): The retry policy of the uploads, None for store_retry_policy.
+            update_progress (callable): Called with the number of completed and total entries.
+
+        Returns:
+            list: The entries, with their status set to 'done', 'skipped' or 'failed'.
+        """
+        return self._run_async(self.aio.store_bulk(entries, journal_filepath, retry_policy, update_progress))
 
     def column_group_create(self, column_group_name, suffix=".columnGroup"):
         """
@@ -198,7 +502,7 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        return self._command(f"ama columnGroup create {column_group_name}{suffix}")
+        return self._run_async(self.aio.column_group_create(column_group_name, suffix))
 
     def column_group_add(self, column_group_name, column_name, suffix=".columnGroup"):
         """
@@ -212,7 +516,7 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        return self._command(f"ama column addTo {column_name} {column_group_name}{suffix}")
+        return self._run_async(self.aio.column_group_add(column_group_name, column_name, suffix))
 
     def participant_group_create(self, participant_group_name, prefix="Participants."):
         """
@@ -225,7 +529,7 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        return self._command(f"ama group create {prefix}{participant_group_name}")
+        return self._run_async(self.aio.participant_group_create(participant_group_name, prefix))
 
     def participant_group_add(self, participant_group_name, participant_id, prefix="Participants."):
         """
@@ -239,7 +543,69 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        return self._command(f"ama group addTo {prefix}{participant_group_name} {participant_id}")
+        return self._run_async(self.aio.participant_group_add(participant_group_name, participant_id, prefix))
+
+    def _run_in_session(self, coroutine):
+        """
+        Run a coroutine with many commands inside one session container, started and stopped for this call
+        when session mode is not enabled already.
+
+        Args:
+            coroutine (coroutine): The coroutine to run.
+
+        Returns:
+            The result of the coroutine.
+        """
+        if self.session:
+            return self._run_async(coroutine)
+
+        self.session = True
+        try:
+            return self._run_async(coroutine)
+        finally:
+            self.session = False
+            self.close()
+
+    def column_group_add_many(self, column_group_name, column_names, suffix=".columnGroup", existing_columns=()):
+        """
+        Add many columns to an existing column group, concurrently and inside one session container.
+
+        Columns that are known to be in the group, from earlier calls or `existing_columns`, are skipped.
+
+        Args:
+            column_group_name (str): The name of the column group.
+            column_names (list): The column names to add to the group.
+            suffix (str): Suffix to append to the column group name during the operation.
+            existing_columns (iterable): Columns known to be in the group already.
+
+        Returns:
+            dict: The result per column, with a 'status' of 'added', 'skipped' or 'failed' and the pepcli 'message'.
+        """
+        return self._run_in_session(self.aio.column_group_add_many(column_group_name, column_names, suffix, existing_columns))
+
+    def participant_group_add_many(self, participant_group_name, participant_ids, prefix="Participants.", existing_participants=()):
+        """
+        Add many participants to an existing participant group, concurrently and inside one session container.
+
+        Participants that are known to be in the group, from earlier calls or `existing_participants`, are skipped.
+
+        Args:
+            participant_group_name (str): The name of the participant group.
+            participant_ids (list): The participant IDs to add to the group.
+            prefix (str): Prefix to prepend to the participant group name during the operation.
+            existing_participants (iterable): Participants known to be in the group already.
+
+        Returns:
+            dict: The result per participant, with a 'status' of 'added', 'skipped' or 'failed' and the pepcli 'message'.
+        """
+        return self._run_in_session(self.aio.participant_group_add_many(participant_group_name, participant_ids, prefix, existing_participants))
+
+    def invalidate_query_cache(self):
+        """
+        Remove the cached query output of this client, so the next queries ask the server again.
+        """
+        if self.query_cache is not None:
+            self.query_cache.invalidate(self)
 
     def query_enrollment(self):
         """
@@ -248,7 +614,7 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        return self._command("query enrollment")
+        return self._run_async(self.aio.query_enrollment())
 
     def query_column_access(self):
         """
@@ -257,7 +623,81 @@ class PepClientBase:
         Returns:
             tuple: The output of the command and the exit code.
         """
-        return self._command("query column-access")
+        return self._run_async(self.aio.query_column_access())
+
+    def query_participant_group_access(self):
+        """
+        Query the access level for participant groups.
+
+        Returns:
+            tuple: The output of the command and the exit code.
+        """
+        return self._run_async(self.aio.query_participant_group_access())
+
+    def get_column_access(self):
+        """
+        Query the access level for columns and parse it.
+
+        Returns:
+            ColumnAccess: The columns and their access modes.
+        """
+        return self._run_async(self.aio.get_column_access())
+
+    def get_participant_group_access(self):
+        """
+        Query the access level for participant groups and parse it.
+
+        Returns:
+            ParticipantGroupAccess: The participant groups and their access modes.
+        """
+        return self._run_async(self.aio.get_participant_group_access())
+
+    def _build_pull_command(self,
+                            force=False, resume=False,
+                            update=False,
+                            assume_pristine=False,
+                            update_pseudonym_format=False,
+                            all_accessible=False,
+                            columns=None,
+                            column_groups=None,
+                            participant_groups=None,
+                            participants=None,
+                            short_pseudonyms=None,
+                            report_progress=True):
+        """
+        Build the arguments of a pull command without the output directory, see `pull`.
+        """
+        command = ['pull']
+        flag_map = {
+            'force': ('--force', force),
+            'resume': ('--resume', resume),
+            'update': ('--update', update),
+            'assume_pristine': ('--assume-pristine', assume_pristine),
+            'update_pseudonym_format': ('--update-pseudonym-format', update_pseudonym_format),
+            'all_accessible': ('--all-accessible', all_accessible),
+            'report_progress': ('--report-progress', report_progress)
+        }
+
+        for param, (flag, value) in flag_map.items():
+            if value:
+                command.append(flag)
+
+        list_param_map = {
+            'columns': ('--columns', columns),
+            'column_groups': ('--column-groups', column_groups),
+            'participant_groups': ('--participant-groups', participant_groups),
+            'participants': ('--participants', participants),
+            'short_pseudonyms': ('--short-pseudonyms', short_pseudonyms)
+        }
+
+        for param, (flag, values) in list_param_map.items():
+            if values:
+                if not isinstance(values, list):
+                    raise ValueError(f"Expected a list for '{param}' but got {type(values).__name__}")
+                for value in values:
+                    command += [flag, value]
+
+        return command
 
     def pull(self,
              target_folder='',
@@ -295,43 +735,61 @@ class PepClientBase:
         Raises:
             ValueError: If non-list parameters for list-type parameters are provided, or if the 'target_folder' is not a string.
         """
-        command_parts = ['pull']
-        flag_map = {
-            'force': ('--force', force),
-            'resume': ('--resume', resume),
-            'update': ('--update', update),
-            'assume_pristine': ('--assume-pristine', assume_pristine),
-            'update_pseudonym_format': ('--update-pseudonym-format', update_pseudonym_format),
-            'all_accessible': ('--all-accessible', all_accessible),
-            'report_progress': ('--report-progress', report_progress)
-        }
+        command = self._build_pull_command(force=force, resume=resume, update=update, assume_pristine=assume_pristine,
+                                           update_pseudonym_format=update_pseudonym_format, all_accessible=all_accessible,
+                                           columns=columns, column_groups=column_groups, participant_groups=participant_groups,
+                                           participants=participants, short_pseudonyms=short_pseudonyms, report_progress=report_progress)
 
-        for param, (flag, value) in flag_map.items():
-            if value:
-                command_parts.append(flag)
+        if target_folder and not isinstance(target_folder, str):
+            raise ValueError(f"Expected a string for 'target_folder' but got {type(target_folder).__name__}")
 
-        list_param_map = {
-            'columns': ('--columns', columns),
-            'column_groups': ('--column-groups', column_groups),
-            'participant_groups': ('--participant-groups', participant_groups),
-            'participants': ('--participants', participants),
-            'short_pseudonyms': ('--short-pseudonyms', short_pseudonyms)
-        }
+        return self._command(command, target_folder)
 
-        for param, (flag, values) in list_param_map.items():
-            if values:
-                if not isinstance(values, list):
-                    raise ValueError(f"Expected a list for '{param}' but got {type(values).__name__}")
-                for value in values:
-                    command_parts.append(f'{flag} {value}')
+    def pep_pull(self, command, target_folder="", telemetry=None, stall_timeout=None, max_restarts=0, columns=()):
+        """
+        Execute a PEP CLI pull command and stream its output.
 
-        if target_folder:
-            if not isinstance(target_folder, str):
-                raise ValueError(f"Expected a string for 'target_folder' but got {type(target_folder).__name__}")
-            command_parts.append(f'--output-directory "{target_folder}"')
+        Args:
+            command (str): The PEP CLI pull command.
+            target_folder (str): The folder to download the files to, when not given as '--output-directory' in the command.
+            telemetry (PullTelemetry): Records the timing, file and byte counts of the pull, see PullTelemetry.
+            stall_timeout (float): Seconds without progress after which the process and its container are killed.
+            max_restarts (int): Number of times a stalled pull is restarted with '--resume --update'.
+            columns (list): Columns added to the command with '-c'.
+
+        Yields:
+            str: Output lines from the PEP CLI process.
 
-        command = ' '.join(command_parts)
-        return self._command(command)
+        Returns:
+            int: The exit code from the PEP CLI process.
+        """
+        command = shlex.split(command)
+
+        for column in columns:
+            command += ["-c", column]
+
+        exit_codes = []
+        yield from self._iterate_async(self.aio.watched_stream(command, target_folder, telemetry, stall_timeout, max_restarts, on_exit=exit_codes.append))
+        return exit_codes[-1] if exit_codes else None
+
+    def pep_pull_sharded(self, shards, target_folder, retries=2, telemetry=None, stall_timeout=None, max_concurrent=None, write_limiter=None, **kwargs):
+        """
+        Pull the columns of several shards with concurrent PEP CLI processes and merge them into the target folder.
+
+        Args:
+            shards (list): The PullShard objects, see plan_pull_shards.
+            target_folder (str): The 'pulled-data' folder to merge the shards into.
+            retries (int): Number of times a failed shard is pulled again, without restarting the other shards.
+            telemetry (PullTelemetry): Records the timing, file and byte counts of the shards, see PullTelemetry.
+            stall_timeout (float): Seconds without progress after which a shard is killed and retried with '--resume'.
+            max_concurrent (int): Maximum number of shards pulled at the same time, in the order of the shards, see plan_scheduled_pull.
+            write_limiter (WriteRateLimiter): Shards are not started while the disk writes are above its target rate.
+            **kwargs: Further arguments of `pull`, except 'columns'.
+
+        Yields:
+            tuple: The PullShard and one of its output lines.
+        """
+        yield from self._iterate_async(self.aio.pull_shards(shards, target_folder, retries, telemetry, stall_timeout, max_concurrent, write_limiter, **kwargs))
 
     def pep_command_parser(self, output, exit_code):
         """
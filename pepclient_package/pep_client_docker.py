@@ -1,7 +1,6 @@
 import os
 import subprocess
-
-from helpers.functions import get_selected_columns
+import uuid
 
 from .pep_client_base import PepClientBase
 
@@ -16,6 +15,7 @@ class PepClientDocker(PepClientBase):
     """
     production_docker_image = "gitlabregistry.pep.cs.ru.nl/pep-public/core/hb-prod:latest"
     acceptance_docker_image = "gitlabregistry.pep.cs.ru.nl/pep-public/core/hb-acc:latest"
+    pepcli_container_command = ["/app/pepcli", "--client-working-directory", "/config", "--oauth-token", "/token"]
 
     def _check_pepcli_path(self, pepcli_exec):
         """
@@ -33,76 +33,106 @@ class PepClientDocker(PepClientBase):
     def _build_base_command(self):
         """
         Builds the base command for executing Docker commands with the selected PEP CLI image.
-        """
-        self.base_command = "docker run -it --rm "
-        self.pepcli_selected_image_path = ""
 
+        Returns:
+            list: The base command arguments to run the PEP CLI in a new container.
+
+        Raises:
+            ModuleNotFoundError: If the logon authentication method is specified.
+        """
         if self.production:
             self.pepcli_selected_image_path = self.production_docker_image
         else:
             self.pepcli_selected_image_path = self.acceptance_docker_image
 
-        if self.auth_method == "token":
-            self.base_command += f" -v \"{self.pep_token_filepath}:/token:ro\""
-        else:
+        if self.auth_method != "token":
             raise ModuleNotFoundError("Logon is not available in Docker environment")
 
-        self.base_command += f" {self.pepcli_selected_image_path} bash -c"
+        return ["docker", "run", "--rm", "-v", f"{self.pep_token_filepath}:/token:ro", self.pepcli_selected_image_path] + self.pepcli_container_command
 
-    def _command(self, command):
+    def _build_full_command(self, base_command, command, target_folder=""):
         """
-        Execute the Docker command with the specified PEP CLI command and handle authentication.
+        Builds the full Docker command, mounting the target folder into a new container when one is given.
 
         Args:
-            command (str): The PEP CLI command to execute.
+            base_command (list): The base command arguments.
+            command (list): The PEP CLI command arguments.
+            target_folder (str): The folder to download the files to.
 
         Returns:
-            tuple: A tuple containing the command output and the exit code.
-
-        Raises:
-            ModuleNotFoundError: If the logon authentication method is specified.
+            list: The full command arguments.
         """
-        full_command = f'{self.base_command} "/app/pepcli --client-working-directory /config  --oauth-token /token {command}"'
-        result = []
+        if not target_folder:
+            return base_command + command
 
-        if self.auth_method == "logon":
-            raise ModuleNotFoundError("Logon is not available in Docker environment")
-        else:
-            result, exit_code = self._command_auth_method_token(full_command)
+        # Mount the parent folder, so pepcli can create its pending folder next to the target folder
+        parent_folder, target_folder_name = os.path.split(os.path.abspath(target_folder))
+        container_name = f"pep-pull-{uuid.uuid4().hex[:12]}"
 
-        return self.pep_command_parser(result, exit_code)
+        return (["docker", "run", "--rm", "--name", container_name, "-v", f"{self.pep_token_filepath}:/token:ro", "-v", f"{parent_folder}:/output", "-w", "/output",
+                 self.pepcli_selected_image_path] + self.pepcli_container_command + command + ["--output-directory", f"/output/{target_folder_name}"])
 
-    def pep_pull(self, command, target_folder=""):
+    def _stop_container_command(self, full_command):
         """
-        Executes a PEP CLI pull command in Docker to download files to a specified folder.
+        Builds the command that removes the container of a pull, which keeps running when only the Docker client is killed.
 
         Args:
-            command (str): The PEP CLI pull command.
-            target_folder (str): The target folder to download the files to.
+            full_command (list): The full argument list of the command.
+        """
+        if full_command[:2] != ["docker", "run"] or "--name" not in full_command:
+            return None
+
+        return ["docker", "rm", "-f", full_command[full_command.index("--name") + 1]]
+
+    @classmethod
+    def warm_up(cls, production=True, timeout=None):
+        """
+        Pulls the PEP CLI image when it is not available locally yet, so the first command does not wait for the download.
 
-        Yields:
-            str: Output lines from the PEP CLI process.
+        Args:
+            production (bool): Flag to indicate if the production environment should be used.
+            timeout (float): Maximum number of seconds the pull may take, None for no limit.
 
         Returns:
-            int: The exit code from the PEP CLI process.
+            dict: The image and whether it had to be pulled.
+
+        Raises:
+            subprocess.TimeoutExpired: If the pull took longer than the timeout.
         """
-        selected_columns = get_selected_columns()
-        command = ''
-        if selected_columns:
-            command += ' ' + ' '.join(f'-c {column}' for column in selected_columns)
+        image = cls.production_docker_image if production else cls.acceptance_docker_image
 
-        full_command = f'{self.base_command} "cd /output && /app/pepcli --client-working-directory /config  --oauth-token /token {command}"'
+        if subprocess.run(["docker", "image", "inspect", image], capture_output=True, timeout=timeout).returncode == 0:
+            return {"image": image, "pulled": False}
 
-        process = subprocess.Popen(full_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, encoding="utf-8", bufsize=1, universal_newlines=True)
+        result = subprocess.run(["docker", "pull", image], capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to pull {image}: {result.stderr.strip()}")
 
-        while True:
-            if not process.stdout:
-                break
+        return {"image": image, "pulled": True}
+
+    def _start_session_command(self, session_name):
+        """
+        Builds the command that starts a detached container which stays alive until it is stopped.
 
-            output_line = process.stdout.readline()
-            if output_line == '' and process.poll() is not None:
-                break
-            if output_line:
-                yield output_line.strip()
-        rc = process.poll()
-        return rc
+        Args:
+            session_name (str): The name to give the container.
+        """
+        return ["docker", "run", "-d", "--rm", "--name", session_name, "-v", f"{self.pep_token_filepath}:/token:ro", self.pepcli_selected_image_path, "sleep", "infinity"]
+
+    def _stop_session_command(self, session_name):
+        """
+        Builds the command that removes the session container.
+
+        Args:
+            session_name (str): The name of the container.
+        """
+        return ["docker", "rm", "-f", session_name]
+
+    def _build_session_base_command(self, session_name):
+        """
+        Builds the base command for executing PEP CLI commands inside the running session container.
+
+        Args:
+            session_name (str): The name of the container.
+        """
+        return ["docker", "exec", session_name] + self.pepcli_container_command
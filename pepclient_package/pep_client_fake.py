@@ -0,0 +1,45 @@
+import os
+import sys
+
+from .pep_client_base import PepClientBase
+
+
+class PepClientFake(PepClientBase):
+    """
+    A PEP client that runs the simulated pepcli in fake_pepcli.py, to exercise and benchmark the clients without a PEP server.
+
+    Attributes:
+        fake_pepcli_path (str): Path to the simulated pepcli script.
+    """
+    fake_pepcli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_pepcli.py")
+
+    def __init__(self, pep_token_filepath="", production=True, auth_method="token", session=False, query_cache=None, **fake_options):
+        """
+        Initializes the simulated PEP client.
+
+        Args:
+            pep_token_filepath (str): The file path to the authentication token, passed on but not read.
+            production (bool): Accepted for a uniform interface, the simulation has a single environment.
+            auth_method (str): The authentication method to use ("token" or "logon").
+            session (bool): Accepted for a uniform interface, the simulated client does not run in a container.
+            query_cache (PepQueryCache): Cache for the enrollment, column access and participant group access queries.
+            **fake_options: Options of the simulated pepcli, for example latency=0.5 or fail_rate=0.1, see fake_pepcli.py.
+        """
+        self.fake_options = fake_options
+        super().__init__(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
+
+    def _build_base_command(self):
+        """
+        Build the base command running the simulated pepcli with the current Python interpreter.
+
+        Returns:
+            list: The base command arguments to run the simulated PEP CLI.
+        """
+        base_command = [sys.executable, self.fake_pepcli_path]
+        for name, value in self.fake_options.items():
+            base_command += [f"--fake-{name.replace('_', '-')}", str(value)]
+
+        if self.auth_method == "token":
+            base_command += ["--oauth-token", self.pep_token_filepath]
+
+        return base_command
@@ -1,11 +1,99 @@
 import os
 import re
-import subprocess
-
-from helpers.functions import get_selected_columns
+import shutil
+import threading
+import time
+import uuid
 
 from .pep_client_base import PepClientBase
 
+# Environment variables pointing to node-local scratch space on HPC systems, in order of preference
+scratch_environment_variables = ["SLURM_TMPDIR", "LOCAL_SCRATCH", "TMPDIR"]
+
+
+def get_node_local_scratch():
+    """
+    Return the node-local scratch folder announced by the scheduler, or None if there is none.
+
+    Returns:
+        str: The path of the scratch folder.
+    """
+    for variable in scratch_environment_variables:
+        folder = os.environ.get(variable)
+        if folder and os.path.isdir(folder) and os.access(folder, os.W_OK):
+            return folder
+
+    return None
+
+
+def read_image(image_path, destination_file=None, timeout=None, stop_event=None):
+    """
+    Read an image in chunks, optionally writing it to a file, until it is read or the time is up.
+
+    Args:
+        image_path (str): The image on shared storage.
+        destination_file (file): The file the image is copied to, None to only read it.
+        timeout (float): Maximum number of seconds to read, None for no limit.
+        stop_event (threading.Event): Stops reading when set.
+
+    Raises:
+        TimeoutError: If the image could not be read within the timeout, or reading was stopped.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    with open(image_path, "rb") as image_file:
+        while True:
+            if (deadline is not None and time.monotonic() > deadline) or (stop_event is not None and stop_event.is_set()):
+                raise TimeoutError(f"Reading {image_path} was stopped before it was done")
+
+            chunk = image_file.read(16 * 1024 * 1024)
+            if not chunk:
+                break
+            if destination_file is not None:
+                destination_file.write(chunk)
+
+
+def stage_image(image_path, scratch_folder, timeout=None, stop_event=None):
+    """
+    Copy an image to a scratch folder, unless an identical copy is already there.
+
+    The copy is named after the size and modification time of the image, so a changed image is staged again.
+
+    Args:
+        image_path (str): The image on shared storage.
+        scratch_folder (str): The node-local scratch folder.
+        timeout (float): Maximum number of seconds the copy may take, None for no limit.
+        stop_event (threading.Event): Stops the copy when set.
+
+    Returns:
+        str: The path of the staged image.
+
+    Raises:
+        TimeoutError: If the copy did not finish within the timeout or was stopped, the partial copy is removed.
+    """
+    stat = os.stat(image_path)
+    name, extension = os.path.splitext(os.path.basename(image_path))
+    staged_folder = os.path.join(scratch_folder, "pep-images")
+    staged_path = os.path.join(staged_folder, f"{name}-{stat.st_size}-{int(stat.st_mtime)}{extension}")
+
+    if os.path.isfile(staged_path) and os.path.getsize(staged_path) == stat.st_size:
+        return staged_path
+
+    if shutil.disk_usage(scratch_folder).free < 2 * stat.st_size:
+        raise OSError(f"Not enough free space in {scratch_folder} to stage {image_path}")
+
+    os.makedirs(staged_folder, exist_ok=True)
+    temporary_path = f"{staged_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(temporary_path, "wb") as temporary_file:
+            read_image(image_path, temporary_file, timeout, stop_event)
+        os.replace(temporary_path, staged_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    return staged_path
+
 
 class PepClientSingularity(PepClientBase):
     """
@@ -17,6 +105,61 @@ class PepClientSingularity(PepClientBase):
     production_singularity_image_path = re.sub(r'project_\w+', 'project', production_singularity_image_path)  # For HPC use
     acceptation_singularity_image_path = ""
 
+    # Copies of the images on node-local scratch, by original path, see warm_up
+    staged_image_paths = {}
+    staged_image_paths_lock = threading.Lock()
+    stop_staging = threading.Event()
+
+    @classmethod
+    def warm_up(cls, production=True, timeout=None):
+        """
+        Copy the image from shared storage to node-local scratch when the scheduler provides one, and read it once
+        otherwise, so the first command does not wait for the slow shared file system.
+
+        Args:
+            production (bool): Flag to indicate if the production environment should be used.
+            timeout (float): Maximum number of seconds the copy or read may take, None for no limit.
+
+        Returns:
+            dict: The image and the path it is run from.
+
+        Raises:
+            TimeoutError: If the image could not be copied or read within the timeout.
+        """
+        image_path = cls.production_singularity_image_path if production else cls.acceptation_singularity_image_path
+        if not os.path.isfile(image_path):
+            raise FileNotFoundError(f"Singularity image not found at {image_path}.")
+
+        scratch_folder = get_node_local_scratch()
+        if scratch_folder is None or os.path.abspath(image_path).startswith(os.path.abspath(scratch_folder) + os.sep):
+            # Reading the image fills the page cache of this node
+            read_image(image_path, timeout=timeout, stop_event=cls.stop_staging)
+            return {"image": image_path, "resolved": image_path}
+
+        staged_path = stage_image(image_path, scratch_folder, timeout, cls.stop_staging)
+        with cls.staged_image_paths_lock:
+            cls.staged_image_paths[image_path] = staged_path
+
+        return {"image": image_path, "resolved": staged_path}
+
+    @classmethod
+    def clean_up_warm_up(cls):
+        """
+        Stop staging images and remove the staged copies from node-local scratch.
+        """
+        cls.stop_staging.set()
+
+        with cls.staged_image_paths_lock:
+            staged_paths = list(cls.staged_image_paths.values())
+            cls.staged_image_paths.clear()
+
+        for staged_path in staged_paths:
+            try:
+                os.remove(staged_path)
+                os.rmdir(os.path.dirname(staged_path))
+            except OSError:
+                pass
+
     def _check_pepcli_path(self, pepcli_exec):
         """
         Check if the PEP CLI executable is present at the specified path.
@@ -35,50 +178,77 @@ class PepClientSingularity(PepClientBase):
         Construct the base command for running the PEP CLI within a Singularity container.
 
         Returns:
-            str: The base command to execute PEP CLI within the Singularity container.
+            list: The base command arguments to execute PEP CLI within the Singularity container.
         """
-        self.pepcli_selected_image_path = ""
         if self.production:
-            singularity_base_command = f"singularity exec \"{self.production_singularity_image_path}\" \"/app/pepcli\" --client-working-directory \"/config\""
             self.pepcli_selected_image_path = self.production_singularity_image_path
         else:
-            singularity_base_command = f"singularity exec \"{self.acceptation_singularity_image_path}\" \"/app/pepcli\" --client-working-directory \"/config\""
             self.pepcli_selected_image_path = self.acceptation_singularity_image_path
 
+        # Use the staged copy of the image when the warm-up made one
+        with self.staged_image_paths_lock:
+            self.pepcli_selected_image_path = self.staged_image_paths.get(self.pepcli_selected_image_path, self.pepcli_selected_image_path)
+
         # Check if the PEP CLI executable exists at the specified path
         self._check_pepcli_path(self.pepcli_selected_image_path)
 
+        singularity_base_command = ["singularity", "exec", self.pepcli_selected_image_path, "/app/pepcli", "--client-working-directory", "/config"]
+
         if self.auth_method == "token":
-            return f"{singularity_base_command} --oauth-token \"{self.pep_token_filepath}\""
+            return singularity_base_command + ["--oauth-token", self.pep_token_filepath]
         else:
             return singularity_base_command
 
-    def pep_pull(self, command):
+    def _build_full_command(self, base_command, command, target_folder=""):
         """
-        Execute a PEP command using the Singularity container and return the process output.
+        Construct the full Singularity command, binding the parent of the target folder when one is given.
+
+        Pulls run with their own `singularity exec`, also in a session, since folders outside the default binds
+        ($HOME, /tmp and the working directory) are not visible in the container and an instance cannot bind more.
 
         Args:
-            command (str): The PEP command to execute.
+            base_command (list): The base command arguments.
+            command (list): The PEP CLI command arguments.
+            target_folder (str): The folder to download the files to.
 
         Returns:
-            int: The return code of the subprocess executing the PEP command.
+            list: The full command arguments.
         """
-        command = f"{self.base_command} {command}"
+        if not target_folder:
+            return base_command + command
 
-        selected_columns = get_selected_columns()
-        if selected_columns:
-            command += ' ' + ' '.join(f'-c {column}' for column in selected_columns)
+        # Bind the parent folder, so pepcli can create its pending folder next to the target folder
+        target_folder = os.path.abspath(target_folder)
+        parent_folder = os.path.dirname(target_folder)
 
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding="ISO-8859-1", shell=True, bufsize=1, universal_newlines=True)
+        return ["singularity", "exec", "--bind", parent_folder] + self.base_command[2:] + command + ["--output-directory", target_folder]
 
-        while True:
-            if not process.stdout:
-                break
+    def _start_session_command(self, session_name):
+        """
+        Construct the command that starts a Singularity instance of the selected image.
 
-            output_line = process.stdout.readline()
-            if output_line == '' and process.poll() is not None:
-                break
-            if output_line:
-                yield output_line.strip()
-        rc = process.poll()
-        return rc
+        Args:
+            session_name (str): The name to give the instance.
+        """
+        return ["singularity", "instance", "start", self.pepcli_selected_image_path, session_name]
+
+    def _stop_session_command(self, session_name):
+        """
+        Construct the command that stops the Singularity instance.
+
+        Args:
+            session_name (str): The name of the instance.
+        """
+        return ["singularity", "instance", "stop", session_name]
+
+    def _build_session_base_command(self, session_name):
+        """
+        Construct the base command for running the PEP CLI within the running Singularity instance.
+
+        Args:
+            session_name (str): The name of the instance.
+
+        Returns:
+            list: The base command arguments to execute PEP CLI within the Singularity instance.
+        """
+        return ["singularity", "exec", f"instance://{session_name}"] + self.base_command[3:]
@@ -1,8 +1,5 @@
 import os
 import subprocess
-import tempfile
-
-from helpers.functions import get_selected_columns
 
 from .pep_client_base import PepClientBase
 
@@ -15,7 +12,7 @@ class PepClientWindows(PepClientBase):
         production_cli (str): Path to the production version of the PEP CLI executable.
         acceptation_cli (str): Path to the acceptance testing version of the PEP CLI executable.
     """
-    def __init__(self, pep_token_filepath="", production=True, auth_method="token"):
+    def __init__(self, pep_token_filepath="", production=True, auth_method="token", session=False, query_cache=None):
         """
         Initializes the PepClientWindows class by setting up the CLI paths and
         passing initialization data to the PepClientBase class.
@@ -24,10 +21,12 @@ class PepClientWindows(PepClientBase):
             pep_token_filepath (str): The file path to the authentication token.
             production (bool): Flag to indicate if the production environment should be used.
             auth_method (str): The authentication method to use ("token" or "logon").
+            session (bool): Accepted for a uniform interface, the Windows client does not run in a container.
+            query_cache (PepQueryCache): Cache for the enrollment, column access and participant group access queries.
         """
         self.production_cli = os.path.join(os.environ['PROGRAMFILES'], "PEP-Client (hb prod)", "pepcli.exe")
         self.acceptation_cli = os.path.join(os.environ['PROGRAMFILES'], "PEP-Client (hb acc)", "pepcli.exe")
-        super().__init__(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method)
+        super().__init__(pep_token_filepath=pep_token_filepath, production=production, auth_method=auth_method, session=session, query_cache=query_cache)
 
     def _check_pepcli_path(self, pepcli_exec):
         """
@@ -47,7 +46,7 @@ class PepClientWindows(PepClientBase):
         Build the base command for interacting with the PEP CLI based on the mode of operation (production or acceptance).
 
         Returns:
-            str: The base command to run the PEP CLI.
+            list: The base command arguments to run the PEP CLI.
         """
         if self.production:
             pepcli_exec = self.production_cli
@@ -57,9 +56,9 @@ class PepClientWindows(PepClientBase):
         self._check_pepcli_path(pepcli_exec)
 
         if self.auth_method == "token":
-            return f"\"{pepcli_exec}\" --oauth-token \"{self.pep_token_filepath}\""
+            return [pepcli_exec, "--oauth-token", self.pep_token_filepath]
         else:
-            return f"\"{pepcli_exec}\""
+            return [pepcli_exec]
 
     def pep_logon(self):
         """
@@ -73,39 +72,3 @@ class PepClientWindows(PepClientBase):
             command = self.acceptation_cli.replace('pepcli.exe', 'pepLogon.exe')
 
         subprocess.run(command, cwd=self.temp_dir_logon.name)
-
-    def pep_pull(self, command):
-        """
-        Execute a PEP pull command to retrieve data.
-
-        Args:
-            command (str): The PEP pull command to execute.
-
-        Yields:
-            str: Output lines from the command execution.
-
-        Returns:
-            int: The return code of the process.
-        """
-        command = f"{self.base_command} {command}"
-
-        selected_columns = get_selected_columns()
-        if selected_columns:
-            command += ' ' + ' '.join(f'-c {column}' for column in selected_columns)
-
-        print(command)
-
-        with tempfile.TemporaryDirectory() as tempdir:
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, bufsize=1, universal_newlines=True, cwd=tempdir)
-
-            while True:
-                if not process.stdout:
-                    break
-
-                output_line = process.stdout.readline()
-                if output_line == '' and process.poll() is not None:
-                    break
-                if output_line:
-                    yield output_line.strip()
-            rc = process.poll()
-        return rc
@@ -0,0 +1,239 @@
+import json
+import os
+
+from .pep_models import get_cell_marker, get_cell_size
+from .pep_sharded_pull import PullShard, get_shards_folder
+
+
+def get_markers_filepath(target_folder):
+    return f"{os.path.abspath(target_folder).rstrip(os.sep)}-markers.json"
+
+
+def load_pulled_markers(target_folder):
+    """
+    Load the change markers the cells had on the server when they were pulled, see get_cell_marker.
+
+    Args:
+        target_folder (str): The 'pulled-data' folder.
+
+    Returns:
+        dict: The marker by (participant, column), empty when no markers were recorded.
+    """
+    try:
+        with open(get_markers_filepath(target_folder), 'r') as markers_file:
+            markers = json.load(markers_file)
+    except (OSError, ValueError):
+        return {}
+
+    return {tuple(key.split("/", 1)): marker for key, marker in markers.items() if "/" in key}
+
+
+def save_pulled_markers(target_folder, markers):
+    """
+    Record the change markers of pulled cells, keeping the markers of the other cells.
+
+    Args:
+        target_folder (str): The 'pulled-data' folder.
+        markers (dict): The marker by (participant, column) of the cells that were pulled or found up to date.
+    """
+    recorded = load_pulled_markers(target_folder)
+    recorded.update(markers)
+    markers_filepath = get_markers_filepath(target_folder)
+
+    with open(f"{markers_filepath}.tmp", 'w') as markers_file:
+        json.dump({f"{participant}/{column}": marker for (participant, column), marker in sorted(recorded.items())}, markers_file)
+    os.replace(f"{markers_filepath}.tmp", markers_filepath)
+
+
+class LocalCell:
+    """
+    A downloaded column of a participant in the 'pulled-data' folder.
+
+    Attributes:
+        participant (str): The participant folder name.
+        column (str): The column name.
+        path (str): The archive, or the folder it was extracted to.
+        size (int): The size of the archive in bytes, None when only the extracted folder is left.
+        mtime (float): The modification time of the archive or folder.
+    """
+
+    def __init__(self, participant, column, path, size, mtime):
+        self.participant = participant
+        self.column = column
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+    def __repr__(self):
+        return f"LocalCell(participant={self.participant!r}, column={self.column!r}, size={self.size})"
+
+
+def scan_local_inventory(target_folder):
+    """
+    Find the downloaded columns of every participant, using only the directory entries and their stat data.
+
+    A column is found as the archive pepcli wrote (without extension), the archive renamed to '.zip' by the unzip
+    tool, or the folder it was extracted to. The archive is preferred, as only its size can be compared.
+
+    Args:
+        target_folder (str): The 'pulled-data' folder.
+
+    Returns:
+        dict: The LocalCell by (participant, column).
+    """
+    inventory = {}
+    if not os.path.isdir(target_folder):
+        return inventory
+
+    with os.scandir(target_folder) as participant_entries:
+        for participant_entry in participant_entries:
+            if not participant_entry.is_dir() or participant_entry.name.startswith("."):
+                continue
+
+            with os.scandir(participant_entry.path) as column_entries:
+                for column_entry in column_entries:
+                    name = column_entry.name
+                    if name.startswith("."):
+                        continue
+
+                    stat = column_entry.stat()
+                    if column_entry.is_dir():
+                        cell = LocalCell(participant_entry.name, name, column_entry.path, None, stat.st_mtime)
+                    else:
+                        column = name[:-len(".zip")] if name.endswith(".zip") else name
+                        cell = LocalCell(participant_entry.name, column, column_entry.path, stat.st_size, stat.st_mtime)
+
+                    key = (cell.participant, cell.column)
+                    if key not in inventory or inventory[key].size is None:
+                        inventory[key] = cell
+
+    return inventory
+
+
+class DeltaPlan:
+    """
+    The difference between the server and the local 'pulled-data' folder, and the targeted pulls to resolve it.
+
+    Attributes:
+        missing (list): The (participant, column) cells on the server that are not downloaded.
+        stale (list): The (participant, column) cells that changed on the server since they were downloaded.
+        unverified (list): The downloaded (participant, column) cells that cannot be compared with the server,
+            because there is no change marker for them. Pull them with '--update', so pepcli checks them.
+        up_to_date (int): The number of cells that are downloaded and unchanged.
+        shards (list): The PullShard objects pulling the missing and stale cells, with their participants set.
+        errors (list): Error messages of list calls that failed. The plan is incomplete when there are any.
+        markers (dict): The change marker on the server by (participant, column), for the cells that have one.
+    """
+
+    def __init__(self, missing, stale, up_to_date, shards, errors=None, unverified=None, markers=None):
+        self.missing = missing
+        self.stale = stale
+        self.unverified = unverified or []
+        self.up_to_date = up_to_date
+        self.shards = shards
+        self.errors = errors or []
+        self.markers = markers or {}
+
+    def get_unverified_columns(self):
+        return sorted({column for _, column in self.unverified})
+
+    def get_summary_text(self):
+        text = (f"{self.up_to_date} files are up to date, {len(self.missing)} missing and {len(self.stale)} changed, "
+                f"to be pulled with {len(self.shards)} targeted pull(s).")
+        if self.unverified:
+            text += f" {len(self.unverified)} files cannot be compared with the server and are checked with '--update'."
+        return text
+
+    def record_markers(self, target_folder, cells):
+        """
+        Record the change markers of cells that were pulled or checked, so the next plan can compare them.
+
+        Args:
+            target_folder (str): The 'pulled-data' folder.
+            cells (iterable): The (participant, column) cells that are now up to date.
+        """
+        markers = {cell: self.markers[cell] for cell in cells if cell in self.markers}
+        if markers:
+            save_pulled_markers(target_folder, markers)
+
+    def __repr__(self):
+        return (f"DeltaPlan(missing={len(self.missing)}, stale={len(self.stale)}, unverified={len(self.unverified)}, "
+                f"up_to_date={self.up_to_date}, shards={len(self.shards)})")
+
+
+def compare_inventory(local_inventory, list_result, columns, pulled_markers=None):
+    """
+    Compare the local inventory with the server listing of the columns.
+
+    A cell is stale when its change marker on the server differs from the marker recorded when it was pulled, when
+    both the server and the local archive have a size and they differ, or when the local archive is empty. A cell
+    without a marker on the server, or without a recorded marker, cannot be compared and is unverified.
+
+    Args:
+        local_inventory (dict): The LocalCell by (participant, column), see scan_local_inventory.
+        list_result (ListResult): The `list --no-inline-data` result of the columns.
+        columns (iterable): The columns to compare.
+        pulled_markers (dict): The recorded marker by (participant, column), see load_pulled_markers.
+
+    Returns:
+        tuple: The missing, stale and unverified (participant, column) cells, sorted, and the number of up to date cells.
+    """
+    columns = set(columns)
+    pulled_markers = pulled_markers or {}
+    missing, stale, unverified, up_to_date = [], [], [], 0
+
+    for cell in list_result:
+        if cell.column not in columns:
+            continue
+
+        key = (cell.participant, cell.column)
+        local_cell = local_inventory.get(key)
+        if local_cell is None:
+            missing.append(key)
+            continue
+
+        server_size = get_cell_size(cell)
+        server_marker = get_cell_marker(cell)
+        pulled_marker = pulled_markers.get(key)
+        if local_cell.size == 0 or (local_cell.size is not None and server_size is not None and local_cell.size != server_size):
+            stale.append(key)
+        elif server_marker is None or pulled_marker is None:
+            unverified.append(key)
+        elif server_marker != pulled_marker:
+            stale.append(key)
+        else:
+            up_to_date += 1
+
+    return sorted(missing), sorted(stale), sorted(unverified), up_to_date
+
+
+def plan_delta_shards(cells, target_folder, participants_per_pull=100):
+    """
+    Group cells into targeted pulls: participants that miss the same columns are pulled together.
+
+    Args:
+        cells (iterable): The (participant, column) cells to pull.
+        target_folder (str): The 'pulled-data' folder the pulls are merged into.
+        participants_per_pull (int): Maximum number of participants per pull, to keep the command line short.
+
+    Returns:
+        list: The PullShard objects, each with its participants and columns, the largest groups first.
+    """
+    columns_by_participant = {}
+    for participant, column in cells:
+        columns_by_participant.setdefault(participant, set()).add(column)
+
+    participants_by_columns = {}
+    for participant, columns in sorted(columns_by_participant.items()):
+        participants_by_columns.setdefault(tuple(sorted(columns)), []).append(participant)
+
+    groups = sorted(participants_by_columns.items(), key=lambda group: len(group[0]) * len(group[1]), reverse=True)
+    shards_folder = get_shards_folder(target_folder)
+    shards = []
+
+    for columns, participants in groups:
+        for start in range(0, len(participants), participants_per_pull):
+            index = len(shards)
+            shards.append(PullShard(index, list(columns), os.path.join(shards_folder, f"shard-{index}"), participants[start:start + participants_per_pull]))
+
+    return shards
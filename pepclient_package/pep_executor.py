@@ -0,0 +1,231 @@
+import asyncio
+import collections
+import random
+import re
+import subprocess
+import threading
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed PEP CLI command is run again and how long to wait before the next attempt.
+
+    The delay grows exponentially from `backoff` up to `max_backoff` seconds, with a random jitter of up to
+    `jitter` times the delay, so commands that failed at the same moment do not all retry at the same moment.
+
+    Attributes:
+        max_attempts (int): Maximum number of attempts, 1 disables retries.
+        backoff (float): Seconds to wait before the first retry.
+        max_backoff (float): Maximum number of seconds to wait between attempts.
+        jitter (float): Fraction of the delay that is randomised.
+        retryable_exit_codes (tuple): Exit codes after which the command is retried, None retries every non-zero exit code.
+        retry_on_timeout (bool): Retry commands that ran longer than their timeout.
+        retryable_commands (tuple): The PEP CLI commands that are retried by their first word, for example 'query',
+            None retries every command.
+        permanent_error_pattern (re.Pattern): Errors in the output of a failed command that fail the same way on every
+            attempt, such as access denied, so the command is not retried. None treats every error as transient.
+    """
+
+    def __init__(self, max_attempts=1, backoff=1.0, max_backoff=30.0, jitter=0.5, retryable_exit_codes=None, retry_on_timeout=False, retryable_commands=None,
+                 permanent_error_pattern=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retryable_exit_codes = retryable_exit_codes
+        self.retry_on_timeout = retry_on_timeout
+        self.retryable_commands = retryable_commands
+        self.permanent_error_pattern = permanent_error_pattern
+
+    def should_retry(self, attempt, exit_code, timed_out=False, command_name="", output=""):
+        """
+        Decide whether to run a command again after an attempt.
+
+        Args:
+            attempt (int): The number of the attempt that just finished, starting at 1.
+            exit_code (int): The exit code of the attempt, None when it timed out.
+            timed_out (bool): Whether the attempt ran longer than its timeout.
+            command_name (str): The PEP CLI subcommand, see get_command_name.
+            output (str): The error output of the attempt.
+
+        Returns:
+            bool: True if the command should be run again.
+        """
+        if attempt >= self.max_attempts:
+            return False
+
+        if self.retryable_commands is not None and command_name.split(" ")[0] not in self.retryable_commands:
+            return False
+
+        if timed_out:
+            return self.retry_on_timeout
+
+        if exit_code == 0:
+            return False
+
+        if self.permanent_error_pattern is not None and self.permanent_error_pattern.search(output):
+            return False
+
+        return self.retryable_exit_codes is None or exit_code in self.retryable_exit_codes
+
+    def get_delay(self, attempt):
+        """
+        Return the number of seconds to wait after a failed attempt.
+
+        Args:
+            attempt (int): The number of the attempt that just failed, starting at 1.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay * (1 - self.jitter * random.random())
+
+
+# The policy every engine starts with: read-only commands are retried after transient errors and timeouts.
+# Stores are retried by store_bulk with store_retry_policy and pulls are restarted when they stall, so those are not retried here.
+default_retry_policy = RetryPolicy(max_attempts=3, retry_on_timeout=True, retryable_commands=("query", "list"))
+
+# pepcli exits with 1 for every error, the container runtimes with 125 when they cannot start the container, 137 when it
+# is killed and 255 when Singularity fails. An upload that is refused, or of a file or column that does not exist,
+# fails the same way on every attempt, so those errors are recognised by their message and not retried.
+store_retryable_exit_codes = (1, 125, 137, 255)
+store_permanent_error_pattern = re.compile(r"access denied|permission denied|not authori[sz]ed|unauthori[sz]ed|forbidden|no such file|does not exist|not found|"
+                                           r"unknown column|invalid", re.IGNORECASE)
+
+# The policy of store_bulk: uploads are retried after transient errors and timeouts, with a longer backoff than queries.
+store_retry_policy = RetryPolicy(max_attempts=4, backoff=1.0, max_backoff=60.0, retryable_exit_codes=store_retryable_exit_codes, retry_on_timeout=True,
+                                 retryable_commands=("store",), permanent_error_pattern=store_permanent_error_pattern)
+
+
+class CommandMetrics:
+    """
+    The metrics of a single PEP CLI invocation.
+
+    Attributes:
+        command (str): The PEP CLI subcommand, for example 'list' or 'query enrollment'.
+        attempt (int): The number of the attempt, starting at 1.
+        started_at (float): The time the invocation started, as a Unix timestamp.
+        duration (float): The running time in seconds.
+        exit_code (int): The exit code, None when the invocation timed out or could not be started.
+        timed_out (bool): Whether the invocation ran longer than its timeout.
+        output_bytes (int): The number of bytes written to stdout and stderr.
+    """
+
+    def __init__(self, command, attempt, started_at, duration, exit_code, timed_out=False, output_bytes=0):
+        self.command = command
+        self.attempt = attempt
+        self.started_at = started_at
+        self.duration = duration
+        self.exit_code = exit_code
+        self.timed_out = timed_out
+        self.output_bytes = output_bytes
+
+    def __repr__(self):
+        return (f"CommandMetrics(command={self.command!r}, attempt={self.attempt}, duration={self.duration:.2f}, "
+                f"exit_code={self.exit_code!r}, timed_out={self.timed_out})")
+
+
+class MetricsRecorder:
+    """
+    Keeps the metrics of the most recent PEP CLI invocations of a client.
+    """
+
+    def __init__(self, max_records=1000):
+        self.records = collections.deque(maxlen=max_records)
+        self.lock = threading.Lock()
+
+    def record(self, metrics):
+        with self.lock:
+            self.records.append(metrics)
+
+    def get_records(self):
+        with self.lock:
+            return list(self.records)
+
+    def summary(self):
+        """
+        Summarise the recorded invocations per command.
+
+        Returns:
+            dict: Per command the number of invocations, failures, timeouts, retries and the total and maximum duration.
+        """
+        summary = {}
+        for metrics in self.get_records():
+            command_summary = summary.setdefault(metrics.command, {"invocations": 0, "failures": 0, "timeouts": 0, "retries": 0, "total_duration": 0.0, "max_duration": 0.0})
+            command_summary["invocations"] += 1
+            command_summary["failures"] += metrics.exit_code != 0
+            command_summary["timeouts"] += metrics.timed_out
+            command_summary["retries"] += metrics.attempt > 1
+            command_summary["total_duration"] += metrics.duration
+            command_summary["max_duration"] = max(command_summary["max_duration"], metrics.duration)
+
+        return summary
+
+
+def get_command_name(command):
+    """
+    Return the PEP CLI subcommand of an argument list, without options and values, for example 'query enrollment'.
+
+    Args:
+        command (list): The PEP CLI arguments, without the base command.
+
+    Returns:
+        str: The subcommand.
+    """
+    words = []
+    for argument in command:
+        if argument.startswith("-") or len(words) == 2:
+            break
+        words.append(argument)
+
+    return " ".join(words)
+
+
+class SubprocessExecutor:
+    """
+    Runs PEP CLI commands as asyncio subprocesses, without a shell.
+
+    Replace the executor of a client to run the commands in another way, for example remotely or in tests.
+    """
+
+    async def run(self, argv, cwd=None, timeout=None):
+        """
+        Run a command to completion.
+
+        Args:
+            argv (list): The full argument list of the command.
+            cwd (str): The working directory of the command.
+            timeout (float): Maximum number of seconds the command may run, None for no limit.
+
+        Returns:
+            tuple: The exit code, stdout and stderr of the command, the latter two as bytes.
+
+        Raises:
+            subprocess.TimeoutExpired: If the command runs longer than the timeout. The process is killed.
+        """
+        process = await asyncio.create_subprocess_exec(*argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await self.kill(process)
+            raise subprocess.TimeoutExpired(argv, timeout)
+        except BaseException:
+            await self.kill(process)
+            raise
+
+        return process.returncode, stdout, stderr
+
+    async def kill(self, process):
+        """
+        Kill a process if it is still running and wait for it to exit.
+
+        Args:
+            process (asyncio.subprocess.Process): The process to kill.
+        """
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
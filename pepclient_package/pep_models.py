@@ -0,0 +1,307 @@
+import json
+
+
+class ListCell:
+    """
+    The listing of a single column of a single participant.
+
+    Attributes:
+        participant (str): The participant identifier.
+        column (str): The column name.
+        fields (dict): The values listed for this cell by field, for example 'data' or 'metadata'.
+    """
+
+    def __init__(self, participant, column):
+        self.participant = participant
+        self.column = column
+        self.fields = {}
+
+    def __repr__(self):
+        return f"ListCell(participant={self.participant!r}, column={self.column!r}, fields={sorted(self.fields)!r})"
+
+
+# pepcli's list output has no file size, so estimates against a PEP server are file counts. A size is only used when
+# the metadata of a cell has this entry, as in the output of the simulated pepcli
+size_metadata_key = "size"
+
+
+def get_cell_size(cell):
+    """
+    Return the size in bytes of a listed cell from the 'size' entry of its metadata, or None when the size is unknown.
+
+    Args:
+        cell (ListCell): The listed cell.
+
+    Returns:
+        int: The size in bytes, or None.
+    """
+    metadata = cell.fields.get("metadata")
+    if not isinstance(metadata, dict):
+        return None
+
+    size = metadata.get(size_metadata_key)
+    if isinstance(size, int) and not isinstance(size, bool):
+        return size
+    if isinstance(size, str) and size.isdigit():
+        return int(size)
+
+    return None
+
+
+# `list --no-inline-data` lists a link to the stored data of a cell instead of the data itself. Storing new data in a
+# cell gives it a new link, so the link tells whether a cell changed since it was pulled
+change_marker_field = "links"
+
+
+def get_cell_marker(cell):
+    """
+    Return the change marker of a listed cell: its link to the stored data, or None when no link is listed.
+
+    Args:
+        cell (ListCell): The listed cell.
+
+    Returns:
+        str: The marker, the same as long as the data of the cell does not change, or None.
+    """
+    marker = cell.fields.get(change_marker_field)
+    if marker is None or marker == "":
+        return None
+
+    return marker if isinstance(marker, str) else json.dumps(marker, sort_keys=True)
+
+
+class ColumnSize:
+    """
+    The estimated download size of a column, as a number of files and, when the list output has sizes, bytes.
+
+    Attributes:
+        column (str): The column name.
+        files (int): The number of participants with a file in the column.
+        bytes (int): The total size of the files whose size is listed.
+        unknown (int): The number of files whose size is not listed.
+        error (str): The error message when the column could not be listed.
+    """
+
+    def __init__(self, column, files=0, bytes=0, unknown=0, error=""):
+        self.column = column
+        self.files = files
+        self.bytes = bytes
+        self.unknown = unknown
+        self.error = error
+
+    def to_dict(self):
+        return {"files": self.files, "bytes": self.bytes, "unknown": self.unknown}
+
+    @classmethod
+    def from_dict(cls, column, values):
+        return cls(column, values.get("files", 0), values.get("bytes", 0), values.get("unknown", 0))
+
+    def __repr__(self):
+        return f"ColumnSize(column={self.column!r}, files={self.files}, bytes={self.bytes}, unknown={self.unknown})"
+
+
+class ListResult:
+    """
+    The merged result of one or more `pepcli list` calls, indexed by (participant, column).
+
+    Every list entry is expected to be a JSON object with the participant identifiers in 'ids' and the
+    listed values per column in dictionary valued fields such as 'data', 'metadata' or 'links'.
+
+    Attributes:
+        cells (dict): The listed cells by (participant, column).
+        errors (list): Error messages of list calls that failed.
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.errors = []
+
+    @staticmethod
+    def _get_entry_participant(entry, participant_ids):
+        ids = entry.get("ids")
+        if isinstance(ids, dict) and ids:
+            values = [value for value in ids.values() if isinstance(value, str)]
+            for value in values:
+                if value in participant_ids:
+                    return value
+            if values:
+                return values[0]
+
+        participant = entry.get("participant") or entry.get("id")
+        return participant if isinstance(participant, str) else None
+
+    def add_entries(self, entries, participant_ids=()):
+        """
+        Merge the entries of a list call into the result.
+
+        Args:
+            entries (list): The parsed JSON output of `pepcli list`.
+            participant_ids (iterable): The participants that were requested, used to recognise the participant identifier.
+        """
+        participant_ids = set(participant_ids)
+
+        for entry in entries or []:
+            if not isinstance(entry, dict):
+                continue
+
+            participant = self._get_entry_participant(entry, participant_ids)
+            if participant is None:
+                continue
+
+            for field, values in entry.items():
+                if field == "ids" or not isinstance(values, dict):
+                    continue
+
+                for column, value in values.items():
+                    cell = self.cells.get((participant, column))
+                    if cell is None:
+                        cell = self.cells[(participant, column)] = ListCell(participant, column)
+                    cell.fields[field] = value
+
+    def get(self, participant, column):
+        return self.cells.get((participant, column))
+
+    def participants(self):
+        return sorted({participant for participant, _ in self.cells})
+
+    def columns(self):
+        return sorted({column for _, column in self.cells})
+
+    def by_column(self, column):
+        return [cell for (_, cell_column), cell in self.cells.items() if cell_column == column]
+
+    def get_column_sizes(self, columns=()):
+        """
+        Count the files and bytes per column.
+
+        Args:
+            columns (iterable): Columns to include even when nothing was listed for them.
+
+        Returns:
+            dict: The ColumnSize by column name.
+        """
+        sizes = {column: ColumnSize(column) for column in columns}
+
+        for cell in self.cells.values():
+            column_size = sizes.setdefault(cell.column, ColumnSize(cell.column))
+            column_size.files += 1
+            size = get_cell_size(cell)
+            if size is None:
+                column_size.unknown += 1
+            else:
+                column_size.bytes += size
+
+        return sizes
+
+    def __getitem__(self, key):
+        return self.cells[key]
+
+    def __contains__(self, key):
+        return key in self.cells
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.cells.values())
+
+
+class ColumnAccess:
+    """
+    The parsed output of `pepcli query column-access`.
+
+    The columns are listed below a 'Columns (...)' header, one per line, prefixed with the access modes,
+    for example 'r Questionnaire' or 'rw Visit'.
+
+    Attributes:
+        columns (dict): The access modes by column name, for example {'Questionnaire': 'r'}.
+    """
+
+    access_modes = ("r", "w", "rw", "wr")
+
+    def __init__(self, columns=None):
+        self.columns = dict(columns or {})
+
+    @classmethod
+    def parse(cls, output):
+        """
+        Parse the output of `pepcli query column-access`.
+
+        Args:
+            output (str): The raw output of the query.
+
+        Returns:
+            ColumnAccess: The parsed column access.
+        """
+        columns = {}
+        if not output or "Columns (" not in output:
+            return cls(columns)
+
+        # Skip the remainder of the header line
+        for line in output.split("Columns (")[-1].split("\n")[1:]:
+            parts = line.strip().split(None, 1)
+            if not parts:
+                continue
+
+            if len(parts) == 2 and parts[0] in cls.access_modes:
+                columns[parts[1].strip()] = parts[0]
+            else:
+                columns[" ".join(parts)] = ""
+
+        return cls(columns)
+
+    def column_names(self):
+        return list(self.columns)
+
+    def readable_columns(self):
+        return [column for column, mode in self.columns.items() if "r" in mode]
+
+    def writable_columns(self):
+        return [column for column, mode in self.columns.items() if "w" in mode]
+
+
+class ParticipantGroupAccess:
+    """
+    The parsed output of `pepcli query participant-group-access`.
+
+    The groups are listed below a 'Participant groups (...)' header, one per line, followed by the access modes,
+    for example '* (access: enumerate, read)'. The group '*' contains all participants.
+
+    Attributes:
+        groups (dict): The access modes by group name, for example {'*': ['enumerate', 'read']}.
+    """
+
+    def __init__(self, groups=None):
+        self.groups = dict(groups or {})
+
+    @classmethod
+    def parse(cls, output):
+        """
+        Parse the output of `pepcli query participant-group-access`.
+
+        Args:
+            output (str): The raw output of the query.
+
+        Returns:
+            ParticipantGroupAccess: The parsed participant group access.
+        """
+        groups = {}
+        if not output or "Participant groups (" not in output:
+            return cls(groups)
+
+        # Skip the remainder of the header line
+        for line in output.split("Participant groups (")[-1].split("\n")[1:]:
+            line = line.strip()
+            if not line:
+                continue
+
+            name, _, access = line.partition("(access:")
+            groups[name.strip()] = [mode.strip() for mode in access.rstrip(")").split(",") if mode.strip()]
+
+        return cls(groups)
+
+    def group_names(self):
+        return list(self.groups)
+
+    def readable_groups(self):
+        return [group for group, modes in self.groups.items() if not modes or "read" in modes]
@@ -0,0 +1,185 @@
+import re
+import threading
+import time
+
+from .pep_progress import parse_progress_line
+
+# pepcli's errors and warnings, which arrive on stderr merged into the output, are recognised by their text
+error_line_pattern = re.compile(r"error|fail|exception|denied|fatal|warning|abort", re.IGNORECASE)
+
+
+class PullOutputBatch:
+    """
+    The output lines of a pull that arrived since the previous batch.
+
+    Attributes:
+        lines (list): The (source, line, is_progress) tuples in order of arrival, with only the latest progress line per source.
+        dropped (int): Number of lines that were left out because the consumer fell behind.
+    """
+
+    def __init__(self, lines, dropped):
+        self.lines = lines
+        self.dropped = dropped
+
+    def progress_lines(self):
+        """
+        Return the latest progress line of every source in the batch.
+
+        Returns:
+            list: The (source, line) tuples.
+        """
+        return [(source, line) for source, line, is_progress in self.lines if is_progress]
+
+    def text(self, format_line=None):
+        """
+        Join the lines of the batch into one text, for a single insert into a text widget.
+
+        Args:
+            format_line (callable): Function formatting a (source, line) as text, the line itself when None.
+
+        Returns:
+            str: The lines, each ending with a newline.
+        """
+        format_line = format_line or (lambda source, line: line)
+        text = "".join(f"{format_line(source, line)}\n" for source, line, _ in self.lines)
+        if self.dropped:
+            text += f"({self.dropped} output lines not shown)\n"
+
+        return text
+
+
+class PullOutputReader:
+    """
+    Reads the output of a pull in a dedicated thread and hands it to a consumer in batches, so a pull that prints
+    thousands of progress lines neither waits for the consumer nor floods the UI.
+
+    The lines are buffered up to `max_lines`. A progress line replaces the buffered progress line of the same source,
+    as only the latest state matters. Other lines are dropped, and counted, when the buffer is full, except error
+    lines, which are always kept. The return value of the output, such as the exit code of a pull, is kept in `result`.
+
+    Args:
+        output (iterator): The output of the pull, lines or (source, line) tuples when `with_source` is set, for
+            example the generator of `PepClientBase.pep_pull` or `PepClientBase.pep_pull_sharded`.
+        with_source (bool): The output consists of (source, line) tuples, such as the shards of a sharded pull.
+        max_lines (int): Maximum number of buffered lines.
+    """
+
+    def __init__(self, output, with_source=False, max_lines=1000):
+        self.output = output
+        self.with_source = with_source
+        self.max_lines = max_lines
+
+        self.condition = threading.Condition()
+        self.lines = []
+        self.progress_positions = {}
+        self.dropped = 0
+        self.finished = False
+        self.closed = False
+        self.result = None
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        """
+        Start reading the output in a background thread.
+
+        Returns:
+            PullOutputReader: The reader itself.
+        """
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+        return self
+
+    def _read(self):
+        iterator = iter(self.output)
+        try:
+            while not self.closed:
+                try:
+                    item = next(iterator)
+                except StopIteration as stop:
+                    self.result = stop.value
+                    break
+
+                source, line = item if self.with_source else (None, item)
+                self._add(source, line, parse_progress_line(line).is_progress())
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.closed and hasattr(iterator, "close"):
+                iterator.close()
+
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def _add(self, source, line, is_progress):
+        with self.condition:
+            if is_progress and source in self.progress_positions:
+                self.lines[self.progress_positions[source]] = (source, line, True)
+                return
+
+            if len(self.lines) >= self.max_lines and not error_line_pattern.search(line):
+                self.dropped += 1
+                return
+
+            if is_progress:
+                self.progress_positions[source] = len(self.lines)
+            self.lines.append((source, line, is_progress))
+            self.condition.notify_all()
+
+    def get_batch(self, timeout=None):
+        """
+        Wait for output and return everything that arrived since the previous batch.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait, None to wait until there is output or the pull is finished.
+
+        Returns:
+            PullOutputBatch: The batch, None when there is no output within the timeout or the pull is finished.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.lines or self.finished, timeout)
+
+            if not self.lines and not self.dropped:
+                return None
+
+            batch = PullOutputBatch(self.lines, self.dropped)
+            self.lines, self.progress_positions, self.dropped = [], {}, 0
+
+        return batch
+
+    def batches(self, interval=0.1):
+        """
+        Yield the output in batches of at most one per `interval`, until the pull is finished.
+
+        Args:
+            interval (float): Minimum number of seconds between two batches, during which output is collected.
+
+        Yields:
+            PullOutputBatch: The batches.
+
+        Raises:
+            Exception: The error raised while reading the output, after the last batch.
+        """
+        if self.thread is None:
+            self.start()
+
+        try:
+            while True:
+                batch = self.get_batch()
+                if batch is None:
+                    break
+
+                yield batch
+                time.sleep(interval)
+        finally:
+            self.close()
+
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """
+        Stop reading the output. The reader thread closes the pull after its next output line.
+        """
+        self.closed = True
@@ -0,0 +1,315 @@
+import collections
+import json
+import os
+import re
+import time
+
+size_units = {"b": 1, "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+              "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4}
+
+# A --report-progress line starts with the file count, optionally after a word such as 'Downloaded': '12/340 files, ...'
+progress_line_pattern = re.compile(r"^(?:[a-z]+:?\s+)?(\d+)\s*(?:/|of)\s*(\d+)\s+files?\b(.*)$", re.IGNORECASE)
+size_pattern = re.compile(r"(\d+(?:\.\d+)?)\s*(TiB|GiB|MiB|KiB|TB|GB|MB|KB|B)\b(?:\s*(?:/|of)\s*(\d+(?:\.\d+)?)\s*(TiB|GiB|MiB|KiB|TB|GB|MB|KB|B)\b)?", re.IGNORECASE)
+percentage_pattern = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+participant_pattern = re.compile(r"participant[:\s]+([^\s,;]+)", re.IGNORECASE)
+column_pattern = re.compile(r"column[:\s]+([^\s,;]+)", re.IGNORECASE)
+
+
+def get_status_filepath(target_folder):
+    return f"{os.path.abspath(target_folder).rstrip(os.sep)}-status.json"
+
+
+class ProgressEvent:
+    """
+    A progress update parsed from a `pepcli pull --report-progress` output line.
+
+    Values that the line does not mention are None.
+
+    Attributes:
+        line (str): The original output line.
+        files_done (int): The number of files downloaded so far.
+        files_total (int): The total number of files to download.
+        bytes_done (int): The number of bytes downloaded so far.
+        bytes_total (int): The total number of bytes to download.
+        percentage (float): The progress in percent.
+        participant (str): The participant that is being downloaded.
+        column (str): The column that is being downloaded.
+    """
+
+    def __init__(self, line, files_done=None, files_total=None, bytes_done=None, bytes_total=None, percentage=None, participant=None, column=None):
+        self.line = line
+        self.files_done = files_done
+        self.files_total = files_total
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.percentage = percentage
+        self.participant = participant
+        self.column = column
+
+    def is_progress(self):
+        return self.files_done is not None or self.bytes_done is not None or self.percentage is not None
+
+    def __repr__(self):
+        return (f"ProgressEvent(files={self.files_done}/{self.files_total}, bytes={self.bytes_done}/{self.bytes_total}, "
+                f"percentage={self.percentage}, participant={self.participant!r}, column={self.column!r})")
+
+
+def parse_size(value, unit):
+    return int(float(value) * size_units[unit.lower()])
+
+
+def _parse_json_progress(line):
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    if isinstance(data.get("progress"), dict):
+        data = dict(data, **data["progress"])
+
+    def get_value(*keys):
+        for key in keys:
+            if data.get(key) is not None:
+                return data[key]
+        return None
+
+    return ProgressEvent(line,
+                         files_done=get_value("done", "completed", "files_done", "current"),
+                         files_total=get_value("total", "files_total"),
+                         bytes_done=get_value("bytes", "bytes_done"),
+                         bytes_total=get_value("total_bytes", "bytes_total"),
+                         percentage=get_value("percentage", "percent"),
+                         participant=get_value("participant"),
+                         column=get_value("column"))
+
+
+def parse_progress_line(line):
+    """
+    Parse a line of `pepcli pull --report-progress` output into a progress event.
+
+    Both JSON progress objects and lines in the --report-progress format are recognised. Those lines start with the
+    file count, optionally after a word, and may be followed by the size, percentage, participant and column, for
+    example 'Downloaded 12/340 files, 1.2 GiB, 3%, participant HBU1234567, column Visit1'. Other output, such as log
+    and error lines that happen to contain numbers, results in an event for which `is_progress` is False.
+
+    Args:
+        line (str): The output line.
+
+    Returns:
+        ProgressEvent: The parsed event.
+    """
+    line = line.strip()
+    if line.startswith("{"):
+        event = _parse_json_progress(line)
+        if event is not None:
+            return event
+
+    event = ProgressEvent(line)
+
+    progress_match = progress_line_pattern.match(line)
+    if not progress_match:
+        return event
+
+    event.files_done, event.files_total = int(progress_match.group(1)), int(progress_match.group(2))
+    line = progress_match.group(3)
+
+    size_match = size_pattern.search(line)
+    if size_match:
+        event.bytes_done = parse_size(size_match.group(1), size_match.group(2))
+        if size_match.group(3):
+            event.bytes_total = parse_size(size_match.group(3), size_match.group(4))
+        line = line[:size_match.start()] + line[size_match.end():]
+
+    percentage_match = percentage_pattern.search(line)
+    if percentage_match:
+        event.percentage = float(percentage_match.group(1))
+
+    participant_match = participant_pattern.search(line)
+    if participant_match:
+        event.participant = participant_match.group(1)
+
+    column_match = column_pattern.search(line)
+    if column_match:
+        event.column = column_match.group(1)
+
+    return event
+
+
+class ProgressEstimator:
+    """
+    Estimates the progress, throughput and remaining time of one or more concurrent pulls from their progress events.
+
+    The throughput is averaged over the last `window` seconds, so it follows changes in download speed.
+    Events of concurrent pulls, such as the shards of a sharded pull, are told apart by their source.
+    """
+
+    def __init__(self, window=30):
+        self.window = window
+        self.started = time.monotonic()
+        self.progress = {}
+        self.percentage_sources = set()
+        self.samples = collections.deque()
+        self.participant = None
+        self.column = None
+
+    def update(self, event, source=None, now=None):
+        """
+        Add a progress event.
+
+        Args:
+            event (ProgressEvent): The parsed event.
+            source (hashable): The pull the event belongs to, for concurrent pulls.
+            now (float): The time of the event, as returned by time.monotonic.
+        """
+        if not event.is_progress():
+            return
+
+        now = time.monotonic() if now is None else now
+        progress = self.progress.setdefault(source, {"files_done": 0, "files_total": 0, "bytes_done": 0, "bytes_total": 0})
+        for key in progress:
+            value = getattr(event, key)
+            if value is not None:
+                progress[key] = value
+
+        if event.percentage is not None and event.files_done is None:
+            if source in self.percentage_sources or progress["files_total"] == 0:
+                # Only a percentage is known, count it as 100 files so the ETA can still be estimated
+                self.percentage_sources.add(source)
+                progress["files_done"], progress["files_total"] = event.percentage, 100
+
+        self.participant = event.participant or self.participant
+        self.column = event.column or self.column
+
+        self.samples.append((now, self.get_total("files_done"), self.get_total("bytes_done")))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def get_total(self, key):
+        return sum(progress[key] for progress in self.progress.values())
+
+    def get_fraction(self):
+        """
+        Return the fraction of the files that is downloaded, or None when the total is not known.
+        """
+        files_total = self.get_total("files_total")
+        if files_total:
+            return min(1.0, self.get_total("files_done") / files_total)
+
+        bytes_total = self.get_total("bytes_total")
+        if bytes_total:
+            return min(1.0, self.get_total("bytes_done") / bytes_total)
+
+        return None
+
+    def get_throughput(self):
+        """
+        Return the number of files and bytes downloaded per second over the rolling window.
+
+        Returns:
+            tuple: Files per second and bytes per second, None when there are not enough events yet.
+        """
+        if len(self.samples) < 2:
+            return None, None
+
+        first_time, first_files, first_bytes = self.samples[0]
+        last_time, last_files, last_bytes = self.samples[-1]
+        elapsed = last_time - first_time
+        if elapsed <= 0:
+            return None, None
+
+        return (last_files - first_files) / elapsed, (last_bytes - first_bytes) / elapsed
+
+    def get_eta(self):
+        """
+        Return the estimated number of seconds until the download is finished, or None when it cannot be estimated.
+        """
+        files_per_second, bytes_per_second = self.get_throughput()
+
+        remaining_files = self.get_total("files_total") - self.get_total("files_done")
+        if files_per_second and remaining_files >= 0 and self.get_total("files_total"):
+            return remaining_files / files_per_second
+
+        remaining_bytes = self.get_total("bytes_total") - self.get_total("bytes_done")
+        if bytes_per_second and remaining_bytes >= 0 and self.get_total("bytes_total"):
+            return remaining_bytes / bytes_per_second
+
+        return None
+
+    def get_status(self):
+        """
+        Return the current progress as a dictionary, as written to the status file.
+        """
+        files_per_second, bytes_per_second = self.get_throughput()
+        fraction = self.get_fraction()
+        eta = self.get_eta()
+
+        return {
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "elapsed_seconds": round(time.monotonic() - self.started, 1),
+            "files_done": self.get_total("files_done"),
+            "files_total": self.get_total("files_total"),
+            "bytes_done": self.get_total("bytes_done"),
+            "bytes_total": self.get_total("bytes_total"),
+            "percentage": None if fraction is None else round(fraction * 100, 1),
+            "files_per_second": None if files_per_second is None else round(files_per_second, 3),
+            "bytes_per_second": None if bytes_per_second is None else round(bytes_per_second),
+            "eta_seconds": None if eta is None else round(eta),
+            "participant": self.participant,
+            "column": self.column,
+        }
+
+    def get_summary_text(self):
+        """
+        Return a one line summary of the progress, for example '12/340 files (3.5%), 1.2 MB/s, 00:12:30 remaining'.
+        """
+        status = self.get_status()
+        parts = []
+
+        if status["files_total"]:
+            parts.append(f"{status['files_done']:g}/{status['files_total']:g} files ({status['percentage']}%)")
+        elif status["percentage"] is not None:
+            parts.append(f"{status['percentage']}%")
+
+        if status["bytes_per_second"]:
+            parts.append(f"{format_size(status['bytes_per_second'])}/s")
+        elif status["files_per_second"]:
+            parts.append(f"{status['files_per_second']:.2f} files/s")
+
+        if status["eta_seconds"] is not None:
+            parts.append(f"{format_duration(status['eta_seconds'])} remaining")
+
+        return ", ".join(parts)
+
+    def write_status_file(self, status_filepath, **extra):
+        """
+        Write the current progress to a JSON status file, replacing it atomically.
+
+        Args:
+            status_filepath (str): Path to the status file.
+            **extra: Additional values to write, for example the state of the download.
+        """
+        status = dict(self.get_status(), **extra)
+        temporary_filepath = f"{status_filepath}.tmp"
+
+        with open(temporary_filepath, "w", encoding="utf-8") as status_file:
+            json.dump(status, status_file, indent=4)
+
+        os.replace(temporary_filepath, status_filepath)
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1000:
+            return f"{size:.1f} {unit}"
+        size /= 1000
+
+    return f"{size:.1f} TB"
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,296 @@
+import json
+import os
+import shutil
+import threading
+
+# The manifest the unzip tool keeps in every participant folder, with an entry per extracted '.zip' archive
+extraction_manifest_filename = '.extraction_manifest.json'
+
+# Shards are merged concurrently, while their '.pepData' files are merged into the same files of the target folder
+metadata_lock = threading.Lock()
+
+
+class PullShard:
+    """
+    A part of a sharded pull, pulling a subset of the columns into its own staging folder.
+
+    Attributes:
+        index (int): The number of the shard.
+        columns (list): The columns pulled by this shard.
+        staging_folder (str): The folder this shard pulls into before it is merged.
+        status (str): One of 'pending', 'running', 'retrying', 'done' or 'failed'.
+        attempts (int): The number of times the pull of this shard was started.
+        exit_code (int): The exit code of the last pull of this shard.
+        last_line (str): The last output line of this shard.
+        participants (list): The participants pulled by this shard instead of the participant groups, None for all of them.
+    """
+
+    def __init__(self, index, columns, staging_folder, participants=None):
+        self.index = index
+        self.columns = columns
+        self.participants = participants
+        self.staging_folder = staging_folder
+        self.status = "pending"
+        self.attempts = 0
+        self.exit_code = None
+        self.last_line = ""
+
+    def __repr__(self):
+        return f"PullShard(index={self.index}, status={self.status!r}, columns={len(self.columns)})"
+
+
+def has_pull_metadata(target_folder):
+    """
+    Check whether pepcli pulled into a folder before, so a pull into it can be resumed.
+
+    Args:
+        target_folder (str): The 'pulled-data' folder.
+
+    Returns:
+        bool: True when the folder has pepcli's '.pepData' metadata folder, or an interrupted pull left a '-pending' folder.
+    """
+    return os.path.isdir(os.path.join(target_folder, ".pepData")) or os.path.isdir(f"{os.path.abspath(target_folder).rstrip(os.sep)}-pending")
+
+
+def get_shards_folder(target_folder):
+    return f"{os.path.abspath(target_folder).rstrip(os.sep)}-shards"
+
+
+def plan_pull_shards(columns, shard_count, target_folder):
+    """
+    Divide the columns over a number of shards, each with its own staging folder next to the target folder.
+
+    Args:
+        columns (list): The columns to pull, in order of preference.
+        shard_count (int): The maximum number of shards.
+        target_folder (str): The 'pulled-data' folder the shards are merged into.
+
+    Returns:
+        list: The PullShard objects, without empty shards.
+    """
+    shard_count = max(1, min(shard_count, len(columns)))
+    shards_folder = get_shards_folder(target_folder)
+
+    shard_columns = [columns[index::shard_count] for index in range(shard_count)]
+
+    return [PullShard(index, columns_of_shard, os.path.join(shards_folder, f"shard-{index}"))
+            for index, columns_of_shard in enumerate(shard_columns) if columns_of_shard]
+
+
+def has_byte_sizes(columns, size_estimates):
+    """
+    Check whether the estimates of the columns have a byte size for every file. pepcli's list output has no
+    sizes, so against a PEP server the columns are compared by their number of files instead.
+    """
+    estimates = [size_estimates[column] for column in columns if column in size_estimates and not size_estimates[column].error]
+    return bool(estimates) and all(estimate.unknown == 0 for estimate in estimates)
+
+
+def get_column_size(column, size_estimates, by_bytes):
+    estimate = size_estimates.get(column)
+    if estimate is None or estimate.error:
+        return None
+
+    return estimate.bytes if by_bytes else estimate.files
+
+
+def schedule_columns(columns, size_estimates=None, priorities=None):
+    """
+    Order columns for downloading: higher priority first, and within a priority the smallest estimated size first.
+
+    The size is the number of bytes when the estimates have the size of every file, and the number of files otherwise.
+    Columns without an estimate come last within their priority, keeping their original order.
+
+    Args:
+        columns (list): The columns to order.
+        size_estimates (dict): The ColumnSize by column name, see PepClientBase.estimate_column_sizes.
+        priorities (dict): The priority by column name, higher is earlier, 0 by default.
+
+    Returns:
+        list: The ordered columns.
+    """
+    size_estimates = size_estimates or {}
+    priorities = priorities or {}
+    by_bytes = has_byte_sizes(columns, size_estimates)
+
+    def get_schedule_key(column):
+        size = get_column_size(column, size_estimates, by_bytes)
+        return -priorities.get(column, 0), float("inf") if size is None else size
+
+    return sorted(columns, key=get_schedule_key)
+
+
+def plan_scheduled_pull(columns, target_folder, size_estimates=None, priorities=None, batch_bytes=5 * 1000 ** 3, batch_files=5000, max_columns_per_batch=20):
+    """
+    Divide the columns over batches that are pulled in order, so quick and important columns are downloaded first.
+
+    The columns are ordered with `schedule_columns` and grouped into batches of at most `batch_bytes` estimated bytes,
+    or `batch_files` estimated files when the estimates have no byte sizes. A column that is larger than a batch, or
+    has no estimate, is pulled on its own, and columns of a different priority are never combined.
+    Pull the batches with PepClientBase.pep_pull_sharded, where `max_concurrent` sets how many batches run at the same time.
+
+    Args:
+        columns (list): The columns to pull.
+        target_folder (str): The 'pulled-data' folder the batches are merged into.
+        size_estimates (dict): The ColumnSize by column name.
+        priorities (dict): The priority by column name, higher is earlier.
+        batch_bytes (int): The estimated number of bytes per batch.
+        batch_files (int): The estimated number of files per batch, when the estimates have no byte sizes.
+        max_columns_per_batch (int): The maximum number of columns per batch.
+
+    Returns:
+        list: The PullShard objects in download order.
+    """
+    size_estimates = size_estimates or {}
+    priorities = priorities or {}
+    shards_folder = get_shards_folder(target_folder)
+    by_bytes = has_byte_sizes(columns, size_estimates)
+    batch_limit = batch_bytes if by_bytes else batch_files
+
+    batches = []
+    batch, batch_size, batch_priority = [], 0, None
+    for column in schedule_columns(columns, size_estimates, priorities):
+        size = get_column_size(column, size_estimates, by_bytes)
+        size = batch_limit if size is None else size
+        priority = priorities.get(column, 0)
+
+        if batch and (batch_size + size > batch_limit or len(batch) >= max_columns_per_batch or priority != batch_priority):
+            batches.append(batch)
+            batch, batch_size = [], 0
+
+        batch.append(column)
+        batch_size += size
+        batch_priority = priority
+
+    if batch:
+        batches.append(batch)
+
+    return [PullShard(index, batch_columns, os.path.join(shards_folder, f"shard-{index}")) for index, batch_columns in enumerate(batches)]
+
+
+def remove_extracted_column(column_path):
+    """
+    Remove what the unzip tool made of a downloaded column, so a newly pulled archive can take its place.
+
+    This is the folder the archive was extracted to, the archive renamed to '.zip' and its entry in the
+    extraction manifest of the participant folder. The new archive is then extracted again by the next unzip.
+
+    Args:
+        column_path (str): The path of the column archive in the participant folder.
+    """
+    if os.path.isdir(column_path):
+        shutil.rmtree(column_path)
+
+    archive_path = f"{column_path}.zip"
+    if os.path.isfile(archive_path):
+        os.remove(archive_path)
+
+    participant_folder, column = os.path.split(column_path)
+    manifest_path = os.path.join(participant_folder, extraction_manifest_filename)
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return
+
+    if manifest.get("archives", {}).pop(f"{column}.zip", None) is not None:
+        with open(f"{manifest_path}.tmp", 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def merge_json(existing, pulled):
+    """
+    Merge the JSON metadata of a pull into the metadata of an earlier pull: objects are merged key by key,
+    lists are combined without duplicates and other values are taken from the newer pull.
+    """
+    if isinstance(existing, dict) and isinstance(pulled, dict):
+        merged = dict(existing)
+        for key, value in pulled.items():
+            merged[key] = merge_json(existing[key], value) if key in existing else value
+        return merged
+
+    if isinstance(existing, list) and isinstance(pulled, list):
+        seen = {json.dumps(value, sort_keys=True) for value in existing}
+        merged = list(existing)
+        for value in pulled:
+            key = json.dumps(value, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                merged.append(value)
+        return merged
+
+    return pulled
+
+
+def merge_metadata_file(source_path, destination_path):
+    """
+    Merge a file of pepcli's '.pepData' metadata folder into the target folder, so the metadata describes the
+    files of every shard. JSON files are merged with `merge_json`, other files are replaced by the newer one.
+
+    Args:
+        source_path (str): The metadata file in the staging folder.
+        destination_path (str): The metadata file in the target folder.
+    """
+    with metadata_lock:
+        if os.path.exists(destination_path):
+            try:
+                with open(destination_path, 'r') as existing_file, open(source_path, 'r') as pulled_file:
+                    merged = merge_json(json.load(existing_file), json.load(pulled_file))
+            except (OSError, ValueError):
+                merged = None
+
+            if merged is not None:
+                with open(source_path, 'w') as merged_file:
+                    json.dump(merged, merged_file)
+
+        os.replace(source_path, destination_path)
+
+
+def merge_pull_folder(staging_folder, target_folder):
+    """
+    Move the pulled files of a shard into the target folder.
+
+    Data files replace existing files, and columns that were already extracted by the unzip tool are removed
+    first. Files of pepcli's '.pepData' metadata folder are merged with the metadata of earlier pulls.
+
+    Args:
+        staging_folder (str): The folder the shard pulled into.
+        target_folder (str): The 'pulled-data' folder to merge into.
+    """
+    for root, _, files in os.walk(staging_folder):
+        relative_root = os.path.relpath(root, staging_folder)
+        is_metadata = relative_root.split(os.sep)[0] == ".pepData"
+        destination_root = os.path.normpath(os.path.join(target_folder, relative_root))
+        os.makedirs(destination_root, exist_ok=True)
+
+        for file in files:
+            destination_path = os.path.join(destination_root, file)
+            if is_metadata:
+                merge_metadata_file(os.path.join(root, file), destination_path)
+                continue
+
+            remove_extracted_column(destination_path)
+            os.replace(os.path.join(root, file), destination_path)
+
+    # Remove the folders that are empty after moving the files
+    for root, _, _ in sorted(os.walk(staging_folder), key=lambda walk_entry: len(walk_entry[0]), reverse=True):
+        try:
+            os.rmdir(root)
+        except OSError:
+            pass
+
+
+def remove_shards_folder(target_folder):
+    """
+    Remove the staging folders of a sharded pull when nothing but empty folders is left in them.
+
+    Args:
+        target_folder (str): The 'pulled-data' folder the shards were merged into.
+    """
+    shards_folder = get_shards_folder(target_folder)
+    if not os.path.isdir(shards_folder):
+        return
+
+    if not any(files for _, _, files in os.walk(shards_folder)):
+        shutil.rmtree(shards_folder, ignore_errors=True)
@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+
+from .pep_executor import get_command_name
+from .pep_progress import format_duration, format_size, parse_progress_line
+
+
+def get_metrics_filepath(target_folder):
+    return f"{os.path.abspath(target_folder).rstrip(os.sep)}-metrics.jsonl"
+
+
+def get_report_filepath(target_folder):
+    return f"{os.path.abspath(target_folder).rstrip(os.sep)}-report.json"
+
+
+def get_percentile(values, percentile):
+    """
+    Return a percentile of a list of values, interpolating between the nearest values.
+
+    Args:
+        values (list): The values.
+        percentile (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, or None for an empty list.
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    position = (len(values) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class PullTelemetry:
+    """
+    Records the timing of a pull in a JSON-lines metrics file, to tell apart slow container start-up, server, network and disk.
+
+    Every record has an 'event' and a 'time' (Unix timestamp). The events are:
+    - 'process_start' and 'process_exit': the pepcli process, with the subcommand and the exit code.
+    - 'first_output': the first output line of a process, after container start-up and authentication.
+    - 'item': the download of one participant/column, as reported by --report-progress, with the duration,
+      the number of files and bytes, and the participant and column.
+    - 'inventory': the files and bytes per participant/column on disk after the pull.
+
+    Concurrent pulls, such as the shards of a sharded pull, are told apart by their source.
+    """
+
+    def __init__(self, metrics_filepath):
+        self.metrics_filepath = metrics_filepath
+        self.lock = threading.Lock()
+        self.items = []
+        self.processes = []
+        self.inventory = []
+        self.current = {}
+
+    def _write(self, record):
+        record = dict(record, time=round(time.time(), 3))
+        with self.lock:
+            with open(self.metrics_filepath, "a", encoding="utf-8") as metrics_file:
+                metrics_file.write(json.dumps(record) + "\n")
+
+    def process_started(self, command, source=None):
+        """
+        Record the start of a pepcli process.
+
+        Args:
+            command (list): The PEP CLI arguments of the process.
+            source (hashable): The pull the process belongs to, for concurrent pulls.
+        """
+        process = {"source": source, "command": get_command_name(command), "started": time.monotonic(), "first_output": None, "exit_code": None, "duration": None}
+        self.processes.append(process)
+        self.current[source] = {"process": process, "item": None, "files_done": 0, "bytes_done": 0}
+        self._write({"event": "process_start", "source": source, "command": process["command"], "arguments": list(command)})
+
+    def observe_line(self, output_line, source=None):
+        """
+        Record an output line of a pepcli process, closing the current item when the pull moves to another participant or column.
+
+        Args:
+            output_line (str): The output line.
+            source (hashable): The pull the line belongs to, for concurrent pulls.
+        """
+        state = self.current.get(source)
+        if state is None:
+            return
+
+        now = time.monotonic()
+        process = state["process"]
+        if process["first_output"] is None:
+            process["first_output"] = now - process["started"]
+            self._write({"event": "first_output", "source": source, "seconds": round(process["first_output"], 3)})
+
+        event = parse_progress_line(output_line)
+        if not event.is_progress():
+            return
+
+        item = state["item"]
+        participant = event.participant or (item and item["participant"])
+        column = event.column or (item and item["column"])
+
+        if item is None or (item["participant"], item["column"]) != (participant, column):
+            if item is not None:
+                self._finish_item(item, now, source)
+
+            # The counts reported before this line belong to the previous items
+            item = state["item"] = {"participant": participant, "column": column, "started": now,
+                                    "files_start": state["files_done"], "bytes_start": state["bytes_done"]}
+
+        if event.files_done is not None:
+            state["files_done"] = event.files_done
+        if event.bytes_done is not None:
+            state["bytes_done"] = event.bytes_done
+        item["files_done"], item["bytes_done"] = state["files_done"], state["bytes_done"]
+
+    def _finish_item(self, item, now, source):
+        record = {"event": "item", "source": source, "participant": item["participant"], "column": item["column"],
+                  "duration": round(now - item["started"], 3),
+                  "files": max(0, item["files_done"] - item["files_start"]),
+                  "bytes": max(0, item["bytes_done"] - item["bytes_start"])}
+        self.items.append(record)
+        self._write(record)
+
+    def process_exited(self, exit_code, source=None):
+        """
+        Record the exit of a pepcli process and close its current item.
+
+        Args:
+            exit_code (int): The exit code, None when the process was killed.
+            source (hashable): The pull the process belongs to, for concurrent pulls.
+        """
+        state = self.current.pop(source, None)
+        if state is None:
+            return
+
+        now = time.monotonic()
+        if state["item"] is not None:
+            self._finish_item(state["item"], now, source)
+
+        process = state["process"]
+        process["exit_code"] = exit_code
+        process["duration"] = now - process["started"]
+        self._write({"event": "process_exit", "source": source, "exit_code": exit_code, "duration": round(process["duration"], 3)})
+
+    def record_inventory(self, target_folder):
+        """
+        Record the number of files and bytes per participant and column in the pulled data folder.
+
+        Args:
+            target_folder (str): The 'pulled-data' folder.
+        """
+        if not os.path.isdir(target_folder):
+            return
+
+        for participant_entry in os.scandir(target_folder):
+            if not participant_entry.is_dir() or participant_entry.name.startswith("."):
+                continue
+
+            for column_entry in os.scandir(participant_entry.path):
+                files, size = 0, 0
+                if column_entry.is_dir():
+                    for root, _, filenames in os.walk(column_entry.path):
+                        for filename in filenames:
+                            files += 1
+                            size += os.path.getsize(os.path.join(root, filename))
+                else:
+                    files, size = 1, column_entry.stat().st_size
+
+                column = column_entry.name.rsplit(".", 1)[0] if column_entry.name.endswith(".zip") else column_entry.name
+                record = {"event": "inventory", "participant": participant_entry.name, "column": column, "files": files, "bytes": size}
+                self.inventory.append(record)
+                self._write(record)
+
+    def get_summary(self, slowest=5):
+        """
+        Summarise the pull: process start-up and running times, throughput percentiles and the slowest columns.
+
+        Args:
+            slowest (int): Number of slowest columns to report.
+
+        Returns:
+            dict: The summary report.
+        """
+        throughputs = [item["bytes"] / item["duration"] for item in self.items if item["duration"] > 0 and item["bytes"]]
+        item_durations = [item["duration"] for item in self.items]
+
+        column_durations = {}
+        for item in self.items:
+            if item["column"]:
+                column_durations[item["column"]] = column_durations.get(item["column"], 0) + item["duration"]
+
+        column_sizes = {}
+        for record in self.inventory:
+            column_size = column_sizes.setdefault(record["column"], {"files": 0, "bytes": 0})
+            column_size["files"] += record["files"]
+            column_size["bytes"] += record["bytes"]
+
+        startup_times = [process["first_output"] for process in self.processes if process["first_output"] is not None]
+
+        return {
+            "processes": len(self.processes),
+            "failed_processes": sum(1 for process in self.processes if process["exit_code"] not in (0, None)),
+            "total_process_seconds": round(sum(process["duration"] or 0 for process in self.processes), 3),
+            "first_output_seconds": {"p50": get_percentile(startup_times, 50), "max": max(startup_times, default=None)},
+            "items": len(self.items),
+            "item_seconds": {"p50": get_percentile(item_durations, 50), "p90": get_percentile(item_durations, 90), "max": max(item_durations, default=None)},
+            "bytes_per_second": {"p10": get_percentile(throughputs, 10), "p50": get_percentile(throughputs, 50), "p90": get_percentile(throughputs, 90)},
+            "slowest_columns": [{"column": column, "seconds": round(seconds, 3)}
+                                for column, seconds in sorted(column_durations.items(), key=lambda entry: entry[1], reverse=True)[:slowest]],
+            "files": sum(record["files"] for record in self.inventory),
+            "bytes": sum(record["bytes"] for record in self.inventory),
+            "columns": column_sizes,
+        }
+
+    def write_report(self, report_filepath):
+        """
+        Write the summary report to a JSON file.
+
+        Args:
+            report_filepath (str): Path to the report file.
+
+        Returns:
+            dict: The summary report.
+        """
+        summary = self.get_summary()
+        with open(report_filepath, "w", encoding="utf-8") as report_file:
+            json.dump(summary, report_file, indent=4)
+
+        return summary
+
+
+def format_summary(summary):
+    """
+    Format a summary report as readable lines for the download log.
+
+    Args:
+        summary (dict): The summary report, see PullTelemetry.get_summary.
+
+    Returns:
+        list: The lines of the report.
+    """
+    lines = [f"Downloaded {summary['files']} files ({format_size(summary['bytes'])}) with {summary['processes']} pepcli processes "
+             f"({summary['failed_processes']} failed) in {format_duration(summary['total_process_seconds'])}."]
+
+    if summary["first_output_seconds"]["p50"] is not None:
+        lines.append(f"Start-up until first output: median {summary['first_output_seconds']['p50']:.1f}s, max {summary['first_output_seconds']['max']:.1f}s.")
+
+    throughput = summary["bytes_per_second"]
+    if throughput["p50"] is not None:
+        lines.append(f"Throughput per item: p10 {format_size(throughput['p10'])}/s, p50 {format_size(throughput['p50'])}/s, p90 {format_size(throughput['p90'])}/s.")
+
+    if summary["slowest_columns"]:
+        lines.append("Slowest columns: " + ", ".join(f"{entry['column']} ({format_duration(entry['seconds'])})" for entry in summary["slowest_columns"]))
+
+    return lines
@@ -0,0 +1,100 @@
+import atexit
+import threading
+
+from .pep_client_docker import PepClientDocker
+from .pep_client_fake import PepClientFake
+from .pep_client_singularity import PepClientSingularity
+from .pep_client_windows import PepClientWindows
+
+engine_client_classes = {
+    "docker": PepClientDocker,
+    "singularity": PepClientSingularity,
+    "windows": PepClientWindows,
+    "fake": PepClientFake,
+}
+
+
+class EngineWarmup:
+    """
+    Prepares PEP engines in the background, so the first command after start-up does not pay for pulling the Docker
+    image or loading the Singularity image from shared storage. Every engine is warmed up once, and what the
+    warm-up left on disk is removed when the application exits.
+
+    Args:
+        timeout (float): Maximum number of seconds a warm-up may take, None for no limit.
+    """
+
+    def __init__(self, timeout=15 * 60):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.results = {}
+        atexit.register(self.close)
+
+    def start(self, engine, production=True):
+        """
+        Start warming up an engine in a background thread, unless it was already started.
+
+        Args:
+            engine (str): The engine ('docker', 'singularity', 'windows' or 'fake').
+            production (bool): Flag to indicate if the production environment should be used.
+        """
+        key = (engine, production)
+
+        with self.lock:
+            if key in self.threads or engine not in engine_client_classes:
+                return
+
+            thread = threading.Thread(target=self._warm_up, args=(key,), daemon=True)
+            self.threads[key] = thread
+
+        thread.start()
+
+    def _warm_up(self, key):
+        engine, production = key
+
+        try:
+            result = engine_client_classes[engine].warm_up(production=production, timeout=self.timeout)
+        except Exception as e:
+            result = {"error": str(e)}
+
+        with self.lock:
+            self.results[key] = result
+
+    def wait(self, engine, production=True, timeout=None):
+        """
+        Wait until the warm-up of an engine is done, if it was started.
+
+        Args:
+            engine (str): The engine.
+            production (bool): Flag to indicate if the production environment should be used.
+            timeout (float): Maximum number of seconds to wait, None to wait until it is done.
+
+        Returns:
+            dict: The result of the warm-up, with an 'error' when it failed, or None when it was not started or is not done.
+        """
+        with self.lock:
+            thread = self.threads.get((engine, production))
+
+        if thread is not None:
+            thread.join(timeout)
+
+        with self.lock:
+            return self.results.get((engine, production))
+
+    def close(self):
+        """
+        Stop the running warm-ups and remove what they left on disk, such as staged Singularity images.
+        """
+        with self.lock:
+            threads = dict(self.threads)
+
+        for engine in {engine for engine, _ in threads}:
+            engine_client_classes[engine].clean_up_warm_up()
+
+        # Give a stopped copy the chance to remove its partial file
+        for thread in threads.values():
+            thread.join(5)
+
+
+default_engine_warmup = EngineWarmup()
@@ -0,0 +1,182 @@
+import os
+import shutil
+import threading
+import uuid
+
+
+def copy_file_atomically(source_path, destination_path):
+    """
+    Copy a file with its modification time, replacing the destination in one step so readers never see a partial file.
+
+    Args:
+        source_path (str): The file to copy.
+        destination_path (str): The path to copy the file to.
+    """
+    temporary_path = f"{destination_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        shutil.copy2(source_path, temporary_path)
+        os.replace(temporary_path, destination_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def get_file_stats(directory):
+    """
+    Return the size and modification time of the files directly inside a directory.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        dict: The (size, mtime_ns) by file name.
+    """
+    stats = {}
+    for entry in os.scandir(directory):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+    return stats
+
+
+def empty_directory(directory):
+    """
+    Remove the contents of a directory, keeping the directory itself.
+
+    Args:
+        directory (str): The directory to empty.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+class WorkingDirectoryPool:
+    """
+    A pool of working directories, each leased to one command at a time, so commands can run concurrently.
+
+    `size` directories are created up front inside `base_directory`, and more are created when all are in use.
+    Released directories are reused. With `clean` set, whatever a command left behind is only removed when the
+    directory is leased again, by the new lessee, so a directory is never emptied while a command uses it.
+    """
+
+    def __init__(self, base_directory, size=0, clean=True):
+        self.base_directory = base_directory
+        self.clean = clean
+        self.lock = threading.Lock()
+        self.free_directories = []
+        self.directory_count = 0
+
+        for _ in range(size):
+            self.free_directories.append(self._create_directory())
+
+    def _create_directory(self):
+        self.directory_count += 1
+        directory = os.path.join(self.base_directory, f"worker-{self.directory_count}")
+        os.makedirs(directory, exist_ok=True)
+
+        return directory
+
+    def lease(self):
+        """
+        Lease a working directory, creating a new one when all directories are in use.
+
+        Returns:
+            str: The path of the working directory.
+        """
+        with self.lock:
+            if not self.free_directories:
+                return self._create_directory()
+
+            directory = self.free_directories.pop()
+
+        if self.clean:
+            if os.path.isdir(directory):
+                empty_directory(directory)
+            else:
+                os.makedirs(directory, exist_ok=True)
+
+        return directory
+
+    def release(self, directory):
+        """
+        Return a leased working directory to the pool.
+
+        Args:
+            directory (str): The path of the working directory.
+        """
+        with self.lock:
+            self.free_directories.append(directory)
+
+    def close(self):
+        """
+        Remove the pool and all its directories. Directories leased afterwards are created again.
+        """
+        with self.lock:
+            self.free_directories = []
+        shutil.rmtree(self.base_directory, ignore_errors=True)
+
+
+class LogonWorkingDirectories:
+    """
+    Per-command working directories that share the credentials written by pepLogon.
+
+    The credentials live in the files of the logon directory. They are copied into a worker directory when a command
+    leases it, and credentials that pepcli refreshed during the command are copied back when it is released, so
+    commands no longer have to take turns in the logon directory. Only the files pepLogon wrote to the logon directory
+    are copied back, other files that pepcli leaves in a worker directory stay there.
+    """
+
+    def __init__(self, logon_directory):
+        self.logon_directory = logon_directory
+        self.pool = WorkingDirectoryPool(os.path.join(logon_directory, ".workers"), clean=False)
+        self.credentials_lock = threading.Lock()
+
+    def lease(self):
+        """
+        Lease a worker directory with up-to-date credentials.
+
+        Returns:
+            str: The path of the worker directory.
+        """
+        directory = self.pool.lease()
+
+        with self.credentials_lock:
+            credential_stats = get_file_stats(self.logon_directory)
+            worker_stats = get_file_stats(directory)
+
+            for name, stat in credential_stats.items():
+                if worker_stats.get(name) != stat:
+                    copy_file_atomically(os.path.join(self.logon_directory, name), os.path.join(directory, name))
+
+        return directory
+
+    def release(self, directory):
+        """
+        Copy credentials that were refreshed during the command back to the logon directory and release the worker directory.
+
+        Args:
+            directory (str): The path of the worker directory.
+        """
+        try:
+            with self.credentials_lock:
+                credential_stats = get_file_stats(self.logon_directory)
+
+                for name, (_, mtime_ns) in get_file_stats(directory).items():
+                    if name in credential_stats and mtime_ns > credential_stats[name][1]:
+                        copy_file_atomically(os.path.join(directory, name), os.path.join(self.logon_directory, name))
+        finally:
+            self.pool.release(directory)
+
+    def close(self):
+        """
+        Remove the worker directories, keeping the credentials in the logon directory.
+        """
+        self.pool.close()
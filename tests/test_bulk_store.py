@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pepclient_package.pep_bulk_store import StoreEntry
+from pepclient_package.pep_client_fake import PepClientFake
+from pepclient_package.pep_executor import RetryPolicy, store_permanent_error_pattern, store_retryable_exit_codes
+
+
+class BulkStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.working_folder = tempfile.mkdtemp(prefix="pep-test-")
+        self.filepath = os.path.join(self.working_folder, "data.csv")
+        with open(self.filepath, "w") as data_file:
+            data_file.write("a,b\n1,2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.working_folder, ignore_errors=True)
+
+    def store(self, client):
+        retry_policy = RetryPolicy(max_attempts=3, backoff=0.01, retryable_exit_codes=store_retryable_exit_codes, retryable_commands=("store",),
+                                   permanent_error_pattern=store_permanent_error_pattern)
+        entries = client.store_bulk([StoreEntry("Questionnaire", "HBU1000001", self.filepath)], retry_policy=retry_policy)
+        return entries[0], [metrics.attempt for metrics in client.metrics.get_records() if metrics.command == "store"]
+
+    def test_transient_errors_are_retried(self):
+        entry, attempts = self.store(PepClientFake(fail_commands="store", fail_message="Error: connection reset by peer"))
+
+        self.assertEqual(entry.status, "failed")
+        self.assertEqual(attempts, [1, 2, 3])
+
+    def test_permanent_errors_are_not_retried(self):
+        entry, attempts = self.store(PepClientFake(fail_commands="store", fail_message="Error: access denied to column Questionnaire"))
+
+        self.assertEqual(entry.status, "failed")
+        self.assertIn("access denied", entry.error)
+        self.assertEqual(attempts, [1])
+
+    def test_successful_store(self):
+        entry, attempts = self.store(PepClientFake())
+
+        self.assertEqual(entry.status, "done")
+        self.assertEqual(attempts, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers.unzip_archives import PipelinedUnzipper
+from pepclient_package.pep_client_fake import PepClientFake
+from pepclient_package.pep_sharded_pull import plan_pull_shards, remove_shards_folder
+
+
+class PipelinedUnzipperTest(unittest.TestCase):
+    def setUp(self):
+        self.working_folder = tempfile.mkdtemp(prefix="pep-test-")
+        self.target_folder = os.path.join(self.working_folder, "pulled-data")
+
+    def tearDown(self):
+        shutil.rmtree(self.working_folder, ignore_errors=True)
+
+    def test_archives_are_extracted_before_the_pull_exits(self):
+        columns = ["Questionnaire", "Visit1", "Visit2"]
+        client = PepClientFake(participants=5, columns=",".join(columns), file_size=100, line_delay=0.1)
+        unzipper = PipelinedUnzipper(self.target_folder, log=lambda line: None, poll_interval=0.05, settle_time=0)
+        unzipper.start()
+
+        # The download page pulls one column at a time when unzipping while downloading
+        shards = plan_pull_shards(columns, len(columns), self.target_folder)
+        extracted_during_last_pull = None
+        try:
+            for shard, _ in client.pep_pull_sharded(shards, self.target_folder, participant_groups=["*"], max_concurrent=1):
+                if shard is shards[-1]:
+                    extracted_during_last_pull = unzipper.extracted
+        finally:
+            extracted_after_pull = unzipper.finish()
+            remove_shards_folder(self.target_folder)
+
+        self.assertTrue(all(shard.status == "done" for shard in shards))
+        self.assertGreater(extracted_during_last_pull, 0)
+        self.assertEqual(extracted_after_pull, 5 * len(columns))
+
+        participant = sorted(entry for entry in os.listdir(self.target_folder) if entry.startswith("HBU"))[0]
+        self.assertTrue(os.path.isfile(os.path.join(self.target_folder, participant, "Questionnaire", "Questionnaire.csv")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from pepclient_package.pep_models import ColumnSize
+from pepclient_package.pep_sharded_pull import plan_scheduled_pull, schedule_columns
+
+
+class ScheduledPullTest(unittest.TestCase):
+    def test_columns_without_byte_sizes_are_scheduled_by_file_count(self):
+        # pepcli's list output has no sizes, so every listed file has an unknown size
+        size_estimates = {
+            "Wearables": ColumnSize("Wearables", files=4000, unknown=4000),
+            "Questionnaire": ColumnSize("Questionnaire", files=100, unknown=100),
+            "Visit1": ColumnSize("Visit1", files=200, unknown=200),
+            "Visit2": ColumnSize("Visit2", files=300, unknown=300),
+        }
+        columns = ["Wearables", "Unlisted", "Visit2", "Questionnaire", "Visit1"]
+
+        self.assertEqual(schedule_columns(columns, size_estimates), ["Questionnaire", "Visit1", "Visit2", "Wearables", "Unlisted"])
+
+        shards = plan_scheduled_pull(columns, "pulled-data", size_estimates, batch_files=1000)
+        self.assertEqual([shard.columns for shard in shards], [["Questionnaire", "Visit1", "Visit2"], ["Wearables"], ["Unlisted"]])
+
+    def test_priority_comes_before_file_count(self):
+        size_estimates = {
+            "Questionnaire": ColumnSize("Questionnaire", files=100, unknown=100),
+            "Wearables": ColumnSize("Wearables", files=4000, unknown=4000),
+        }
+
+        shards = plan_scheduled_pull(["Questionnaire", "Wearables"], "pulled-data", size_estimates, {"Wearables": 1})
+        self.assertEqual([shard.columns for shard in shards], [["Wearables"], ["Questionnaire"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
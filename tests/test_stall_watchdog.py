@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pepclient_package.pep_client_fake import PepClientFake
+
+
+class StallWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.working_folder = tempfile.mkdtemp(prefix="pep-test-")
+        self.target_folder = os.path.join(self.working_folder, "pulled-data")
+
+    def tearDown(self):
+        shutil.rmtree(self.working_folder, ignore_errors=True)
+
+    def test_pull_that_keeps_logging_without_progress_is_restarted(self):
+        client = PepClientFake(participants=4, columns="Questionnaire", stall=30, stall_log_interval=0.1)
+
+        started = time.monotonic()
+        output = client.pep_pull("pull -P * --report-progress", self.target_folder, stall_timeout=1, max_restarts=1)
+        lines = []
+        while True:
+            try:
+                lines.append(next(output))
+            except StopIteration as stop:
+                exit_code = stop.value
+                break
+
+        self.assertEqual(exit_code, 0)
+        self.assertLess(time.monotonic() - started, 15)
+        self.assertIn("Warning: waiting for the server to respond", lines)
+        self.assertTrue(any(line.startswith("No progress for 1 seconds, restarting") for line in lines))
+
+    def test_log_lines_count_as_output_without_report_progress(self):
+        client = PepClientFake(participants=4, columns="Questionnaire", stall=1.5, stall_log_interval=0.1)
+
+        lines = list(client.pep_pull("pull -P *", self.target_folder, stall_timeout=1, max_restarts=0))
+
+        self.assertFalse(any(line.startswith("No progress") for line in lines))
+        self.assertIn("Pulled 4 files", lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pepclient_package.pep_client_fake import PepClientFake
+from pepclient_package.pep_delta_pull import plan_delta_shards
+from pepclient_package.pep_sharded_pull import has_pull_metadata
+
+
+class TargetedPullTest(unittest.TestCase):
+    def setUp(self):
+        self.working_folder = tempfile.mkdtemp(prefix="pep-test-")
+        self.target_folder = os.path.join(self.working_folder, "pulled-data")
+        self.client = PepClientFake(participants=4, columns="Questionnaire,Visit1", file_size=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_folder, ignore_errors=True)
+
+    def pull_targeted(self, participants, columns):
+        shards = plan_delta_shards([(participant, column) for participant in participants for column in columns], self.target_folder)
+        for _ in self.client.pep_pull_sharded(shards, self.target_folder, report_progress=True):
+            pass
+        return shards
+
+    def test_targeted_pull_into_a_new_folder(self):
+        self.assertFalse(has_pull_metadata(self.target_folder))
+
+        shards = self.pull_targeted(["HBU1000001"], ["Questionnaire"])
+
+        self.assertEqual([shard.status for shard in shards], ["done"])
+        self.assertTrue(os.path.isfile(os.path.join(self.target_folder, "HBU1000001", "Questionnaire")))
+        self.assertTrue(has_pull_metadata(self.target_folder))
+
+    def test_targeted_pull_with_another_specification(self):
+        # The first pull is of a participant group and one column, the targeted pull of participants and another column
+        list(self.client.pep_pull("pull -P * -c Questionnaire --report-progress", self.target_folder))
+        participants = sorted(entry for entry in os.listdir(self.target_folder) if entry.startswith("HBU"))
+
+        shards = self.pull_targeted(participants[:2], ["Visit1"])
+
+        self.assertEqual([shard.status for shard in shards], ["done"])
+        for participant in participants:
+            self.assertTrue(os.path.isfile(os.path.join(self.target_folder, participant, "Questionnaire")))
+            self.assertEqual(os.path.isfile(os.path.join(self.target_folder, participant, "Visit1")), participant in participants[:2])
+
+        # The metadata describes both pulls
+        with open(os.path.join(self.target_folder, ".pepData", "specification.json")) as specification_file:
+            specification = json.load(specification_file)
+        self.assertEqual(specification["columns"], ["Questionnaire", "Visit1"])
+        self.assertEqual(sorted(specification["participants"]), participants)
+
+
+if __name__ == "__main__":
+    unittest.main()